@@ -0,0 +1,112 @@
+from argparse import ArgumentParser
+from copy import deepcopy
+import random
+import sys
+import time
+
+import numpy as np
+
+from symtuner.coverage import Coverage
+from synthetic_tuner import SyntheticSymTuner
+
+
+# A smaller space than the one of KLEE, to keep sampling cheap next to the core set
+SPACE = {
+    'space': {
+        '-search': (['dfs', 'bfs', 'random-path', 'nurs:covnew'], 1),
+        '-max-memory': ([500, 1000, 1500, 2000, 2500], 1),
+        '-sym-arg': ([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 5),
+    },
+    'defaults': {},
+}
+
+
+def make_coverage(rng, n_branches, hot, n_rare):
+    bits = np.zeros(n_branches, dtype=bool)
+    bits[hot] = rng.random(len(hot)) < 0.8
+    bits[rng.integers(0, n_branches, n_rare)] = True
+    packed = np.packbits(bits, bitorder='little')
+    return Coverage(int.from_bytes(packed.tobytes(), 'little'))
+
+
+def make_tuner(n_testcases, n_branches, seed=0):
+    rng = np.random.default_rng(seed)
+    random.seed(seed)
+    tuner = SyntheticSymTuner(parameter_space=deepcopy(SPACE))
+    hot = rng.choice(n_branches, n_branches // 10, replace=False)
+    for i in range(0, n_testcases, 100):
+        parameters = tuner.sample(policy='explore')
+        tuner.count_used_parameters(parameters)
+        for j in range(min(100, n_testcases - i)):
+            coverage = make_coverage(rng, n_branches, hot, int(rng.integers(0, 20)))
+            gain = tuner.core_set.add(coverage, set())
+            tuner.data.append(coverage, set(), f'test{i + j:06d}.ktest', parameters,
+                              contributing=gain > 0)
+    return tuner
+
+
+def baseline_core_parameters(data):
+    # Core parameter extraction before lazy greedy: sort and rebuild all coverages at every step
+    core_paramters = []
+    accumulated_coverage = Coverage()
+    copied_data = deepcopy(data)
+    while True:
+        if len(copied_data) == 0:
+            break
+        copied_data = sorted(copied_data,
+                             key=lambda elem: len(elem[0]),
+                             reverse=True)
+        top_cov, _, _, param = copied_data.pop(0)
+        if len(top_cov) > 0:
+            accumulated_coverage = accumulated_coverage | top_cov
+            copied_data = [(cov - accumulated_coverage, bug, tc, param)
+                           for cov, bug, tc, param in copied_data]
+            core_paramters.append(param)
+        else:
+            break
+    return core_paramters
+
+
+def sample_after_update(tuner):
+    # The core set and probabilities are cached until new data arrives, so measure the first
+    # sample after it
+    tuner.core_set.outdated = True
+    tuner.probabilities.clear()
+    tuner.sample(policy='exploit')
+
+
+def measure(fn, repeat):
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed.append(time.perf_counter() - start)
+    return min(elapsed)
+
+
+def main(*argv):
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', default=[10000, 100000], type=int, nargs='+', metavar='INT',
+                        help='numbers of testcases to measure (default=10000 100000)')
+    parser.add_argument('--branches', default=20000, type=int, metavar='INT',
+                        help='number of branches in the synthetic program (default=20000)')
+    parser.add_argument('--repeat', default=3, type=int, metavar='INT',
+                        help='number of measurements per size, the minimum is reported (default=3)')
+    parser.add_argument('--baseline-limit', default=10000, type=int, metavar='INT',
+                        help='largest size to measure the previous implementation (default=10000)')
+    args = parser.parse_args(argv)
+
+    print(f'{"testcases":>10} {"exploit sample (s)":>20} {"previous core set (s)":>22}')
+    for size in args.sizes:
+        tuner = make_tuner(size, args.branches)
+        latency = measure(lambda: sample_after_update(tuner), args.repeat)
+        if size <= args.baseline_limit:
+            baseline = measure(lambda: baseline_core_parameters(list(tuner.data)), 1)
+            baseline = f'{baseline:.3f}'
+        else:
+            baseline = '-'
+        print(f'{size:>10} {latency:>20.3f} {baseline:>22}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# Stand-in for gcov: turns fake gcda files into gcov branch reports. With -t the reports are
+# printed, otherwise they are written into the working directory like gcov does.
+
+from pathlib import Path
+import sys
+
+from fake_program import get_settings
+
+
+def report(gcda, n_branches):
+    covered = set(map(int, gcda.read_text().split()))
+    lines = [f'        -:    0:Source:{gcda.stem}.c']
+    for branch in range(n_branches):
+        if branch in covered:
+            lines.append(f'branch  {branch % 2} taken 50%')
+        else:
+            lines.append(f'branch  {branch % 2} never executed')
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv):
+    settings = get_settings()
+    if '-version' in argv or '--version' in argv:
+        print('gcov (fake for the synthetic benchmark) 9.4.0')
+        return 0
+    if '--help' in argv:
+        print('Usage: gcov [OPTION...] SOURCE|OBJ...')
+        print('  -b, --branch-probabilities')
+        if settings['GCOV_STDOUT']:
+            print('  -t, --stdout')
+        return 0
+
+    to_stdout = '-t' in argv
+    for arg in argv:
+        if arg.startswith('-'):
+            continue
+        gcda = Path(arg)
+        if not gcda.exists():
+            continue
+        text = report(gcda, settings['BRANCHES'])
+        if to_stdout:
+            sys.stdout.write(text)
+        else:
+            Path(f'{gcda.stem}.c.gcov').write_text(text)
+            print(f"Creating '{gcda.stem}.c.gcov'")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Stand-in for klee: generates synthetic testcases without symbolic execution.
+# Each option is given a fixed affinity to the synthetic program, so that some parameters cover
+# more branches than others and SymTuner has something to learn.
+
+from pathlib import Path
+import hashlib
+import random
+import signal
+import sys
+import time
+
+from fake_program import affinity
+from fake_program import get_settings
+from fake_program import read_testcase
+from fake_program import source_file
+from fake_program import write_testcase
+
+
+def main(argv):
+    if '-version' in argv or '--version' in argv:
+        print('KLEE 2.1 (fake for the synthetic benchmark)')
+        return 0
+
+    settings = get_settings()
+    n_branches = settings['FILES'] * settings['BRANCHES']
+    n_hot = int(n_branches * settings['HOT'])
+
+    output_dir, max_time, seed_file = None, 30., None
+    options = []
+    for arg in argv:
+        if arg.startswith('-output-dir='):
+            output_dir = Path(arg.split('=', 1)[1])
+        elif arg.startswith('-max-time='):
+            max_time = float(arg.split('=', 1)[1])
+        elif arg.startswith('-seed-file='):
+            seed_file = Path(arg.split('=', 1)[1])
+        elif arg.startswith('-'):
+            options.append(arg)
+    if output_dir is None:
+        output_dir = Path('klee-out-0')
+    output_dir.mkdir(parents=True)
+
+    # Quality of this run decides how many testcases and rare branches it finds
+    quality = sum(map(affinity, options)) / max(len(options), 1)
+    region = int(hashlib.sha256(' '.join(sorted(options)).encode()).hexdigest(), 16) % n_branches
+    rng = random.Random(f'{output_dir.name} {" ".join(options)}')
+    n_testcases = int(settings['TESTCASES'] * max_time * (0.5 + quality))
+    seed = read_testcase(seed_file) if seed_file is not None and seed_file.exists() else None
+
+    signal.signal(signal.SIGINT, lambda *_: sys.exit(0))
+    duration = max_time * settings['TIME_SCALE']
+    for i in range(1, n_testcases + 1):
+        time.sleep(duration / max(n_testcases, 1))
+        if seed is not None and rng.random() < settings['DUPLICATE_RATE']:
+            branches, bug = seed
+        else:
+            branches = {b for b in range(n_hot) if rng.random() < 0.8}
+            for _ in range(int(rng.expovariate(1 / (settings['RARE'] * 2 * quality + 1e-9)))):
+                branches.add((region + int(rng.expovariate(20 / n_branches))) % n_branches)
+            if seed is not None:
+                branches.update(b for b in seed[0] if rng.random() < 0.7)
+            bug = None
+            if rng.random() < settings['BUG_RATE'] * 2 * quality:
+                bug = rng.randrange(settings['BUGS'])
+
+        # KLEE writes the error report after the testcase
+        write_testcase(output_dir / f'test{i:06d}.ktest', branches, bug)
+        if bug is not None:
+            with (output_dir / f'test{i:06d}.ptr.err').open('w') as f:
+                f.write('Error: memory error: out of bound pointer\n')
+                f.write(f'File: {source_file(bug % settings["FILES"])}\n')
+                f.write(f'Line: {bug}\n')
+
+    print(f'KLEE: done: generated tests = {n_testcases}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
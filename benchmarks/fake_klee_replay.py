@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# Stand-in for klee-replay: writes the branches of a synthetic testcase into fake gcda files.
+# Like a program built with --coverage, gcda files are written next to the objects, or under
+# GCOV_PREFIX if set.
+
+from pathlib import Path
+import os
+import sys
+
+from fake_program import get_settings
+from fake_program import read_testcase
+from fake_program import source_file
+
+
+def main(argv):
+    target, testcase = Path(argv[0]).absolute(), Path(argv[1])
+    settings = get_settings()
+    branches, bug = read_testcase(testcase)
+
+    obj_dir = target.parent
+    prefix = os.environ.get('GCOV_PREFIX')
+    if prefix is not None:
+        obj_dir = Path(prefix + str(obj_dir))
+        obj_dir.mkdir(parents=True, exist_ok=True)
+
+    per_file = {}
+    for branch in branches:
+        per_file.setdefault(branch // settings['BRANCHES'], []).append(branch % settings['BRANCHES'])
+    for index, local in per_file.items():
+        gcda = obj_dir / (Path(source_file(index)).stem + '.gcda')
+        gcda.write_text(' '.join(map(str, local)))
+
+    if bug is not None:
+        print('KLEE-REPLAY: NOTE: CRASHED signal 11', file=sys.stderr)
+        return 1
+    print('KLEE-REPLAY: NOTE: EXIT STATUS: NORMAL', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,60 @@
+import hashlib
+import os
+
+
+# Shape of the synthetic program, shared by the fake executables through the environment
+SETTINGS = {
+    'FILES': 10,                # number of source files
+    'BRANCHES': 200,            # number of branches in each source file
+    'HOT': 0.1,                 # portion of branches covered by most testcases
+    'RARE': 10,                 # average number of rare branches covered by a testcase
+    'TESTCASES': 2.,            # testcases generated per second of -max-time
+    'BUGS': 20,                 # number of distinct bugs in the program
+    'BUG_RATE': 0.005,          # probability that a testcase triggers a bug
+    'DUPLICATE_RATE': 0.3,      # probability that a seeded run emits a copy of the seed
+    'TIME_SCALE': 0.02,         # portion of -max-time that the fake KLEE actually runs
+    'GCOV_STDOUT': 1,           # whether the fake gcov supports --stdout
+}
+
+
+def get_settings():
+    settings = {}
+    for key, default in SETTINGS.items():
+        value = os.environ.get(f'SYMTUNER_FAKE_{key}')
+        settings[key] = type(default)(value) if value is not None else default
+    return settings
+
+
+def set_settings(**settings):
+    for key, value in settings.items():
+        os.environ[f'SYMTUNER_FAKE_{key.upper()}'] = str(value)
+
+
+def affinity(option):
+    # How good an option is for the synthetic program, fixed for each option
+    digest = hashlib.sha256(option.encode()).digest()
+    return digest[0] / 255
+
+
+def source_file(index):
+    return f'src{index:03d}.c'
+
+
+def write_testcase(path, branches, bug=None):
+    lines = ['branches ' + ' '.join(map(str, sorted(branches)))]
+    if bug is not None:
+        lines.append(f'bug {bug}')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def read_testcase(path):
+    branches, bug = [], None
+    with open(path) as f:
+        for line in f:
+            key, *values = line.split()
+            if key == 'branches':
+                branches = [int(value) for value in values]
+            elif key == 'bug':
+                bug = int(values[0])
+    return branches, bug
@@ -0,0 +1,85 @@
+from argparse import ArgumentParser
+import hashlib
+import random
+import sys
+import time
+
+import numpy as np
+
+from fake_program import affinity
+from symtuner.sampler import ThompsonSampler
+from synthetic_tuner import SyntheticSymTuner
+
+
+def run_results(rng, parameters, space, batch, n_branches, rare):
+    # Like the fake KLEE, parameters with good options cover more rare branches near their region
+    options = [f'{param}={value}' for param in space for value in parameters.get(param, [])]
+    quality = sum(map(affinity, options)) / max(len(options), 1)
+    region = int(hashlib.sha256(' '.join(sorted(options)).encode()).hexdigest(), 16) % n_branches
+    results = []
+    for _ in range(batch):
+        n_rare = rng.poisson(rare * 2 * quality)
+        rare_branches = (region + rng.exponential(n_branches / 20, n_rare).astype(int)) % n_branches
+        results.append((set(rare_branches.tolist()), set()))
+    return results
+
+
+def run_campaign(name, args):
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    sampler = ThompsonSampler() if name == 'thompson' else None
+    tuner = SyntheticSymTuner(sampler=sampler)
+
+    rows = []
+    sizes = sorted(args.sizes)
+    added, iterations, sample_time, update_time = 0, 0, 0., 0.
+    while len(sizes) > 0:
+        start = time.perf_counter()
+        parameters = tuner.sample()
+        sample_time += time.perf_counter() - start
+
+        results = run_results(rng, parameters, tuner.space, args.batch, args.branches, args.rare)
+        testcases = [f'test{added + i:07d}.ktest' for i in range(len(results))]
+        start = time.perf_counter()
+        tuner.add_results(parameters, testcases, results)
+        update_time += time.perf_counter() - start
+        added += len(results)
+        iterations += 1
+
+        if added >= sizes[0]:
+            coverage, _ = tuner.get_coverage_and_bugs()
+            rows.append((name, added, sample_time / iterations * 1000,
+                         update_time / iterations * 1000, len(coverage)))
+            iterations, sample_time, update_time = 0, 0., 0.
+            sizes.pop(0)
+    return rows
+
+
+def main(*argv):
+    parser = ArgumentParser(description='Compare the sampling cost and coverage of samplers '
+                                        'on a synthetic program')
+    parser.add_argument('--samplers', default=['symtuner', 'thompson'], nargs='+',
+                        choices=('symtuner', 'thompson'), help='samplers to compare')
+    parser.add_argument('--sizes', default=[1000, 10000, 20000], type=int, nargs='+',
+                        metavar='INT', help='numbers of testcases to report at '
+                                            '(default=1000 10000 20000)')
+    parser.add_argument('--batch', default=100, type=int, metavar='INT',
+                        help='testcases per iteration (default=100)')
+    parser.add_argument('--branches', default=200000, type=int, metavar='INT',
+                        help='number of branches in the synthetic program (default=200000)')
+    parser.add_argument('--rare', default=10, type=int, metavar='INT',
+                        help='average number of branches covered by a testcase (default=10)')
+    parser.add_argument('--seed', default=0, type=int, metavar='INT',
+                        help='random seed (default=0)')
+    args = parser.parse_args(argv)
+
+    print(f'{"sampler":>10} {"testcases":>10} {"sample (ms)":>12} {"update (ms)":>12} '
+          f'{"coverage":>9}')
+    for name in args.samplers:
+        for name, added, sample_ms, update_ms, coverage in run_campaign(name, args):
+            print(f'{name:>10} {added:>10} {sample_ms:>12.2f} {update_ms:>12.2f} {coverage:>9}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,207 @@
+from argparse import ArgumentParser
+from functools import wraps
+from pathlib import Path
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from fake_program import SETTINGS
+from fake_program import get_settings
+from fake_program import set_settings
+from fake_program import source_file
+from symtuner.bin import main as symtuner_main
+from symtuner.klee import KLEE
+from symtuner.klee import KLEESymTuner
+from symtuner.store import DiskStore
+
+
+BENCHMARKS = Path(__file__).absolute().parent
+FAKE_KLEE = BENCHMARKS / 'fake_klee.py'
+FAKE_KLEE_REPLAY = BENCHMARKS / 'fake_klee_replay.py'
+FAKE_GCOV = BENCHMARKS / 'fake_gcov.py'
+
+
+class PhaseTimes:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.times = {}
+
+    def wrap(self, cls, name, phase):
+        method = getattr(cls, name)
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.times.setdefault(phase, []).append((start, time.perf_counter()))
+        setattr(cls, name, timed)
+        return method
+
+    def count(self, phase):
+        return len(self.times.get(phase, []))
+
+    def total(self, phase):
+        return sum(end - start for start, end in self.times.get(phase, []))
+
+    def covered(self, phase):
+        # Time while at least one call is running, for calls made concurrently
+        covered, last = 0., float('-inf')
+        for start, end in sorted(self.times.get(phase, [])):
+            start = max(start, last)
+            if end > start:
+                covered += end - start
+                last = end
+        return covered
+
+
+def peak_memory():
+    # Peak resident memory in MiB of SymTuner itself and of its subprocesses
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return self_kb / 1024, children_kb / 1024
+
+
+def make_target(workdir):
+    # SymTuner only passes the paths to the fake executables
+    llvm_bc = workdir / 'obj-llvm' / 'program.bc'
+    gcov_obj = workdir / 'obj-gcov' / 'program'
+    for path in (llvm_bc, gcov_obj):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+    # Notes files of the sources, where the fake klee-replay writes gcda files next to
+    for index in range(get_settings()['FILES']):
+        (gcov_obj.parent / (Path(source_file(index)).stem + '.gcno')).touch()
+    return llvm_bc, gcov_obj
+
+
+def run_end_to_end(args, symtuner_args):
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='symtuner-synthetic-')).absolute()
+    llvm_bc, gcov_obj = make_target(workdir)
+    output_dir = workdir / 'symtuner-out'
+
+    times = PhaseTimes()
+    originals = [
+        (KLEE, 'run', times.wrap(KLEE, 'run', 'klee')),
+        (KLEESymTuner, 'sample', times.wrap(KLEESymTuner, 'sample', 'sample')),
+        (KLEESymTuner, 'evaluate', times.wrap(KLEESymTuner, 'evaluate', 'evaluate')),
+        (KLEESymTuner, 'add_results', times.wrap(KLEESymTuner, 'add_results', 'update')),
+    ]
+    start = time.perf_counter()
+    try:
+        symtuner_main(['--klee', str(FAKE_KLEE), '--klee-replay', str(FAKE_KLEE_REPLAY),
+                       '--gcov', str(FAKE_GCOV), '-t', str(args.budget), '-d', str(output_dir),
+                       '--result-store', args.result_store, *symtuner_args,
+                       str(llvm_bc), str(gcov_obj)])
+    finally:
+        for cls, name, method in originals:
+            setattr(cls, name, method)
+    wall = time.perf_counter() - start
+
+    iterations = times.count('klee')
+    testcases = len(list(output_dir.glob('iteration-*/*.ktest')))
+    # Time when no KLEE is running is the overhead of SymTuner, also with --jobs and --pipeline
+    overhead = wall - times.covered('klee')
+    self_mb, children_mb = peak_memory()
+    print(f'output directory:        {output_dir}')
+    print(f'iterations:              {iterations}')
+    print(f'testcases:               {testcases}')
+    print(f'wall time (s):           {wall:.2f}')
+    print(f'klee time (s):           {times.total("klee"):.2f}')
+    print(f'sample time (s):         {times.total("sample"):.2f}')
+    print(f'evaluation time (s):     {times.covered("evaluate"):.2f}')
+    print(f'overhead (s):            {overhead:.2f} ({overhead / wall * 100:.1f}% of wall time)')
+    print(f'overhead / iteration:    {overhead / max(iterations, 1) * 1000:.1f} ms')
+    print(f'peak memory (MiB):       {self_mb:.1f} (subprocesses {children_mb:.1f})')
+
+
+def run_scaling(args):
+    # Feed synthetic results to SymTuner directly, without any subprocess per testcase
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    n_files, n_per_file = args.files, args.branches
+    n_branches = n_files * n_per_file
+    names = [f'{source_file(b // n_per_file)} {b % n_per_file}' for b in range(n_branches)]
+    n_hot = int(n_branches * args.hot)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='symtuner-synthetic-')).absolute()
+    result_store = DiskStore(workdir / 'results') if args.result_store == 'disk' else None
+    tuner = KLEESymTuner(str(FAKE_KLEE_REPLAY), str(FAKE_GCOV), 10, None, 0.7, result_store)
+
+    print(f'{"testcases":>10} {"update / iter (ms)":>19} {"exploit sample (ms)":>20} '
+          f'{"peak memory (MiB)":>18}')
+    sizes = sorted(args.sizes)
+    added, update_time, update_count = 0, 0., 0
+    while len(sizes) > 0:
+        parameters = tuner.sample()
+        testcases, results = [], []
+        for _ in range(args.batch):
+            hot = np.flatnonzero(rng.random(n_hot) < 0.8)
+            rare = rng.integers(0, n_branches, rng.poisson(args.rare))
+            covered = {names[b] for b in np.concatenate([hot, rare])}
+            bugs = {f'{source_file(0)} {rng.integers(20)}'} if rng.random() < 1e-4 else set()
+            testcases.append(workdir / f'test{added:07d}.ktest')
+            results.append((covered, bugs))
+            added += 1
+
+        start = time.perf_counter()
+        tuner.add_results(parameters, testcases, results)
+        update_time += time.perf_counter() - start
+        update_count += 1
+
+        if added >= sizes[0]:
+            start = time.perf_counter()
+            tuner.sample(policy='exploit')
+            latency = time.perf_counter() - start
+            self_mb, _ = peak_memory()
+            print(f'{added:>10} {update_time / update_count * 1000:>19.2f} '
+                  f'{latency * 1000:>20.2f} {self_mb:>18.1f}')
+            update_time, update_count = 0., 0
+            sizes.pop(0)
+
+
+def main(*argv):
+    parser = ArgumentParser(description='Benchmark SymTuner with fake klee, klee-replay and gcov. '
+                                        'Unknown options are passed to SymTuner.',
+                            allow_abbrev=False)
+    parser.add_argument('--budget', default=120, type=int, metavar='INT',
+                        help='time budget of SymTuner in seconds (default=120)')
+    parser.add_argument('--workdir', default=None, type=str, metavar='PATH',
+                        help='directory to make the synthetic target and outputs in '
+                             '(default=temporary directory)')
+    parser.add_argument('--scaling', action='store_true',
+                        help='measure SymTuner alone with synthetic results up to --sizes '
+                             'testcases, instead of running it end to end')
+    parser.add_argument('--sizes', default=[10000, 100000], type=int, nargs='+',
+                        metavar='INT', help='numbers of testcases to report at with --scaling '
+                                            '(default=10000 100000)')
+    parser.add_argument('--batch', default=1000, type=int, metavar='INT',
+                        help='testcases per iteration with --scaling (default=1000)')
+    parser.add_argument('--result-store', default='memory', choices=('memory', 'disk'),
+                        help='result store of SymTuner (default=memory)')
+    parser.add_argument('--seed', default=0, type=int, metavar='INT',
+                        help='random seed with --scaling (default=0)')
+    for key, default in SETTINGS.items():
+        option = key.lower().replace('_', '-')
+        parser.add_argument(f'--{option}', default=default, type=type(default),
+                            metavar=type(default).__name__.upper(),
+                            help=f'synthetic program setting (default={default})')
+    args, symtuner_args = parser.parse_known_args(argv)
+
+    set_settings(**{key: getattr(args, key.lower()) for key in SETTINGS})
+    if args.scaling:
+        run_scaling(args)
+    else:
+        run_end_to_end(args, symtuner_args)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,26 @@
+from fake_program import get_settings
+from fake_program import read_testcase
+from fake_program import source_file
+from symtuner.klee import KLEESymTuner
+from symtuner.symtuner import SymTuner
+
+
+class SyntheticSymTuner(SymTuner):
+    # SymTuner on testcases of the fake KLEE, evaluated in process instead of replaying them,
+    # for benchmarks that feed results to the tuner directly
+
+    def evaluate(self, target, testcase, **kwargs):
+        n_branches = get_settings()['BRANCHES']
+        branches, bug = read_testcase(testcase)
+        coverage = {f'{source_file(branch // n_branches)} {branch % n_branches}'
+                    for branch in branches}
+        bugs = {f'bug {bug}'} if bug is not None else set()
+        return coverage, bugs
+
+    @classmethod
+    def get_default_space(cls):
+        return KLEESymTuner.get_default_space()
+
+    @classmethod
+    def get_default_default_parameters(cls):
+        return KLEESymTuner.get_default_default_parameters()
@@ -4,18 +4,558 @@ This module that defines consol script entries. This module includes console scr
 for SymTuner for KLEE.
 '''
 
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 from pathlib import Path
 import argparse
 import json
-import shutil
+import pickle
 import sys
+import time
 
+from symtuner.campaign import Campaign
+from symtuner.campaign import FairShareScheduler
+from symtuner.campaign import gather
+from symtuner.campaign import load_manifest
+from symtuner.checkpoint import load_checkpoint
+from symtuner.corpus import Corpus
+from symtuner.corpus import remove_tree
+from symtuner.distributed import Coordinator
+from symtuner.distributed import Worker
+from symtuner.distributed import load_token
+from symtuner.distributed import make_token
+from symtuner.gcda import GCDAReader
+from symtuner.klee import GCov
 from symtuner.klee import KLEE
+from symtuner.klee import KLEEReplay
 from symtuner.klee import KLEESymTuner
+from symtuner.klee import ReplayPool
 from symtuner.logger import get_logger
+from symtuner.metrics import PhaseTimer
+from symtuner.metrics import overhead_ratio
+from symtuner.sampler import ThompsonSampler
+from symtuner.status import CampaignStatus
+from symtuner.status import StatusServer
+from symtuner.store import DiskStore
+from symtuner.symtuner import AdaptiveTimeBudgetHandler
 from symtuner.symtuner import TimeBudgetHandler
 
 
+def run_symbolic_executor(symbolic_executor, target, parameters, **kwargs):
+    '''Run symbolic executor and measure its running time
+
+    Args:
+        symbolic_executor: A `symtuner.symbolic_executor.SymbolicExecutor` to run.
+        target: A target program to run with symbolic executor.
+        parameters: Parameters for the symbolic executor.
+        kwargs: Any keyword arguments that are needed to run symbolic executor.
+
+    Returns:
+        A tuple of generated testcases, running time in seconds, and whether symbolic executor
+        was stopped early because it stalled.
+    '''
+
+    start = time.monotonic()
+    testcases, stalled = symbolic_executor.run(target, parameters, **kwargs)
+    return testcases, time.monotonic() - start, stalled
+
+
+def run_pipelined(symbolic_executor, symtuner, target, parameters, gcov_obj, evaluation_kwargs,
+                  **kwargs):
+    '''Run symbolic executor while evaluating its testcases in background
+
+    Run symbolic executor, and submit each testcase to SymTuner as soon as it is generated, so
+    that testcases are evaluated while symbolic executor is running.
+
+    Args:
+        symbolic_executor: A `symtuner.symbolic_executor.SymbolicExecutor` to run.
+        symtuner: A `symtuner.klee.KLEESymTuner` to evaluate testcases with.
+        target: A target program to run with symbolic executor.
+        parameters: Parameters for the symbolic executor.
+        gcov_obj: A target program to evaluate testcases with.
+        evaluation_kwargs: A dictionary of keyword arguments pass to evaluate method.
+        kwargs: Any keyword arguments that are needed to run symbolic executor.
+
+    Returns:
+        A tuple of generated testcases, futures of their evaluation results, running time of
+        symbolic executor in seconds, and whether symbolic executor was stopped early because it
+        stalled.
+    '''
+
+    testcases = []
+    evaluations = []
+
+    def on_testcase(testcase):
+        testcases.append(testcase)
+        evaluations.append(symtuner.submit_evaluation(gcov_obj, testcase, **evaluation_kwargs))
+
+    _, running_time, stalled = run_symbolic_executor(symbolic_executor, target, parameters,
+                                                     on_testcase=on_testcase, **kwargs)
+    return testcases, evaluations, running_time, stalled
+
+
+def discard_after_checkpoint(output_dir, iteration, elapsed, unfinished=()):
+    '''Discard outputs made after the checkpoint
+
+    Discard outputs made after the checkpoint was saved, before resuming from the checkpoint.
+    Outputs of iterations from `iteration` and of iterations unfinished at the checkpoint are
+    deleted as the iterations run again, and coverage and metrics records later than the
+    checkpoint are removed.
+
+    Args:
+        output_dir: Output directory of SymTuner.
+        iteration: The first iteration to sample after resuming.
+        elapsed: Elapsed time in seconds at the checkpoint.
+        unfinished: Iterations that were running at the checkpoint. By default, this will be
+            set as empty.
+    '''
+
+    unfinished = set(unfinished)
+
+    def discarded(index):
+        return index >= iteration or index in unfinished
+
+    # Iteration directories and logs of unfinished KLEE runs (iteration-<i>.stdout)
+    for iteration_output in output_dir.glob('iteration-*'):
+        index = iteration_output.name.split('-')[-1].split('.')[0]
+        if not index.isdigit() or not discarded(int(index)):
+            continue
+        if iteration_output.is_dir():
+            remove_tree(iteration_output)
+        else:
+            iteration_output.unlink()
+    coverage_csv = output_dir / 'coverage.csv'
+    if coverage_csv.exists():
+        with coverage_csv.open() as stream:
+            lines = [line for line in stream if int(line.split(',')[0]) <= elapsed]
+        with coverage_csv.open('w') as stream:
+            stream.writelines(lines)
+    metrics_jsonl = output_dir / 'metrics.jsonl'
+    if metrics_jsonl.exists():
+        with metrics_jsonl.open() as stream:
+            lines = [line for line in stream
+                     if not discarded(json.loads(line)['iteration'] - 1)]
+        with metrics_jsonl.open('w') as stream:
+            stream.writelines(lines)
+
+
+def make_corpus(args):
+    '''Make a corpus manager as configured
+
+    Args:
+        args: Parsed commandline arguments.
+
+    Returns:
+        A `symtuner.corpus.Corpus`, or None if testcases are not managed.
+    '''
+
+    if not (args.corpus_dedup or args.corpus_prune or args.corpus_archive):
+        return None
+    return Corpus(args.corpus_dedup, args.corpus_prune, args.corpus_archive)
+
+
+def load_prior(path):
+    '''Load the learned state of a previous campaign to warm-start from
+
+    Load the learned state of a previous campaign from its checkpoint. Results spilled by the
+    previous campaign are read from next to the checkpoint, without modifying them.
+
+    Args:
+        path: Path to the checkpoint of the previous campaign.
+
+    Returns:
+        A dictionary returned by `symtuner.symtuner.SymTuner.get_state`.
+    '''
+
+    state = load_checkpoint(path)['symtuner']
+    if isinstance(state['data'], DiskStore):
+        state['data'].open(Path(path).parent)
+    return state
+
+
+def make_campaign(args, target, output_dir, checkpoint=None, priors=(), klee_replay=None,
+                  coverage_backend=None, replay_pool=None, replay_cache=None):
+    '''Make a campaign on a target as configured
+
+    Make a campaign on a target, resumed from the checkpoint or warm started from previous
+    campaigns if given, and start its live status.
+
+    Args:
+        args: Parsed commandline arguments.
+        target: A dictionary of the target in the form returned by
+            `symtuner.campaign.load_manifest`. If its name is None, the target is not named in
+            logs.
+        output_dir: Output directory of the campaign.
+        checkpoint: A checkpoint to resume the campaign from. By default, start a new campaign.
+        priors: Learned states of previous campaigns on the target, loaded with `load_prior`, to
+            learn the initial exploit policy from. Ignored when resumed.
+        klee_replay: A `symtuner.klee.KLEEReplay` to evaluate testcases with.
+        coverage_backend: A `symtuner.klee.GCov` or a `symtuner.gcda.GCDAReader` to evaluate
+            testcases with.
+        replay_pool: A `symtuner.klee.ReplayPool` to evaluate testcases on.
+        replay_cache: Path to a replay cache database or a `symtuner.cache.ReplayCache`
+            instance. By default, no cache is used.
+
+    Returns:
+        A `symtuner.campaign.Campaign`.
+    '''
+
+    # When resumed, the store is restored from the checkpoint
+    if args.result_store == 'disk' and checkpoint is None:
+        result_store = DiskStore(output_dir / 'results', args.result_cache_size * 1024 * 1024)
+    else:
+        result_store = None
+    sampler = ThompsonSampler() if args.sampler == 'thompson' else None
+    symtuner = KLEESymTuner(klee_replay, coverage_backend, 10,
+                            target['search_space'], args.exploit_portion, result_store,
+                            PhaseTimer(), sampler,
+                            replay_pool=replay_pool,
+                            replay_cache=replay_cache)
+    if args.budget_scheduler == 'adaptive':
+        time_budget_handler_class = AdaptiveTimeBudgetHandler
+    else:
+        time_budget_handler_class = TimeBudgetHandler
+    time_budget_handler = time_budget_handler_class(target['budget'], args.minimum_time_portion,
+                                                    args.step, args.increase_ratio,
+                                                    args.minimum_time_budget,
+                                                    args.max_evaluation_share)
+    gcov_depth = target['gcov_depth']
+    if gcov_depth is None:
+        gcov_depth = args.gcov_depth
+    # Index the object tree before testing, instead of at the first evaluation
+    symtuner.get_gcda_index(target['gcov_obj'], gcov_depth)
+    campaign = Campaign(target['name'], target['llvm_bc'], target['gcov_obj'], output_dir,
+                        symtuner, time_budget_handler, {'folder_depth': gcov_depth},
+                        args.exploration_steps, target['weight'],
+                        checkpoint_interval=args.checkpoint_interval,
+                        corpus=make_corpus(args))
+
+    if len(priors) > 0 and checkpoint is None:
+        symtuner.set_prior(priors)
+    if checkpoint is not None:
+        if isinstance(checkpoint['symtuner']['data'], DiskStore):
+            # Results spilled after the checkpoint are truncated
+            checkpoint['symtuner']['data'].open(output_dir, writable=True)
+        campaign.set_state(checkpoint)
+        discard_after_checkpoint(output_dir, campaign.iteration, time_budget_handler.elapsed,
+                                 campaign.unfinished)
+        get_logger().info(f'{campaign.log_prefix}Resume from iteration {campaign.iteration + 1} '
+                          f'with {len(symtuner.data)} testcases, running '
+                          f'{len(campaign.unfinished)} unfinished iterations again.')
+    if symtuner.prior is not None:
+        campaign.exploration_steps = 0
+
+    campaign.status = CampaignStatus(output_dir / 'status.json', args.status_interval,
+                                     poll=lambda: {'elapsed': time_budget_handler.elapsed,
+                                                   'replay_queue': symtuner.replay_queued,
+                                                   'phases': symtuner.timer.summary()[0]},
+                                     target=target['llvm_bc'],
+                                     output_dir=str(Path(output_dir).absolute()),
+                                     budget=target['budget'], iteration=campaign.finished,
+                                     testcases=len(symtuner.data))
+    campaign.status.start()
+    return campaign
+
+
+def run_campaigns(args, campaigns, symbolic_executor, coordinator=None):
+    '''Run campaigns until their time budgets expire
+
+    Run jobs of the campaigns on the slots of symbolic executor (`--jobs`), or on the workers of
+    the coordinator, picked by `symtuner.campaign.FairShareScheduler`. The testcases of each job
+    are evaluated in background on the replay workers, so that the slot runs the next job as
+    soon as symbolic executor finishes. A checkpoint of each campaign is saved at the end.
+
+    Args:
+        args: Parsed commandline arguments.
+        campaigns: A list of `symtuner.campaign.Campaign` made by `make_campaign`.
+        symbolic_executor: A `symtuner.symbolic_executor.SymbolicExecutor` to run jobs with.
+        coordinator: A `symtuner.distributed.Coordinator` to run jobs on its workers. By
+            default, jobs run locally.
+    '''
+
+    scheduler = FairShareScheduler(campaigns)
+
+    def slots():
+        if coordinator is not None:
+            return coordinator.slots()
+        return args.jobs
+
+    def has_idle_slot():
+        if coordinator is not None:
+            return coordinator.free_slots() > 0
+        # Without pipelining or parallel jobs, sample the next job with the results of the
+        # previous one, like the sequential sample, run, and evaluate loop
+        if not args.pipeline and args.jobs == 1 and len(evaluating) > 0:
+            return False
+        # At most one job per slot waits for evaluation, so that evaluation does not fall behind
+        return len(running) < args.jobs and len(running) + len(evaluating) < 2 * args.jobs
+
+    def next_job():
+        while True:
+            campaign = scheduler.pick()
+            if campaign is None:
+                return None, None
+            job = campaign.next_job(symbolic_executor)
+            if job is not None:
+                return campaign, job
+
+    def expired():
+        return all(campaign.expired or campaign.time_budget_handler.elapsed
+                   > campaign.time_budget_handler.total_budget for campaign in campaigns)
+
+    # Jobs running symbolic executor, and jobs whose testcases are being evaluated
+    running = {}
+    evaluating = {}
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        while True:
+
+            # Fill idle slots with jobs of the campaigns picked by the scheduler
+            while has_idle_slot():
+                campaign, job = next_job()
+                if campaign is None:
+                    break
+                iteration, time_budget, parameters = job
+                def on_start(process, status=campaign.status, iteration=iteration,
+                             time_budget=time_budget, parameters=dict(parameters)):
+                    status.start_klee(iteration, process.pid, time_budget, parameters)
+                if coordinator is not None:
+                    campaign.status.start_klee(iteration, None, time_budget, dict(parameters))
+                    future = coordinator.submit(iteration, parameters,
+                                                Path(parameters['-output-dir']))
+                elif args.pipeline:
+                    future = executor.submit(run_pipelined, symbolic_executor, campaign.symtuner,
+                                             campaign.llvm_bc, parameters, campaign.gcov_obj,
+                                             campaign.evaluation_kwargs,
+                                             stall_timeout=args.stall_timeout,
+                                             on_start=on_start)
+                else:
+                    future = executor.submit(run_symbolic_executor, symbolic_executor,
+                                             campaign.llvm_bc, parameters,
+                                             stall_timeout=args.stall_timeout,
+                                             on_start=on_start)
+                running[future] = (campaign, iteration, parameters)
+
+            if len(running) == 0 and len(evaluating) == 0:
+                if coordinator is None or expired():
+                    break
+                # Wait for workers to connect
+                coordinator.wait_for_slot(timeout=1)
+                continue
+
+            # Collect results as soon as each symbolic executor or evaluation finishes. With
+            # workers, wake up regularly to give jobs to newly connected workers.
+            timeout = 1 if coordinator is not None else None
+            done, _ = wait([*running, *evaluating], timeout=timeout,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in evaluating:
+                    campaign, iteration, parameters, testcases, running_time, stalled, start = \
+                        evaluating.pop(future)
+                    campaign.finish(iteration, parameters, testcases, running_time,
+                                    future.result(), time.monotonic() - start, slots(), stalled)
+                    continue
+
+                campaign, iteration, parameters = running.pop(future)
+                campaign.status.finish_klee(iteration)
+                if coordinator is not None:
+                    try:
+                        testcases, results, running_time, evaluation_time, stalled = \
+                            future.result()
+                    except (ConnectionError, RuntimeError) as e:
+                        get_logger().warning(f'{campaign.log_prefix}'
+                                             f'Iteration: {iteration + 1} is lost: {e}')
+                        campaign.lose(iteration)
+                        continue
+                    campaign.finish(iteration, parameters, testcases, running_time, results,
+                                    evaluation_time, slots(), stalled)
+                    continue
+                if args.pipeline:
+                    testcases, evaluations, running_time, stalled = future.result()
+                    evaluation = gather(evaluations)
+                else:
+                    testcases, running_time, stalled = future.result()
+                    evaluation = campaign.evaluate(testcases)
+                evaluating[evaluation] = (campaign, iteration, parameters, testcases,
+                                          running_time, stalled, time.monotonic())
+
+    for campaign in campaigns:
+        campaign.save_checkpoint()
+        if campaign.corpus is not None:
+            campaign.corpus.close()
+            get_logger().info(f'{campaign.log_prefix}'
+                              f'Testcases linked: {campaign.corpus.linked} '
+                              f'pruned: {campaign.corpus.pruned} '
+                              f'Iterations archived: {campaign.corpus.archived}')
+        campaign.status.stop()
+
+
+def manifest_main(args, targets):
+    '''Run SymTuner on the targets of a manifest
+
+    Run campaigns on all targets of a manifest at once. Slots of symbolic executor (`--jobs`)
+    are shared among the campaigns by `symtuner.campaign.FairShareScheduler`, and so are replay
+    workers (`--replay-jobs`). The outputs of each target are stored in a directory named after
+    the target in the output directory.
+
+    Args:
+        args: Parsed commandline arguments.
+        targets: A list of targets returned by `symtuner.campaign.load_manifest`.
+    '''
+
+    # Warm start from the outputs of the same targets in previous manifest runs. These are loaded
+    # before the output directory is deleted, which may contain them.
+    priors = {}
+    for target in targets:
+        warm_start = [Path(path) / target['name'] / 'checkpoint.pkl.gz'
+                      for path in args.warm_start]
+        priors[target['name']] = [load_prior(path) for path in warm_start if path.exists()]
+
+    output_dir = Path(args.output_dir)
+    if not args.resume and output_dir.exists():
+        remove_tree(output_dir)
+        get_logger().warning('Existing output directory is deleted: '
+                             f'{output_dir}')
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Executables and replay workers are shared by all targets
+    symbolic_executor = KLEE(args.klee)
+    klee_replay = KLEEReplay(args.klee_replay)
+    if args.coverage_backend == 'native':
+        coverage_backend = GCDAReader()
+    else:
+        coverage_backend = GCov(args.gcov)
+    replay_pool = ReplayPool(args.replay_jobs, output_dir / 'gcov-prefix')
+    replay_cache = args.replay_cache
+
+    campaigns = []
+    for target in targets:
+        target_dir = output_dir / target['name']
+        checkpoint_path = target_dir / 'checkpoint.pkl.gz'
+        checkpoint = None
+        if args.resume:
+            if checkpoint_path.exists():
+                checkpoint = load_checkpoint(checkpoint_path)
+                get_logger().info(f'Resume {target["name"]} from the checkpoint: '
+                                  f'{checkpoint_path}')
+            elif target_dir.exists():
+                remove_tree(target_dir)
+                get_logger().warning(f'Checkpoint not found: {checkpoint_path}. '
+                                     f'Start a new run of {target["name"]}.')
+
+        campaign = make_campaign(args, target, target_dir, checkpoint, priors[target['name']],
+                                 klee_replay, coverage_backend, replay_pool, replay_cache)
+        # One replay cache database is shared by all targets
+        replay_cache = campaign.symtuner.replay_cache
+        campaigns.append(campaign)
+
+    get_logger().info(f'All configuration loaded. Start testing {len(campaigns)} targets.')
+    run_campaigns(args, campaigns, symbolic_executor)
+
+    total_coverage, total_bugs = 0, 0
+    for campaign in campaigns:
+        coverage, bugs = campaign.symtuner.get_coverage_and_bugs()
+        total_coverage += len(coverage)
+        total_bugs += len(bugs)
+        get_logger().info(f'Target: {campaign.name} '
+                          f'Iterations: {campaign.finished} '
+                          f'Slot time: {campaign.used:.2f}s '
+                          f'Coverage: {len(coverage)} '
+                          f'Bugs: {len(bugs)}')
+    if replay_cache is not None:
+        get_logger().info(f'Replay cache hits: {replay_cache.hits} '
+                          f'misses: {replay_cache.misses}')
+    get_logger().info(f'SymTuner done. Achieve {total_coverage} coverage '
+                      f'and found {total_bugs} bugs on {len(campaigns)} targets.')
+
+
+def worker_main(argv):
+    '''Main entry for distributed tuning workers
+
+    Main entry for `symtuner worker`. Connect to a coordinator (`symtuner --listen`), and run
+    symbolic executor and evaluate testcases with parameters from the coordinator.
+
+    Args:
+        argv: A list of arguments after `worker`.
+    '''
+
+    parser = argparse.ArgumentParser(prog='symtuner worker')
+    parser.add_argument('--connect', required=True, type=str, metavar='ADDRESS',
+                        help='Address of the coordinator: HOST:PORT, PORT for localhost, or '
+                             'unix:PATH')
+    parser.add_argument('--token-file', default=None, type=str, metavar='PATH',
+                        help='File with the token of the coordinator, e.g. worker-token in its '
+                             'output directory (default=SYMTUNER_TOKEN environment variable)')
+    parser.add_argument('--klee', default='klee', type=str,
+                        help='Path to "klee" executable (default=klee)')
+    parser.add_argument('--klee-replay', default='klee-replay', type=str,
+                        help='Path to "klee-replay" executable (default=klee-replay)')
+    parser.add_argument('--gcov', default='gcov', type=str,
+                        help='Path to "gcov" executable (default=gcov)')
+    parser.add_argument('--coverage-backend', default='gcov', choices=['gcov', 'native'],
+                        help='How to calculate coverage from gcda files (default=gcov)')
+    parser.add_argument('-d', '--output-dir', default='symtuner-worker', type=str,
+                        help='Directory to run symbolic executor in. Testcases are sent to the '
+                             'coordinator and deleted here (default=symtuner-worker)')
+    parser.add_argument('-j', '--jobs', default=1, type=int, metavar='INT',
+                        help='The number of symbolic executor instances to run concurrently '
+                             '(default=1)')
+    parser.add_argument('--replay-jobs', default=1, type=int, metavar='INT',
+                        help='The number of testcases to replay concurrently (default=1)')
+    parser.add_argument('--gcov-depth', default=None, type=int,
+                        help='Depth to search for gcda and gcov files from gcov_obj '
+                             '(default=setting of the coordinator)')
+    parser.add_argument('--stall-timeout', default=None, type=int, metavar='INT',
+                        help='Stop a symbolic executor run early if it generates no new testcase '
+                             'for this many seconds (default=setting of the coordinator)')
+    parser.add_argument('--connect-timeout', default=60, type=int, metavar='INT',
+                        help='Seconds to keep trying to connect to the coordinator (default=60)')
+    parser.add_argument('--name', default=None, type=str,
+                        help='Name of the worker shown at the coordinator '
+                             '(default=host name and process id)')
+    parser.add_argument('--debug', action='store_true',
+                        help='Log the debug messages')
+    parser.add_argument('llvm_bc', nargs='?', default=None,
+                        help='LLVM bitecode file for klee (default=target of the coordinator)')
+    parser.add_argument('gcov_obj', nargs='?', default=None,
+                        help='Executable with gcov support (default=target of the coordinator)')
+    args = parser.parse_args(argv)
+
+    if args.debug:
+        get_logger().setLevel('DEBUG')
+    if args.jobs < 1:
+        parser.error('--jobs must be a positive integer')
+    if args.replay_jobs < 1:
+        parser.error('--replay-jobs must be a positive integer')
+    try:
+        token = load_token(args.token_file)
+    except OSError as e:
+        parser.error(f'Failed to read the token: {e}')
+    if token is None:
+        parser.error('Token of the coordinator is required: --token-file or SYMTUNER_TOKEN')
+
+    output_dir = Path(args.output_dir)
+    if args.coverage_backend == 'native':
+        coverage_backend = GCDAReader()
+    else:
+        coverage_backend = args.gcov
+    symtuner = KLEESymTuner(args.klee_replay, coverage_backend,
+                            replay_jobs=args.replay_jobs,
+                            gcov_prefix_dir=output_dir.absolute() / 'gcov-prefix')
+    evaluation_argument = None
+    if args.gcov_depth is not None:
+        evaluation_argument = {'folder_depth': args.gcov_depth}
+    llvm_bc = str(Path(args.llvm_bc).absolute()) if args.llvm_bc is not None else None
+    worker = Worker(args.connect, token, KLEE(args.klee), symtuner, output_dir, llvm_bc,
+                    args.gcov_obj, args.jobs, evaluation_argument, args.stall_timeout, args.name,
+                    args.connect_timeout)
+    try:
+        worker.run()
+    except ConnectionError as e:
+        get_logger().error(str(e))
+        sys.exit(1)
+
+
 def main(argv=None):
     '''Main entry for console script for SymTuner for KLEE
 
@@ -28,6 +568,9 @@ def main(argv=None):
 
     if argv == None:
         argv = sys.argv[1:]
+    if len(argv) > 0 and argv[0] == 'worker':
+        worker_main(argv[1:])
+        return
 
     # Commandline argument parser
     parser = argparse.ArgumentParser()
@@ -40,11 +583,20 @@ def main(argv=None):
                             help='Path to "klee-replay" executable (default=klee-replay)')
     executable.add_argument('--gcov', default='gcov', type=str,
                             help='Path to "gcov" executable (default=gcov)')
+    executable.add_argument('--coverage-backend', default='gcov', choices=['gcov', 'native'],
+                            help='How to calculate coverage from gcda files: run "gcov" executable or '
+                                 'read gcda and gcno files natively (default=gcov)')
 
     # Hyperparameters
     hyperparameters = parser.add_argument_group('hyperparameters')
     hyperparameters.add_argument('-s', '--search-space', default=None, type=str, metavar='JSON',
                                  help='Json file defining parameter search space')
+    hyperparameters.add_argument('--sampler', default='symtuner', choices=('symtuner', 'thompson'),
+                                 help='How to sample parameters. "symtuner" samples with the '
+                                      'explore and exploit policies, and "thompson" samples each '
+                                      'parameter value by Thompson sampling on whether runs with '
+                                      'it covered new branches or found new bugs '
+                                      '(default=symtuner)')
     hyperparameters.add_argument('--exploit-portion', default=0.7, type=float, metavar='FLOAT',
                                  help='Portion of exploitation in SymTuner (default=0.7)')
     hyperparameters.add_argument('--step', default=20, type=int, metavar='INT',
@@ -55,6 +607,18 @@ def main(argv=None):
                                  help='A number that is multiplied to increase small budget. (default=2)')
     hyperparameters.add_argument('--minimum-time-budget', default=30, type=int, metavar='INT',
                                  help='Minimum time budget to perform symbolic execution (default=30)')
+    hyperparameters.add_argument('--budget-scheduler', default='fixed',
+                                 choices=('fixed', 'adaptive'),
+                                 help='How to pick time budgets. "fixed" increases time budget by '
+                                      '--increase-ratio every --step runs, and "adaptive" picks '
+                                      'among such time budgets by the coverage gained per second '
+                                      'with each, moving to a larger one when smaller ones '
+                                      'saturate (default=fixed)')
+    hyperparameters.add_argument('--max-evaluation-share', default=None, type=float,
+                                 metavar='FLOAT',
+                                 help='Maximum share of wall time to spend evaluating testcases. '
+                                      'If evaluation takes more, time budget is increased early '
+                                      '(default=no cap)')
     hyperparameters.add_argument('--exploration-steps', default=20, type=int, metavar='INT',
                                  help='The number of symbolic execution runs that SymTuner focuses only on exploration (default=20)')
 
@@ -67,6 +631,71 @@ def main(argv=None):
                         help='Log the debug messages')
     parser.add_argument('--gcov-depth', default=1, type=int,
                         help='Depth to search for gcda and gcov files from gcov_obj to calculate code coverage (default=1)')
+    parser.add_argument('-j', '--jobs', default=1, type=int, metavar='INT',
+                        help='The number of symbolic executor instances to run concurrently (default=1)')
+    parser.add_argument('--replay-jobs', default=1, type=int, metavar='INT',
+                        help='The number of testcases to replay concurrently (default=1)')
+    parser.add_argument('--stall-timeout', default=None, type=int, metavar='INT',
+                        help='Stop a symbolic executor run early if it generates no new testcase '
+                             'for this many seconds, and give the unused time to the next runs '
+                             '(default=never stop early)')
+    parser.add_argument('--replay-cache', default=None, type=str, metavar='PATH',
+                        help='Path to a database to cache evaluation results of testcases. '
+                             'Testcases with the same content are evaluated only once, across '
+                             'iterations and runs on the same target (default=no cache)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume from the checkpoint in the output directory instead of '
+                             'deleting the output directory. If no checkpoint is found, start '
+                             'a new run')
+    parser.add_argument('--checkpoint-interval', default=300, type=int, metavar='INT',
+                        help='Minimum seconds between checkpoints. A checkpoint is saved after '
+                             'an iteration finishes and when SymTuner terminates (default=300)')
+    parser.add_argument('--warm-start', default=[], type=str, nargs='+', metavar='PATH',
+                        help='Checkpoints or output directories of previous runs to learn the '
+                             'initial exploit policy from. Exploration steps are skipped when '
+                             'given (default=start from scratch)')
+    parser.add_argument('--result-store', default='memory', choices=('memory', 'disk'),
+                        help='Where to keep evaluation results of testcases. With "disk", only '
+                             'testcases covering new branches or finding bugs are kept in memory '
+                             'and the others are spilled into the output directory '
+                             '(default=memory)')
+    parser.add_argument('--result-cache-size', default=64, type=int, metavar='INT',
+                        help='Megabytes of spilled results to cache in memory with '
+                             '--result-store disk (default=64)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Evaluate testcases in background as soon as the symbolic executor '
+                             'generates them, instead of after the symbolic executor terminates')
+    parser.add_argument('--listen', default=None, type=str, metavar='ADDRESS',
+                        help='Run as a coordinator of distributed tuning at this address '
+                             '(HOST:PORT, PORT for localhost, or unix:PATH). Symbolic executors '
+                             'are run by workers started with "symtuner worker --connect ADDRESS" '
+                             'instead of locally, and --jobs is ignored. Workers must present '
+                             'the token in SYMTUNER_TOKEN, or else in worker-token of the output '
+                             'directory, made at start (default=run locally)')
+    parser.add_argument('--corpus-dedup', action='store_true',
+                        help='Hard-link testcases with the same content to one file')
+    parser.add_argument('--corpus-prune', action='store_true',
+                        help='Delete testcases that covered no new branches and found no bugs, '
+                             'except for seeds. They are kept in the archives with '
+                             '--corpus-archive')
+    parser.add_argument('--corpus-archive', action='store_true',
+                        help='Pack the outputs of symbolic executor other than the kept '
+                             'testcases into iteration-<i>.tar.gz in background, once each '
+                             'iteration is evaluated')
+    parser.add_argument('--manifest', default=None, type=str, metavar='JSON',
+                        help='Json file listing targets to test at once, with their own budgets '
+                             'and search spaces. Slots of --jobs are shared among the targets by '
+                             'the coverage gained per second with each, and the outputs of each '
+                             'target are stored in its own directory under the output directory. '
+                             'llvm_bc and gcov_obj are not needed, and -t is the budget of '
+                             'targets without one (default=single target)')
+    parser.add_argument('--status-interval', default=10, type=int, metavar='INT',
+                        help='Seconds between writes of the live status file (status.json in the '
+                             'output directory) while nothing changes (default=10)')
+    parser.add_argument('--status-port', default=None, type=int, metavar='INT',
+                        help='Serve the live status on localhost at this port, as JSON at '
+                             '/status and OpenMetrics at /metrics. If 0, a free port is chosen '
+                             'and logged (default=no endpoint)')
 
     # Required arguments
     required = parser.add_argument_group('required arguments')
@@ -88,68 +717,132 @@ def main(argv=None):
             get_logger().info('Example space configuration json is generated: example-space.json')
         sys.exit(0)
 
+    if args.jobs < 1:
+        parser.error('--jobs must be a positive integer')
+    if args.replay_jobs < 1:
+        parser.error('--replay-jobs must be a positive integer')
+    if args.max_evaluation_share is not None and not 0 < args.max_evaluation_share < 1:
+        parser.error('--max-evaluation-share must be between 0 and 1')
+    for path in args.warm_start:
+        if not Path(path).exists():
+            parser.error(f'--warm-start not found: {path}')
+
+    if args.manifest is not None:
+        if args.listen is not None or args.status_port is not None:
+            parser.error('--listen and --status-port are not supported with --manifest')
+        try:
+            targets = load_manifest(args.manifest, args.budget)
+        except (OSError, ValueError) as e:
+            parser.error(f'Failed to load the manifest: {e}')
+        manifest_main(args, targets)
+        return
+
     if args.llvm_bc is None or args.gcov_obj is None or args.budget is None:
         parser.print_usage()
         print('following parameters are required: -t, llvm_bc, gcov_obj')
         sys.exit(1)
 
     output_dir = Path(args.output_dir)
-    if output_dir.exists():
-        shutil.rmtree(str(output_dir))
+    checkpoint_path = output_dir / 'checkpoint.pkl.gz'
+    checkpoint = None
+    if args.resume:
+        if checkpoint_path.exists():
+            checkpoint = load_checkpoint(checkpoint_path)
+            get_logger().info(f'Resume from the checkpoint: {checkpoint_path}')
+        else:
+            get_logger().warning(f'Checkpoint not found: {checkpoint_path}. Start a new run.')
+
+    # Warm start from previous runs, loaded before the output directory is deleted, which may
+    # contain them
+    priors = []
+    if checkpoint is None:
+        for path in args.warm_start:
+            path = Path(path)
+            if path.is_dir():
+                path = path / 'checkpoint.pkl.gz'
+            if not path.exists():
+                parser.error(f'--warm-start checkpoint not found: {path}')
+            try:
+                priors.append(load_prior(path))
+            except (OSError, EOFError, pickle.UnpicklingError, ValueError) as e:
+                parser.error(f'Failed to load --warm-start checkpoint {path}: {e}')
+
+    if checkpoint is None and output_dir.exists():
+        remove_tree(output_dir)
         get_logger().warning('Existing output directory is deleted: '
                              f'{output_dir}')
-    output_dir.mkdir(parents=True)
-    coverage_csv = output_dir / 'coverage.csv'
-    coverage_csv.touch()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    get_logger().info(
+        f'Coverage will be recoreded at "{output_dir / "coverage.csv"}" at every iteration.')
     get_logger().info(
-        f'Coverage will be recoreded at "{coverage_csv}" at every iteration.')
-    found_bugs_txt = output_dir / 'found_bugs.txt'
-    found_bugs_txt.touch()
+        f'Found bugs will be recoreded at "{output_dir / "found_bugs.txt"}" at every iteration.')
     get_logger().info(
-        f'Found bugs will be recoreded at "{found_bugs_txt}" at every iteration.')
+        f'Time of each phase will be recoreded at "{output_dir / "metrics.jsonl"}" at every '
+        'iteration.')
 
     # Initialize Symbolic Executor
     symbolic_executor = KLEE(args.klee)
 
     # Initialize SymTuner
-    symtuner = KLEESymTuner(args.klee_replay, args.gcov, 10,
-                            args.search_space, args.exploit_portion)
-    evaluation_argument = {'folder_depth': args.gcov_depth}
+    if args.coverage_backend == 'native':
+        coverage_backend = GCDAReader()
+    else:
+        coverage_backend = GCov(args.gcov)
+    llvm_bc = str(Path(args.llvm_bc).absolute())
+    target = {
+        'name': None,
+        'llvm_bc': llvm_bc,
+        'gcov_obj': args.gcov_obj,
+        'budget': args.budget,
+        'search_space': args.search_space,
+        'gcov_depth': args.gcov_depth,
+        'weight': 1.,
+    }
+    campaign = make_campaign(args, target, output_dir, checkpoint, priors,
+                             KLEEReplay(args.klee_replay), coverage_backend,
+                             ReplayPool(args.replay_jobs, output_dir / 'gcov-prefix'),
+                             args.replay_cache)
+    symtuner = campaign.symtuner
+    status_server = None
+    if args.status_port is not None:
+        status_server = StatusServer(campaign.status, args.status_port)
+
+    # Workers of distributed tuning run symbolic executors instead
+    coordinator = None
+    if args.listen is not None:
+        token = load_token()
+        if token is None:
+            token_path = output_dir / 'worker-token'
+            token = make_token(token_path)
+            get_logger().info(f'Token for workers written at: {token_path}')
+        coordinator = Coordinator(args.listen, token, {
+            'llvm_bc': llvm_bc,
+            'gcov_obj': str(Path(args.gcov_obj).absolute()),
+            'evaluation_kwargs': campaign.evaluation_kwargs,
+            'stall_timeout': args.stall_timeout,
+        })
 
     # Do until timeout
     get_logger().info('All configuration loaded. Start testing.')
-    time_budget_handler = TimeBudgetHandler(args.budget, args.minimum_time_portion,
-                                            args.step, args.increase_ratio,
-                                            args.minimum_time_budget)
-    for i, time_budget in enumerate(time_budget_handler):
-
-        iteration_dir = output_dir / f'iteration-{i}'
-
-        # Sample parameters
-        policy = 'explore' if i < args.exploration_steps else None
-        parameters = symtuner.sample(policy=policy)
-
-        # Run symbolic executor
-        parameters[symbolic_executor.get_time_parameter()] = time_budget
-        parameters['-output-dir'] = str(iteration_dir)
-        testcases = symbolic_executor.run(args.llvm_bc, parameters)
-
-        # Collect result
-        symtuner.add(args.gcov_obj, parameters, testcases, evaluation_argument)
-
-        elapsed = time_budget_handler.elapsed
-        coverage, bugs = symtuner.get_coverage_and_bugs()
-        get_logger().info(f'Iteration: {i + 1} '
-                          f'Time budget: {time_budget} '
-                          f'Time elapsed: {elapsed} '
-                          f'Coverage: {len(coverage)} '
-                          f'Bugs: {len(bugs)}')
-        with coverage_csv.open('a') as stream:
-            stream.write(f'{elapsed}, {len(coverage)}\n')
-        with found_bugs_txt.open('w') as stream:
-            stream.writelines((f'Testcase: {Path(symtuner.get_testcase_causing_bug(bug)).absolute()} '
-                               f'Bug: {bug}\n' for bug in bugs))
+    run_campaigns(args, [campaign], symbolic_executor, coordinator)
+
+    jobs = args.jobs
+    if coordinator is not None:
+        jobs = max(coordinator.slots(), 1)
+        coordinator.close()
+    if status_server is not None:
+        status_server.close()
+
+    totals, counts, wall = symtuner.timer.summary()
+    for name, seconds in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+        get_logger().info(f'Phase: {name} Time: {seconds:.2f}s ({seconds / wall * 100:.1f}%) '
+                          f'Count: {counts[name]}')
+    get_logger().info(f'Overhead: {overhead_ratio(totals.get("klee", 0.), wall, jobs):.2f} '
+                      f'of {wall:.2f}s wall time')
 
+    if symtuner.replay_cache is not None:
+        get_logger().info(f'Replay cache hits: {symtuner.replay_cache.hits} '
+                          f'misses: {symtuner.replay_cache.misses}')
     coverage, bugs = symtuner.get_coverage_and_bugs()
     get_logger().info(f'SymTuner done. Achieve {len(coverage)} coverage '
                       f'and found {len(bugs)} bugs.')
@@ -0,0 +1,129 @@
+'''Persistent cache of testcase evaluation results
+
+This module contains a content-addressed cache of replay results. Symbolic executors often
+generate byte-identical testcases (e.g. when seeded with the same testcase), and evaluating such a
+testcase again gives the same coverage and bugs. Results are kept in an SQLite database, so the
+cache survives across iterations and campaigns on the same target.
+'''
+
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+import threading
+
+from symtuner.logger import get_logger
+
+
+class ReplayCache:
+    '''Content-addressed cache of testcase evaluation results
+
+    Cache of evaluation results keyed by the hash of the testcase content and a fingerprint of
+    the evaluation setup (the target program and the coverage backend). If the target program is
+    rebuilt, its fingerprint changes and previous results are not used anymore.
+    '''
+
+    def __init__(self, path, namespace=''):
+        '''Open a replay cache
+
+        Args:
+            path: Path to the SQLite database file. Created if not exists.
+            namespace: A string describing the evaluation setup (e.g. the coverage backend).
+                Results with different namespaces are never mixed.
+        '''
+
+        self.path = Path(path).absolute()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+
+        # Evaluations run on replay worker threads
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                    'fingerprint TEXT, digest TEXT, branches TEXT, bugs TEXT, '
+                                    'PRIMARY KEY (fingerprint, digest))')
+        get_logger().info(f'Use replay cache: {self.path}')
+
+    def fingerprint(self, target):
+        '''Get the fingerprint of the evaluation setup for the target program
+
+        Get the fingerprint of the evaluation setup. The content of the target program is hashed
+        only when the target program is modified.
+
+        Args:
+            target: A target program to evaluate with.
+
+        Returns:
+            A hex digest of the namespace and the content of the target program.
+        '''
+
+        target = Path(target).absolute()
+        stat = target.stat()
+        key = (str(target), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            fingerprint = self.fingerprints.get(key)
+        if fingerprint is None:
+            digest = hashlib.sha256(self.namespace.encode())
+            digest.update(target.read_bytes())
+            fingerprint = digest.hexdigest()
+            with self.lock:
+                self.fingerprints[key] = fingerprint
+        return fingerprint
+
+    def key(self, target, testcase):
+        '''Get the cache key of a testcase
+
+        Args:
+            target: A target program to evaluate with.
+            testcase: A testcase file.
+
+        Returns:
+            A tuple of the fingerprint of the evaluation setup and the hash of the testcase.
+        '''
+
+        digest = hashlib.sha256(Path(testcase).read_bytes()).hexdigest()
+        return self.fingerprint(target), digest
+
+    def get(self, key):
+        '''Find a cached result
+
+        Args:
+            key: A cache key from `ReplayCache.key`.
+
+        Returns:
+            A tuple of covered branches and found bugs, or None if not cached.
+        '''
+
+        with self.lock:
+            row = self.connection.execute('SELECT branches, bugs FROM results '
+                                          'WHERE fingerprint = ? AND digest = ?',
+                                          key).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        branches, bugs = row
+        return set(json.loads(branches)), set(json.loads(bugs))
+
+    def put(self, key, branches, bugs):
+        '''Store a result
+
+        Args:
+            key: A cache key from `ReplayCache.key`.
+            branches: A set of covered branches.
+            bugs: A set of found bugs.
+        '''
+
+        row = (*key, json.dumps(sorted(branches)), json.dumps(sorted(bugs)))
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', row)
+
+    def close(self):
+        '''Close the database'''
+
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,494 @@
+'''Campaigns of SymTuner on multiple targets
+
+This module contains campaigns of SymTuner on targets listed in a manifest, and a scheduler that
+shares one pool of symbolic executor slots among the campaigns by marginal coverage gain. Each
+campaign keeps its own SymTuner, time budget, and output directory, laid out like the output
+directory of a single target run.
+'''
+
+from concurrent.futures import Future
+from pathlib import Path
+import json
+import threading
+import time
+
+from symtuner.checkpoint import save_checkpoint
+from symtuner.logger import get_logger
+from symtuner.metrics import overhead_ratio
+from symtuner.metrics import write_metrics
+from symtuner.symtuner import COVERAGE_RATE_SMOOTHING
+
+
+# A campaign that used less than this portion of its fair share of slot time is picked first
+MINIMUM_SHARE = 0.5
+
+
+def load_manifest(path, budget=None):
+    '''Load a campaign manifest
+
+    Load a manifest listing targets of a campaign. A manifest is a JSON file such as:
+
+        {
+            "budget": 3600,
+            "targets": [
+                {"name": "gawk", "llvm_bc": "gawk/obj-llvm/gawk.bc",
+                 "gcov_obj": "gawk/obj-gcov/gawk", "budget": 7200,
+                 "search_space": "gawk.json", "gcov_depth": 1, "weight": 2}
+            ]
+        }
+
+    Only `llvm_bc` and `gcov_obj` are required for each target. The name defaults to the name of
+    `llvm_bc` without the suffix, the budget to the budget of the manifest, and the weight, which
+    scales the fair share of slot time of the target, to 1. Relative paths are relative to the
+    manifest.
+
+    Args:
+        path: Path to the manifest.
+        budget: Total time budget in seconds of targets without a budget in the manifest.
+
+    Returns:
+        A list of dictionaries of targets, with absolute paths and all keys filled in (
+        `search_space` and `gcov_depth` are None if not given).
+
+    Raises:
+        ValueError: If the manifest is malformed.
+    '''
+
+    path = Path(path)
+    manifest = json.loads(path.read_text())
+    if isinstance(manifest, list):
+        manifest = {'targets': manifest}
+    budget = manifest.get('budget', budget)
+    base = path.absolute().parent
+
+    targets = []
+    names = set()
+    for i, target in enumerate(manifest.get('targets', [])):
+        for key in ('llvm_bc', 'gcov_obj'):
+            if key not in target:
+                raise ValueError(f'Target {i} of the manifest has no "{key}": {path}')
+        llvm_bc = base / target['llvm_bc']
+        name = str(target.get('name', llvm_bc.stem))
+        if name in names or name == '' or Path(name).name != name:
+            raise ValueError(f'Invalid or duplicated target name in the manifest: {name}')
+        names.add(name)
+        target_budget = target.get('budget', budget)
+        if target_budget is None:
+            raise ValueError(f'Target {name} of the manifest has no budget')
+        weight = float(target.get('weight', 1))
+        if weight <= 0:
+            raise ValueError(f'Weight of target {name} of the manifest must be positive')
+        search_space = target.get('search_space')
+        targets.append({
+            'name': name,
+            'llvm_bc': str(llvm_bc),
+            'gcov_obj': str(base / target['gcov_obj']),
+            'budget': int(target_budget),
+            'search_space': str(base / search_space) if search_space is not None else None,
+            'gcov_depth': target.get('gcov_depth'),
+            'weight': weight,
+        })
+    if len(targets) == 0:
+        raise ValueError(f'No target in the manifest: {path}')
+    return targets
+
+
+def gather(futures):
+    '''Combine futures into one future
+
+    Args:
+        futures: A list of `concurrent.futures.Future`.
+
+    Returns:
+        A `concurrent.futures.Future` of a list of the results of `futures`, in the same order.
+        It is done when all of `futures` are done, with the first exception raised, if any.
+    '''
+
+    gathered = Future()
+    if len(futures) == 0:
+        gathered.set_result([])
+        return gathered
+    lock = threading.Lock()
+    remaining = [len(futures)]
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+        try:
+            gathered.set_result([future.result() for future in futures])
+        except Exception as e:
+            gathered.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    return gathered
+
+
+class Campaign:
+    '''Campaign of SymTuner on a target
+
+    Campaign of SymTuner on a target, either the only target of a run or one of the targets of a
+    manifest. The campaign samples parameters and time budgets for jobs on the shared slots,
+    evaluates the generated testcases on the replay workers, and records them in its output
+    directory. It also keeps the slot time it used and the coverage gained per second recently,
+    for `FairShareScheduler`.
+    '''
+
+    def __init__(self, name, llvm_bc, gcov_obj, output_dir, symtuner, time_budget_handler,
+                 evaluation_kwargs=None, exploration_steps=20, weight=1., status=None,
+                 checkpoint_interval=300, corpus=None):
+        '''Create a campaign
+
+        Args:
+            name: Name of the target, shown in logs. If None, the target is not named, e.g. when
+                it is the only target.
+            llvm_bc: A target program to run symbolic executor with.
+            gcov_obj: A target program to evaluate testcases with.
+            output_dir: Output directory of the campaign.
+            symtuner: A `symtuner.symtuner.SymTuner` of the campaign.
+            time_budget_handler: A `symtuner.symtuner.TimeBudgetHandler` of the campaign.
+            evaluation_kwargs: A dictionary of keyword arguments pass to evaluate method.
+            exploration_steps: The number of iterations to sample with the explore policy.
+            weight: Weight of the fair share of slot time of the campaign. By default, this will
+                be set as 1.
+            status: A `symtuner.status.CampaignStatus` to update with the progress. By default,
+                no status is updated.
+            checkpoint_interval: Minimum seconds between checkpoints. By default, this will be
+                set as 300.
+            corpus: A `symtuner.corpus.Corpus` to manage testcases on disk with. By default,
+                every testcase is kept as generated.
+        '''
+
+        self.name = name
+        self.llvm_bc = llvm_bc
+        self.gcov_obj = gcov_obj
+        self.output_dir = Path(output_dir)
+        self.symtuner = symtuner
+        self.time_budget_handler = time_budget_handler
+        self.evaluation_kwargs = evaluation_kwargs if evaluation_kwargs is not None else {}
+        self.exploration_steps = exploration_steps
+        self.weight = weight
+        self.status = status
+        self.checkpoint_interval = checkpoint_interval
+        self.corpus = corpus
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.coverage_csv = self.output_dir / 'coverage.csv'
+        self.found_bugs_txt = self.output_dir / 'found_bugs.txt'
+        self.metrics_jsonl = self.output_dir / 'metrics.jsonl'
+        self.checkpoint_path = self.output_dir / 'checkpoint.pkl.gz'
+        for path in (self.coverage_csv, self.found_bugs_txt, self.metrics_jsonl):
+            path.touch()
+
+        self.iteration = 0
+        self.finished = 0
+        self.time_budgets = iter(self.time_budget_handler)
+        self.expired = False
+        # Iteration to the time budget, its tier, and parameters of running jobs
+        self.running = {}
+        # Jobs running at the checkpoint resumed from, to run again
+        self.rerun = []
+        self.used = 0.
+        self.runs = 0
+        self.rate = None
+        self.last_checkpoint = time.monotonic()
+
+    @property
+    def usage(self):
+        '''Calculate slot time of the campaign in seconds
+
+        Calculate slot time used by finished jobs, plus the time budgets of running jobs. Note
+        that this is a property, not a method.
+
+        Returns:
+            Slot time in seconds.
+        '''
+
+        return self.used + sum(time_budget for time_budget, _, _ in self.running.values())
+
+    def next_job(self, symbolic_executor):
+        '''Sample the next job of the campaign
+
+        Args:
+            symbolic_executor: A `symtuner.symbolic_executor.SymbolicExecutor` to run the job.
+
+        Jobs that were running at the checkpoint resumed from are run again first, with the same
+        iterations, time budgets, and parameters.
+
+        Returns:
+            A tuple of the iteration, time budget, and parameters of the job. If time budget of
+            the campaign expired, return None.
+        '''
+
+        if len(self.rerun) > 0:
+            iteration, time_budget, tier, parameters = self.rerun.pop(0)
+            self.running[iteration] = (time_budget, tier, parameters)
+            return iteration, time_budget, parameters
+        if self.expired:
+            return None
+        time_budget, tier = next(self.time_budgets, (None, None))
+        if time_budget is None:
+            self.expired = True
+            get_logger().info(f'{self.log_prefix}Time budget expired.')
+            return None
+
+        iteration = self.iteration
+        policy = 'explore' if iteration < self.exploration_steps else None
+        with self.symtuner.timer.phase('sample'):
+            parameters = self.symtuner.sample(policy=policy)
+        parameters[symbolic_executor.get_time_parameter()] = time_budget
+        iteration_dir = self.output_dir / f'iteration-{iteration}'
+        parameters['-output-dir'] = str(iteration_dir.absolute())
+        self.running[iteration] = (time_budget, tier, parameters)
+        self.iteration += 1
+        return iteration, time_budget, parameters
+
+    @property
+    def log_prefix(self):
+        '''Prefix of the log messages of the campaign
+
+        Note that this is a property, not a method.
+
+        Returns:
+            A string naming the target, or an empty string if the target is not named.
+        '''
+
+        return f'Target: {self.name} ' if self.name is not None else ''
+
+    def evaluate(self, testcases):
+        '''Evaluate the testcases of a job in background
+
+        Schedule the evaluation of the testcases on the replay workers of SymTuner, which may be
+        shared with other campaigns.
+
+        Args:
+            testcases: Testcases generated by a job.
+
+        Returns:
+            A `concurrent.futures.Future` of a list of tuples of covered branches and found bugs
+            of each testcase.
+        '''
+
+        evaluations = [self.symtuner.submit_evaluation(self.gcov_obj, testcase,
+                                                       **self.evaluation_kwargs)
+                       for testcase in testcases]
+        return gather(evaluations)
+
+    def lose(self, iteration):
+        '''Give up a job whose results are lost
+
+        Give up a job whose results are lost (e.g. its worker disconnected), and give back its
+        time budget.
+
+        Args:
+            iteration: The iteration of the job.
+        '''
+
+        time_budget, _, _ = self.running.pop(iteration)
+        self.time_budget_handler.reclaim(time_budget)
+
+    def finish(self, iteration, parameters, testcases, running_time, results,
+               evaluation_time=0., slots=1, stalled=False):
+        '''Record the evaluated testcases of a job
+
+        Args:
+            iteration: The iteration of the job.
+            parameters: Parameters of the job.
+            testcases: Testcases generated by the job.
+            running_time: Running time of symbolic executor in seconds.
+            results: A list of tuples of covered branches and found bugs of each testcase.
+            evaluation_time: Seconds spent evaluating the testcases after symbolic executor
+                finished. By default, this will be set as 0.
+            slots: The number of symbolic executor slots, to calculate the overhead with. By
+                default, this will be set as 1.
+            stalled: Whether symbolic executor was stopped early because it stalled. The unused
+                time budget of a stalled job is given back, and the job is recorded as a sample
+                with low reward. By default, this will be set as False.
+
+        Returns:
+            The number of newly covered branches.
+        '''
+
+        symtuner = self.symtuner
+        timer = symtuner.timer
+        time_budget_handler = self.time_budget_handler
+        time_budget, tier, _ = self.running.pop(iteration)
+
+        update_start = time.monotonic()
+        covered = len(symtuner.get_coverage_and_bugs()[0])
+        start = len(symtuner.data)
+        symtuner.add_results(parameters, testcases, results, stalled)
+        if self.corpus is not None:
+            with timer.phase('corpus'):
+                self.corpus.add(self.output_dir / f'iteration-{iteration}', testcases,
+                                symtuner.get_retained_testcases(start))
+        timer.record('klee', running_time)
+        if stalled:
+            time_budget_handler.reclaim(time_budget - running_time)
+        evaluation_time += time.monotonic() - update_start
+        time_budget_handler.record(running_time, evaluation_time)
+
+        elapsed = time_budget_handler.elapsed
+        coverage, bugs = symtuner.get_coverage_and_bugs()
+        gain = len(coverage) - covered
+        seconds = running_time + evaluation_time
+        time_budget_handler.reward(tier, gain, seconds, stalled)
+
+        # Coverage gained per second of slot time recently
+        rate = gain / max(seconds, 1)
+        if self.rate is None:
+            self.rate = rate
+        else:
+            self.rate = COVERAGE_RATE_SMOOTHING * rate + (1 - COVERAGE_RATE_SMOOTHING) * self.rate
+        self.used += seconds
+        self.runs += 1
+
+        # Time since the previous iteration finished
+        phases, wall = timer.collect()
+        overhead = overhead_ratio(phases.get('klee', 0.), wall, max(slots, 1))
+        get_logger().info(f'{self.log_prefix}'
+                          f'Iteration: {iteration + 1} '
+                          f'Time budget: {time_budget} '
+                          f'Time elapsed: {elapsed} '
+                          f'Coverage: {len(coverage)} '
+                          f'Bugs: {len(bugs)} '
+                          f'Overhead: {overhead:.2f}')
+        with self.coverage_csv.open('a') as stream:
+            stream.write(f'{elapsed}, {len(coverage)}\n')
+        with self.found_bugs_txt.open('w') as stream:
+            stream.writelines((f'Testcase: {Path(symtuner.get_testcase_causing_bug(bug)).absolute()} '
+                               f'Bug: {bug}\n' for bug in bugs))
+        write_metrics(self.metrics_jsonl, {
+            'iteration': iteration + 1,
+            'time_budget': time_budget,
+            'elapsed': elapsed,
+            'testcases': len(testcases),
+            'stalled': stalled,
+            'wall': round(wall, 3),
+            'phases': {name: round(seconds, 3) for name, seconds in phases.items()},
+            'overhead_ratio': round(overhead, 4),
+        })
+        self.finished += 1
+        if self.status is not None:
+            self.status.update(iteration=self.finished, testcases=len(symtuner.data),
+                               coverage=len(coverage), bugs=len(bugs))
+
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint()
+        return gain
+
+    def get_state(self):
+        '''Get the state of the campaign to save in a checkpoint
+
+        Jobs running at the moment are saved along with the next iteration, so that they are
+        run again when resumed; their results are not in the learned state yet.
+
+        Returns:
+            A dictionary of the state of the campaign.
+        '''
+
+        running = [(iteration, time_budget, tier, parameters)
+                   for iteration, (time_budget, tier, parameters) in self.running.items()]
+        state = {
+            'iteration': self.iteration,
+            'finished': self.finished,
+            'running': sorted(self.rerun + running, key=lambda job: job[0]),
+            'symtuner': self.symtuner.get_state(),
+            'time_budget': self.time_budget_handler.get_state(),
+            'used': self.used,
+            'runs': self.runs,
+            'rate': self.rate,
+        }
+        if self.corpus is not None:
+            state['corpus'] = self.corpus.get_state()
+        return state
+
+    def set_state(self, state):
+        '''Restore the state of the campaign
+
+        Args:
+            state: A dictionary returned by `Campaign.get_state`.
+        '''
+
+        self.symtuner.set_state(state['symtuner'])
+        self.time_budget_handler.set_state(state['time_budget'])
+        self.iteration = state['iteration']
+        self.finished = state['finished']
+        self.rerun = list(state['running'])
+        self.used = state.get('used', 0.)
+        self.runs = state.get('runs', 0)
+        self.rate = state.get('rate')
+        if self.corpus is not None and 'corpus' in state:
+            self.corpus.set_state(state['corpus'])
+
+    @property
+    def unfinished(self):
+        '''Iterations to run again after resuming
+
+        Note that this is a property, not a method.
+
+        Returns:
+            A set of iterations that were running at the checkpoint resumed from.
+        '''
+
+        return {iteration for iteration, _, _, _ in self.rerun}
+
+    def save_checkpoint(self):
+        '''Save a checkpoint of the campaign'''
+
+        with self.symtuner.timer.phase('checkpoint'):
+            save_checkpoint(self.checkpoint_path, self.get_state())
+        self.last_checkpoint = time.monotonic()
+
+
+class FairShareScheduler:
+    '''Scheduler sharing slots among campaigns by marginal coverage gain
+
+    Scheduler that gives each free slot to the campaign with the highest coverage gained per
+    second recently, divided by the number of its running jobs plus one, so that slots move to
+    targets that still pay off. Campaigns that have not finished a job are picked first, and a
+    campaign that used less than `minimum_share` of its fair share of slot time (by weight) is
+    picked before the others, so that no target starves.
+    '''
+
+    def __init__(self, campaigns, minimum_share=MINIMUM_SHARE):
+        '''Create a fair share scheduler
+
+        Args:
+            campaigns: A list of `Campaign` to share slots among.
+            minimum_share: Portion of the fair share of slot time guaranteed to each campaign. By
+                default, this will be set as 0.5.
+        '''
+
+        self.campaigns = campaigns
+        self.minimum_share = minimum_share
+
+    def pick(self):
+        '''Pick a campaign to run the next job of
+
+        Returns:
+            A `Campaign` whose time budget is not expired yet, or None if every time budget
+            expired.
+        '''
+
+        active = [campaign for campaign in self.campaigns if not campaign.expired]
+        if len(active) == 0:
+            return None
+        for campaign in active:
+            if campaign.runs == 0 and len(campaign.running) == 0:
+                return campaign
+
+        total_usage = sum(campaign.usage for campaign in active)
+        total_weight = sum(campaign.weight for campaign in active)
+        if total_usage > 0:
+            def share(campaign):
+                fair = total_usage * campaign.weight / total_weight
+                return campaign.usage / fair
+            starved = [campaign for campaign in active if share(campaign) < self.minimum_share]
+            if len(starved) > 0:
+                return min(starved, key=share)
+        return max(active, key=lambda campaign: ((campaign.rate or 0.)
+                                                 / (len(campaign.running) + 1),
+                                                 -campaign.usage))
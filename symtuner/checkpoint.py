@@ -0,0 +1,53 @@
+'''Checkpoints of SymTuner campaigns
+
+This module contains functions to save and load the state of a SymTuner campaign, so that a
+campaign can be resumed after it is interrupted. Checkpoints are gzip-compressed pickles and are
+written atomically, so an interrupted write never corrupts the previous checkpoint.
+'''
+
+from pathlib import Path
+import gzip
+import os
+import pickle
+
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path, state):
+    '''Save a checkpoint atomically
+
+    Save a checkpoint into a temporary file next to the checkpoint, then replace the checkpoint
+    with it.
+
+    Args:
+        path: Path to the checkpoint file.
+        state: A picklable dictionary to save.
+    '''
+
+    path = Path(path)
+    state = dict(state, version=CHECKPOINT_VERSION)
+    tmp = path.parent / f'.{path.name}.tmp'
+    with gzip.open(str(tmp), 'wb', compresslevel=1) as stream:
+        pickle.dump(state, stream, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(str(tmp), str(path))
+
+
+def load_checkpoint(path):
+    '''Load a checkpoint
+
+    Args:
+        path: Path to the checkpoint file.
+
+    Returns:
+        A dictionary saved with `save_checkpoint`.
+
+    Raises:
+        ValueError: If the checkpoint is made by an incompatible version of SymTuner.
+    '''
+
+    with gzip.open(str(path), 'rb') as stream:
+        state = pickle.load(stream)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f'Incompatible checkpoint version: {state.get("version")}')
+    return state
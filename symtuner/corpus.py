@@ -0,0 +1,248 @@
+'''Testcases of SymTuner on disk
+
+This module contains a corpus manager that keeps iteration directories small: testcases with the
+same content are hard-linked to one file, testcases that added no coverage or bugs are pruned,
+and the other outputs of symbolic executor are packed into a compressed archive for each
+iteration in background. It also contains `remove_tree`, which deletes a directory in background
+after moving it out of the way.
+'''
+
+from pathlib import Path
+import hashlib
+import os
+import queue
+import shutil
+import tarfile
+import threading
+import time
+
+from symtuner.logger import get_logger
+
+
+# Directory in an iteration directory to move pruned testcases into until they are archived
+PRUNED_DIR = '.pruned'
+
+
+def remove_tree(path):
+    '''Delete a directory in background
+
+    Rename the directory to a hidden sibling, which is instant on the same file system, and delete
+    it in a background thread. The process waits for the deletion to finish before it exits.
+    Directories left by an interrupted deletion are deleted again when the same path is removed.
+
+    Args:
+        path: A directory to delete.
+
+    Returns:
+        The background `threading.Thread`, or None if nothing is deleted.
+    '''
+
+    path = Path(path)
+    trash = []
+    for leftover in path.parent.glob(f'.{path.name}.deleting-*'):
+        trash.append(leftover)
+    if path.exists():
+        moved = path.parent / f'.{path.name}.deleting-{os.getpid()}-{int(time.time() * 1000000)}'
+        path.rename(moved)
+        trash.append(moved)
+    if len(trash) == 0:
+        return None
+
+    def delete():
+        for directory in trash:
+            shutil.rmtree(str(directory), ignore_errors=True)
+        get_logger().debug(f'Deleted in background: {path}')
+
+    thread = threading.Thread(target=delete, name=f'remove-{path.name}')
+    thread.start()
+    return thread
+
+
+class Corpus:
+    '''Manager of testcases on disk
+
+    Manager of testcases in iteration directories. Once an iteration is evaluated,
+    `Corpus.add` hard-links its testcases to earlier testcases with the same content, and removes
+    the files of testcases that are not retained (with their error reports) if pruning. Both are
+    done right away, so any testcase left in place can be used as a seed at once. The other files
+    of the iteration (and the pruned testcases) are then packed into `iteration-<i>.tar.gz` next
+    to the iteration directory by a background thread, if archiving.
+    '''
+
+    def __init__(self, dedup=True, prune=False, archive=False):
+        '''Create a corpus manager
+
+        Args:
+            dedup: Whether to hard-link testcases with the same content. By default, this will be
+                set as True.
+            prune: Whether to delete testcases that are not retained. By default, this will be
+                set as False.
+            archive: Whether to pack the other files of iterations into compressed archives. By
+                default, this will be set as False.
+        '''
+
+        self.dedup = dedup
+        self.prune = prune
+        self.archive = archive
+
+        # Content hash to the first testcase with the content
+        self.hashes = {}
+        self.linked = 0
+        self.pruned = 0
+        self.archived = 0
+        self.queue = queue.Queue()
+        self.archiver = None
+
+    def add(self, iteration_dir, testcases, retained):
+        '''Manage the testcases of an evaluated iteration
+
+        Args:
+            iteration_dir: The iteration directory.
+            testcases: Testcases of the iteration.
+            retained: A set of testcases to keep, e.g. testcases that covered new branches or
+                found bugs, and seeds.
+
+        Returns:
+            Self object for chaining.
+        '''
+
+        iteration_dir = Path(iteration_dir)
+        retained = {Path(testcase) for testcase in retained}
+        kept = []
+        pruned = []
+        for testcase in map(Path, testcases):
+            if not self.prune or testcase in retained:
+                kept.append(testcase)
+            else:
+                pruned.append(testcase)
+
+        if self.dedup:
+            for testcase in kept:
+                self.link(testcase)
+
+        # Error reports of a testcase share its stem (e.g. test000001.ptr.err)
+        pruned_dir = iteration_dir / PRUNED_DIR
+        for testcase in pruned:
+            for path in testcase.parent.glob(f'{testcase.stem}.*'):
+                if self.archive:
+                    # Moved out of the way to be packed along with the other files
+                    pruned_dir.mkdir(exist_ok=True)
+                    path.rename(pruned_dir / path.name)
+                else:
+                    path.unlink()
+        self.pruned += len(pruned)
+        if self.archive:
+            self.queue_archive(iteration_dir, {testcase.stem for testcase in kept})
+        return self
+
+    def link(self, testcase):
+        '''Hard-link a testcase to an earlier testcase with the same content
+
+        Args:
+            testcase: A testcase to link.
+
+        Returns:
+            True if the testcase is linked.
+        '''
+
+        digest = hashlib.sha256(testcase.read_bytes()).hexdigest()
+        original = self.hashes.get(digest)
+        if original is None or not original.exists():
+            self.hashes[digest] = testcase
+            return False
+        if original.samefile(testcase):
+            return False
+        temporary = testcase.with_name(f'.{testcase.name}.link')
+        try:
+            os.link(str(original), str(temporary))
+        except OSError as e:
+            # e.g. too many links to the original
+            get_logger().debug(f'Failed to link {testcase} to {original}: {e}')
+            self.hashes[digest] = testcase
+            return False
+        os.replace(str(temporary), str(testcase))
+        self.linked += 1
+        return True
+
+    def queue_archive(self, iteration_dir, kept_stems):
+        '''Pack the iteration directory into an archive in background
+
+        Args:
+            iteration_dir: The iteration directory.
+            kept_stems: Stems of testcases to keep in the iteration directory.
+        '''
+
+        if self.archiver is None:
+            self.archiver = threading.Thread(target=self._archive_loop, name='corpus-archiver')
+            self.archiver.start()
+        self.queue.put((Path(iteration_dir), kept_stems))
+
+    def _archive_loop(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            try:
+                self.pack(*job)
+            except (OSError, tarfile.TarError) as e:
+                get_logger().warning(f'Failed to archive {job[0]}: {e}')
+
+    def pack(self, iteration_dir, kept_stems):
+        '''Pack the files of an iteration directory into an archive
+
+        Pack the files of an iteration directory, except for kept testcases and their error
+        reports, into `iteration-<i>.tar.gz` next to the directory, and delete the packed files.
+
+        Args:
+            iteration_dir: The iteration directory.
+            kept_stems: Stems of testcases to keep in the iteration directory.
+
+        Returns:
+            Path to the archive, or None if nothing is packed.
+        '''
+
+        files = [path for path in sorted(iteration_dir.iterdir())
+                 if path.name.split('.')[0] not in kept_stems]
+        if len(files) == 0:
+            return None
+        archive = iteration_dir.parent / f'{iteration_dir.name}.tar.gz'
+        temporary = iteration_dir.parent / f'.{archive.name}.tmp'
+        with tarfile.open(str(temporary), 'w:gz') as stream:
+            for path in files:
+                members = sorted(path.iterdir()) if path.name == PRUNED_DIR else [path]
+                for member in members:
+                    stream.add(str(member), arcname=f'{iteration_dir.name}/{member.name}')
+        os.replace(str(temporary), str(archive))
+        for path in files:
+            if path.is_dir():
+                shutil.rmtree(str(path))
+            else:
+                path.unlink()
+        self.archived += 1
+        return archive
+
+    def close(self):
+        '''Wait for queued iterations to be archived'''
+
+        if self.archiver is not None:
+            self.queue.put(None)
+            self.archiver.join()
+            self.archiver = None
+
+    def get_state(self):
+        '''Get the state of the corpus manager to save in a checkpoint
+
+        Returns:
+            A dictionary of the content hashes of testcases.
+        '''
+
+        return {'hashes': {digest: str(path) for digest, path in self.hashes.items()}}
+
+    def set_state(self, state):
+        '''Restore the state of the corpus manager
+
+        Args:
+            state: A dictionary returned by `Corpus.get_state`.
+        '''
+
+        self.hashes = {digest: Path(path) for digest, path in state['hashes'].items()}
@@ -0,0 +1,150 @@
+'''Count tables for SymTuner
+
+This module contains a table that counts how many times each value of a parameter is used. Counts
+are kept in a NumPy array indexed by the position of each value, so that probabilities of all
+values can be calculated at once.
+'''
+
+import numpy as np
+
+
+class CountTable:
+    '''Counts of parameter values
+
+    Counts of parameter values stored in a NumPy array. Each value is given a position in order of
+    appearance. This can be used as a dictionary from values to counts, and `CountTable.array`
+    gives the counts of all values in order of their positions.
+    '''
+
+    def __init__(self, counts=()):
+        '''Create a count table
+
+        Args:
+            counts: A dictionary of values and their counts, or an iterable of values to start
+                with zero counts.
+        '''
+
+        self.index = {}
+        self.order = []
+        self.counts = np.zeros(8, dtype=np.int64)
+        if hasattr(counts, 'items'):
+            for value, count in counts.items():
+                self[value] = count
+        else:
+            for value in counts:
+                self.position(value)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __contains__(self, value):
+        return value in self.index
+
+    def __getitem__(self, value):
+        return int(self.counts[self.index[value]])
+
+    def __setitem__(self, value, count):
+        position = self.position(value)
+        self.counts[position] = count
+
+    def __repr__(self):
+        return f'CountTable({dict(self.items())})'
+
+    def get(self, value, default=None):
+        position = self.index.get(value)
+        if position is None:
+            return default
+        return int(self.counts[position])
+
+    def keys(self):
+        return list(self.order)
+
+    def values(self):
+        return [int(count) for count in self.array()]
+
+    def items(self):
+        return list(zip(self.order, self.values()))
+
+    def add(self, value, count=1):
+        '''Increase the count of a value
+
+        Args:
+            value: A value to count. Added to the table if not exists.
+            count: An amount to increase. By default, this will be set as 1.
+        '''
+
+        position = self.position(value)
+        self.counts[position] += count
+
+    def position(self, value):
+        '''Get the position of a value
+
+        Get the position of a value in `CountTable.array`. If the value is not in the table, the
+        value is added with zero count.
+
+        Args:
+            value: A value.
+
+        Returns:
+            The position of the value.
+        '''
+
+        position = self.index.get(value)
+        if position is None:
+            position = len(self.order)
+            if position == len(self.counts):
+                self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)])
+            self.index[value] = position
+            self.order.append(value)
+        return position
+
+    def positions(self, values):
+        '''Get the positions of values
+
+        Args:
+            values: A list of values. Values not in the table are added with zero counts.
+
+        Returns:
+            A NumPy array of the positions of the values.
+        '''
+
+        return np.array([self.position(value) for value in values], dtype=np.int64)
+
+    def array(self):
+        '''Get counts of all values
+
+        Returns:
+            A NumPy array of counts in order of positions. This is a view of the table.
+        '''
+
+        return self.counts[:len(self.order)]
+
+    def zeros_like(self):
+        '''Make an empty table with the same values
+
+        Returns:
+            A `CountTable` with the same values and positions, and zero counts.
+        '''
+
+        table = CountTable()
+        table.index = dict(self.index)
+        table.order = list(self.order)
+        table.counts = np.zeros_like(self.counts)
+        return table
+
+
+def lookup(counts, values):
+    '''Get counts of values from a dictionary or a count table
+
+    Args:
+        counts: A dictionary of values and their counts, or a `CountTable`.
+        values: A list of values.
+
+    Returns:
+        A NumPy array of the counts of the values. Values not counted are 0.
+    '''
+
+    return np.array([counts.get(value, 0) for value in values], dtype=float)
@@ -0,0 +1,295 @@
+'''Compact coverage representation for SymTuner
+
+This module contains a compact representation of branch coverage. Branch names reported by
+coverage backends are interned into integer identifiers, and a set of covered branches is kept as
+a bitmap on top of Python integers so that unions and differences are done as bitwise operations.
+'''
+
+from array import array
+import heapq
+import math
+
+import numpy as np
+
+
+if hasattr(int, 'bit_count'):
+    def popcount(value):
+        '''Count set bits of a non-negative integer'''
+
+        return value.bit_count()
+else:
+    def popcount(value):
+        '''Count set bits of a non-negative integer'''
+
+        return bin(value).count('1')
+
+
+class Coverage(int):
+    '''A set of covered branches stored as a bitmap
+
+    A set of covered branches stored as a bitmap. The i-th bit is set if the branch interned as
+    `i` in `BranchTable` is covered. This supports the set operations used in SymTuner: union (`|`),
+    intersection (`&`), difference (`-`), `len`, membership and iteration over branch identifiers.
+    '''
+
+    __slots__ = ()
+
+    def __or__(self, other):
+        return Coverage(int.__or__(self, other))
+
+    __ror__ = __or__
+
+    def __and__(self, other):
+        return Coverage(int.__and__(self, other))
+
+    __rand__ = __and__
+
+    def __sub__(self, other):
+        return Coverage(int.__and__(self, ~int(other)))
+
+    def __len__(self):
+        return popcount(self)
+
+    def __contains__(self, bid):
+        return (self >> bid) & 1 == 1
+
+    def __iter__(self):
+        value = int(self)
+        while value:
+            low = value & -value
+            yield low.bit_length() - 1
+            value ^= low
+
+    def __repr__(self):
+        return f'Coverage({len(self)} branches)'
+
+    def __reduce__(self):
+        return (Coverage, (int(self),))
+
+
+class BranchTable:
+    '''Interning table of branch names
+
+    Interning table that maps branch names (e.g. `"file.c 742"`) to integer identifiers. The
+    identifiers are assigned in order of appearance and never change, so bitmaps made with the same
+    table can be combined.
+    '''
+
+    def __init__(self):
+        '''Create an empty branch table'''
+
+        self.ids = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, branches):
+        '''Convert branch names into a coverage bitmap
+
+        Convert branch names into a coverage bitmap. Unknown branch names are added to the table.
+
+        Args:
+            branches: An iterable of branch names.
+
+        Returns:
+            A `Coverage` of the given branches.
+        '''
+
+        indices = []
+        for branch in branches:
+            bid = self.ids.get(branch)
+            if bid is None:
+                bid = len(self.names)
+                self.ids[branch] = bid
+                self.names.append(branch)
+            indices.append(bid)
+        if len(indices) == 0:
+            return Coverage()
+
+        bits = np.zeros(max(indices) + 1, dtype=bool)
+        bits[indices] = True
+        packed = np.packbits(bits, bitorder='little')
+        return Coverage(int.from_bytes(packed.tobytes(), 'little'))
+
+    def names_of(self, coverage):
+        '''Convert a coverage bitmap into branch names
+
+        Args:
+            coverage: A `Coverage` made with this table.
+
+        Returns:
+            A set of branch names.
+        '''
+
+        return {self.names[bid] for bid in Coverage(coverage)}
+
+
+def greedy_cover(coverages, limit=None, sizes=None, universe=None):
+    '''Find a small set of coverages that covers all the covered branches
+
+    Greedy set cover with lazy evaluation. Each step picks the coverage that adds the most
+    branches not covered yet. Ties are broken like the original implementation, which stably
+    sorted the coverages by the number of uncovered branches at every step: by the numbers at
+    the previous steps, from the latest, and then by the position in `coverages`.
+
+    Each coverage is keyed by the history of its number of uncovered branches, as pairs of the
+    number and the step since which it has been so, from the latest. Keys are kept in a priority
+    queue and only brought up to date when they reach the top of the queue, because an outdated
+    key never comes after the up-to-date key of the same coverage. For the same reason, the steps
+    the number changed at are only searched for when a coverage reaches the top of the queue.
+
+    Args:
+        coverages: A list of `Coverage`s.
+        limit: Maximum number of coverages to pick. If not specified, pick until all covered
+            branches are covered.
+        sizes: A list of the number of branches in each coverage, if already known.
+        universe: The union of all coverages, if already known. Picking stops as soon as it is
+            covered, instead of draining the remaining coverages that add nothing.
+
+    Returns:
+        A list of indices of the picked coverages in the order of picking.
+    '''
+
+    if sizes is None:
+        sizes = [len(cov) for cov in coverages]
+    # Negated numbers of uncovered branches and steps, the index, and the step of the number
+    heap = [((-size, 0), i, 0) for i, size in enumerate(sizes) if size > 0]
+    heapq.heapify(heap)
+    # Coverages whose number changed at steps not searched yet, to the step of their exact key,
+    # the number at the step, and the exact key
+    unknown = {}
+
+    def changes(coverage, start, before, stop, after):
+        # Steps in (start, stop] the number of uncovered branches changed at, from the latest
+        if before == after:
+            return ()
+        if stop - start == 1:
+            return (-after, -stop)
+        middle = (start + stop) // 2
+        uncovered = popcount(coverage & masks[middle])
+        return (changes(coverage, middle, uncovered, stop, after)
+                + changes(coverage, start, before, middle, uncovered))
+
+    picked = []
+    accumulated = Coverage()
+    # Masks of the branches not covered after each step, as plain integers for speed
+    masks = [-1]
+    while len(heap) > 0 and (limit is None or len(picked) < limit):
+        if universe is not None and accumulated == universe:
+            break
+        key, i, step = heapq.heappop(heap)
+        current = len(picked)
+        coverage = int(coverages[i])
+        uncovered = popcount(coverage & masks[current]) if step < current else -key[0]
+        if uncovered == 0:
+            unknown.pop(i, None)
+            continue
+        if uncovered != -key[0]:
+            # Changed at a step in (step, current]. Until searched, key it as if changed at the
+            # latest possible step with nothing known before, which comes before the exact key.
+            if i not in unknown:
+                unknown[i] = (step, -key[0], key)
+            heapq.heappush(heap, ((-uncovered, -current, -math.inf), i, current))
+            continue
+        if i in unknown:
+            start, before, exact = unknown.pop(i)
+            key = changes(coverage, start, before, -key[1], uncovered) + exact
+            heapq.heappush(heap, (key, i, current))
+            continue
+        accumulated = accumulated | coverages[i]
+        masks.append(~int(accumulated))
+        picked.append(i)
+    return picked
+
+
+class CoreSet:
+    '''Core testcases maintained as testcases arrive
+
+    Core testcases that cover all covered branches and found bugs. This keeps the total coverage,
+    found bugs, the latest testcase finding each bug, and the number of branches and the marginal
+    contribution of each testcase as they are added. The greedy cover is computed lazily and cached
+    until new coverage arrives, so every consumer in an iteration shares one computation.
+    '''
+
+    def __init__(self, data=None, coverages=None):
+        '''Create a core set
+
+        Args:
+            data: A list of quadruples of coverage, found bugs, a testcase, and used parameters
+                to start with.
+            coverages: A list of coverages owned by a result store (e.g.
+                `symtuner.store.MemoryStore.coverages`). If given, coverages are read from it
+                instead of being kept in the core set, and the store must append each coverage
+                along with `CoreSet.add`.
+        '''
+
+        self.shared = coverages is not None
+        self.coverages = coverages if self.shared else []
+        self.sizes = array('l')
+        self.gains = array('l')
+        self.total_coverage = Coverage()
+        self.total_bugs = set()
+        self.bug_index = {}
+
+        self.order = []
+        self.outdated = False
+
+        if data is not None:
+            for cov, bugs, _, _ in data:
+                self.add(cov, bugs)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def add(self, coverage, bugs):
+        '''Add a result of a testcase
+
+        Args:
+            coverage: A `Coverage` of the testcase.
+            bugs: A set of bugs found by the testcase.
+
+        Returns:
+            The number of branches newly covered by the testcase.
+        '''
+
+        index = len(self.sizes)
+        gain = len(coverage - self.total_coverage)
+        if not self.shared:
+            self.coverages.append(coverage)
+        self.sizes.append(len(coverage))
+        self.gains.append(gain)
+        if gain > 0:
+            self.total_coverage = self.total_coverage | coverage
+        if len(coverage) > 0:
+            self.outdated = True
+        self.total_bugs.update(bugs)
+        for bug in bugs:
+            self.bug_index[bug] = index
+        return gain
+
+    def cover(self, limit=None):
+        '''Get testcases that cover all covered branches
+
+        Args:
+            limit: Maximum number of testcases to get. If not specified, get all testcases in the
+                greedy cover.
+
+        Returns:
+            A list of indices of testcases in the order of greedy set cover.
+        '''
+
+        if self.outdated:
+            self.order = greedy_cover(self.coverages, sizes=self.sizes,
+                                      universe=self.total_coverage)
+            self.outdated = False
+        return self.order[:limit]
+
+    def bug_finders(self):
+        '''Get the latest testcase finding each bug
+
+        Returns:
+            A list of indices of testcases, one for each found bug, from the latest testcase.
+        '''
+
+        return sorted(self.bug_index.values(), reverse=True)
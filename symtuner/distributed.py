@@ -0,0 +1,647 @@
+'''Distributed tuning with a coordinator and workers
+
+This module contains a coordinator that owns the state of SymTuner and hands out sampled
+parameters to workers, and workers that run symbolic executor and evaluate the generated
+testcases locally. They talk over TCP (`HOST:PORT`) or Unix sockets (`unix:PATH`) with JSON lines.
+Workers send back the testcases with their covered branches and found bugs, so the coordinator
+keeps all testcases in its own output directory, and seed files are sent to workers with jobs.
+
+A coordinator listens on localhost unless a host is given, and accepts only workers that present
+its token, a secret shared out of band (e.g. with `SYMTUNER_TOKEN`), before anything about the
+campaign is sent.
+'''
+
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import base64
+import hmac
+import json
+import os
+import secrets
+import shutil
+import socket
+import threading
+import time
+
+from symtuner.logger import get_logger
+
+
+SEED_FILE_KEYS = ('-seed-file', '--seed-file')
+# Host to listen on and connect to if an address has only a port
+DEFAULT_HOST = '127.0.0.1'
+# Limits on the greeting of a connecting worker, checked before it is accepted
+HELLO_TIMEOUT = 30
+HELLO_SIZE = 64 * 1024
+# Environment variable to share the token of a coordinator with
+TOKEN_ENV = 'SYMTUNER_TOKEN'
+
+
+def parse_address(address):
+    '''Parse an address of a coordinator
+
+    Args:
+        address: `HOST:PORT` for TCP, or `unix:PATH` for a Unix socket. The host may be
+            omitted (`PORT` or `:PORT`) for localhost.
+
+    Returns:
+        A tuple of a socket family and an address for the family.
+
+    Raises:
+        ValueError: If the address is malformed.
+    '''
+
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    if not port.isdigit():
+        raise ValueError(f'Invalid address (HOST:PORT or unix:PATH): {address}')
+    if host == '':
+        host = DEFAULT_HOST
+    return socket.AF_INET, (host, int(port))
+
+
+def make_token(path):
+    '''Make a token of a coordinator
+
+    Make a random token and write it into a file only the user can read, to pass to workers
+    (`symtuner worker --token-file PATH`).
+
+    Args:
+        path: Path to the file to write the token into.
+
+    Returns:
+        The token.
+    '''
+
+    token = secrets.token_urlsafe(32)
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as stream:
+        stream.write(token + '\n')
+    return token
+
+
+def load_token(path=None):
+    '''Load a token of a coordinator
+
+    Args:
+        path: Path to a file with the token. If not specified, the token is read from the
+            `SYMTUNER_TOKEN` environment variable.
+
+    Returns:
+        The token, or None if not given.
+    '''
+
+    if path is not None:
+        return Path(path).read_text().strip() or None
+    return os.environ.get(TOKEN_ENV) or None
+
+
+def encode_branches(branches):
+    '''Encode covered branches compactly
+
+    Group branch names (e.g. `"file.c 742"`) by the source file, so that each file name is sent
+    once.
+
+    Args:
+        branches: A set of branch names.
+
+    Returns:
+        A dictionary of a source file to a list of branches in it.
+    '''
+
+    encoded = {}
+    for branch in branches:
+        source, _, bid = branch.rpartition(' ')
+        encoded.setdefault(source, []).append(bid)
+    return encoded
+
+
+def decode_branches(encoded):
+    '''Decode covered branches encoded with `encode_branches`
+
+    Args:
+        encoded: A dictionary returned by `encode_branches`.
+
+    Returns:
+        A set of branch names.
+    '''
+
+    return {f'{source} {bid}' if source != '' else bid
+            for source, bids in encoded.items() for bid in bids}
+
+
+class Connection:
+    '''A connection sending and receiving JSON lines
+
+    A connection sending and receiving JSON lines over a socket. Sending is thread-safe.
+    '''
+
+    def __init__(self, sock):
+        '''Wrap a connected socket
+
+        Args:
+            sock: A connected socket.
+        '''
+
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        '''Send a message
+
+        Args:
+            message: A dictionary to send. Values that are not JSON types (e.g. paths) are sent
+                as strings.
+        '''
+
+        data = (json.dumps(message, default=str) + '\n').encode()
+        with self.lock:
+            self.sock.sendall(data)
+
+    def receive(self, limit=-1):
+        '''Receive a message
+
+        Args:
+            limit: Maximum bytes of the message. By default, the size is not limited.
+
+        Returns:
+            A received dictionary, or None if the connection is closed.
+
+        Raises:
+            ValueError: If the message is malformed or larger than `limit`.
+        '''
+
+        line = self.reader.readline(limit)
+        if not line:
+            return None
+        if not line.endswith(b'\n'):
+            raise ValueError('Message too large or truncated')
+        return json.loads(line.decode())
+
+    def close(self):
+        '''Close the connection'''
+
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.reader.close()
+        self.sock.close()
+
+
+class _RemoteWorker:
+
+    def __init__(self, connection, name, jobs):
+        self.connection = connection
+        self.name = name
+        self.jobs = jobs
+        # Iteration to a future of its result and the directory to store its testcases in
+        self.running = {}
+
+
+class Coordinator:
+    '''Coordinator of distributed tuning
+
+    Coordinator that accepts workers in background and runs jobs on them. Each job is a
+    `concurrent.futures.Future` of the testcases, their evaluation results, and running times, so
+    jobs on workers can be waited for like local symbolic executor runs. Workers are accepted
+    only if they present the token of the coordinator.
+    '''
+
+    def __init__(self, address, token, welcome=None):
+        '''Listen for workers
+
+        Args:
+            address: Address to listen on. `HOST:PORT` for TCP, or `unix:PATH` for a Unix socket.
+                If the host is omitted, only local connections are accepted. If the port is 0, a
+                free port is chosen.
+            token: A secret that workers must present to be accepted.
+            welcome: A dictionary sent to each worker when accepted, e.g. default targets.
+
+        Raises:
+            ValueError: If the token is empty.
+        '''
+
+        if not token:
+            raise ValueError('Token of the coordinator must not be empty')
+        self.token = token.encode()
+
+        family, address = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(address)
+        self.server.listen()
+        self.address = self.server.getsockname()
+        self.family = family
+        self.welcome = welcome if welcome is not None else {}
+
+        self.condition = threading.Condition()
+        self.workers = []
+        self.closed = False
+        self.accepter = threading.Thread(target=self._accept, daemon=True)
+        self.accepter.start()
+        get_logger().info(f'Waiting for workers at: {self.address}')
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(Connection(sock),), daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            connection.sock.settimeout(HELLO_TIMEOUT)
+            hello = connection.receive(HELLO_SIZE)
+            connection.sock.settimeout(None)
+        except (OSError, ValueError):
+            hello = None
+        if not isinstance(hello, dict) or hello.get('type') != 'hello':
+            connection.close()
+            return
+        token = hello.get('token')
+        if not isinstance(token, str) or not hmac.compare_digest(token.encode(), self.token):
+            get_logger().warning(f'Worker rejected with an invalid token: '
+                                 f'{hello.get("name", "")}')
+            try:
+                connection.send({'type': 'rejected', 'reason': 'invalid token'})
+            except OSError:
+                pass
+            connection.close()
+            return
+        try:
+            jobs = max(int(hello.get('jobs', 1)), 1)
+        except (TypeError, ValueError):
+            jobs = 1
+        worker = _RemoteWorker(connection, str(hello.get('name', '')), jobs)
+        connection.send(dict(self.welcome, type='welcome'))
+        with self.condition:
+            self.workers.append(worker)
+            self.condition.notify_all()
+        get_logger().info(f'Worker connected: {worker.name} ({worker.jobs} jobs)')
+
+        try:
+            while True:
+                message = connection.receive()
+                if message is None:
+                    break
+                with self.condition:
+                    future, iteration_dir = worker.running.pop(message['iteration'], (None, None))
+                    self.condition.notify_all()
+                if future is None:
+                    continue
+                if message['type'] == 'result':
+                    try:
+                        future.set_result(self.store(message, iteration_dir))
+                    except (OSError, ValueError, KeyError) as e:
+                        future.set_exception(e)
+                else:
+                    future.set_exception(RuntimeError(f'Worker {worker.name} failed: '
+                                                      f'{message.get("error")}'))
+        except (OSError, ValueError) as e:
+            get_logger().warning(f'Connection to worker {worker.name} failed: {e}')
+        finally:
+            with self.condition:
+                if worker in self.workers:
+                    self.workers.remove(worker)
+                lost, worker.running = worker.running, {}
+                self.condition.notify_all()
+            for future, _ in lost.values():
+                future.set_exception(ConnectionError(f'Worker disconnected: {worker.name}'))
+            connection.close()
+            if not self.closed:
+                get_logger().warning(f'Worker disconnected: {worker.name}')
+
+    @staticmethod
+    def store(message, iteration_dir):
+        '''Store testcases of a job result
+
+        Write testcases sent by a worker into the iteration directory.
+
+        Args:
+            message: A result message from a worker.
+            iteration_dir: A directory to write testcases into.
+
+        Returns:
+            A tuple of testcases, a list of tuples of covered branches and found bugs of each
+            testcase, symbolic executor running time, evaluation time in seconds, and whether
+            symbolic executor was stopped early because it stalled.
+        '''
+
+        iteration_dir = Path(iteration_dir).absolute()
+        iteration_dir.mkdir(parents=True, exist_ok=True)
+        testcases = []
+        results = []
+        for testcase in message['testcases']:
+            path = iteration_dir / Path(testcase['name']).name
+            path.write_bytes(base64.b64decode(testcase['data']))
+            testcases.append(path)
+            results.append((decode_branches(testcase['branches']), set(testcase['bugs'])))
+        return (testcases, results, message['running_time'], message['evaluation_time'],
+                message['stalled'])
+
+    def slots(self):
+        '''Get the number of jobs connected workers run at once
+
+        Returns:
+            The total number of jobs of connected workers.
+        '''
+
+        with self.condition:
+            return sum(worker.jobs for worker in self.workers)
+
+    def free_slots(self):
+        '''Get the number of jobs that can be submitted now
+
+        Returns:
+            The number of idle jobs of connected workers.
+        '''
+
+        with self.condition:
+            return self._free_slots()
+
+    def _free_slots(self):
+        return sum(max(worker.jobs - len(worker.running), 0) for worker in self.workers)
+
+    def wait_for_slot(self, timeout=None):
+        '''Wait until a job can be submitted
+
+        Args:
+            timeout: Seconds to wait at most. By default, wait forever.
+
+        Returns:
+            True if a job can be submitted.
+        '''
+
+        with self.condition:
+            return self.condition.wait_for(lambda: self._free_slots() > 0 or self.closed,
+                                           timeout) and not self.closed
+
+    def submit(self, iteration, parameters, iteration_dir):
+        '''Run a job on the most idle worker
+
+        Args:
+            iteration: The iteration of the job.
+            parameters: Parameters of symbolic executor, including the time budget. Seed files
+                are sent along with the parameters.
+            iteration_dir: A directory to write testcases of the job into.
+
+        Returns:
+            A `concurrent.futures.Future` of the result of `Coordinator.store`.
+
+        Raises:
+            RuntimeError: If no worker has an idle job.
+        '''
+
+        message = {'type': 'job', 'iteration': iteration, 'parameters': parameters, 'files': {}}
+        for key in SEED_FILE_KEYS:
+            values = parameters.get(key)
+            for value in values if isinstance(values, list) else [values]:
+                if value is not None and Path(value).is_file():
+                    message['files'][str(value)] = base64.b64encode(
+                        Path(value).read_bytes()).decode()
+
+        future = Future()
+        with self.condition:
+            idle = [worker for worker in self.workers if len(worker.running) < worker.jobs]
+            if len(idle) == 0:
+                raise RuntimeError('No worker has an idle job')
+            worker = max(idle, key=lambda worker: worker.jobs - len(worker.running))
+            worker.running[iteration] = (future, iteration_dir)
+        try:
+            worker.connection.send(message)
+        except OSError as e:
+            with self.condition:
+                worker.running.pop(iteration, None)
+            future.set_exception(ConnectionError(f'Failed to send a job to {worker.name}: {e}'))
+        return future
+
+    def close(self):
+        '''Stop workers and stop listening'''
+
+        with self.condition:
+            self.closed = True
+            workers = list(self.workers)
+            self.condition.notify_all()
+        for worker in workers:
+            try:
+                worker.connection.send({'type': 'stop'})
+            except OSError:
+                pass
+        self.server.close()
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+class Worker:
+    '''Worker of distributed tuning
+
+    Worker that connects to a coordinator, runs symbolic executor with parameters from the
+    coordinator, evaluates the generated testcases locally, and sends them back.
+    '''
+
+    def __init__(self, address, token, symbolic_executor, symtuner, output_dir, llvm_bc=None,
+                 gcov_obj=None, jobs=1, evaluation_kwargs=None, stall_timeout=None, name=None,
+                 connect_timeout=60):
+        '''Create a worker
+
+        Args:
+            address: Address of the coordinator. `HOST:PORT` for TCP, or `unix:PATH` for a Unix
+                socket.
+            token: The token of the coordinator.
+            symbolic_executor: A `symtuner.symbolic_executor.SymbolicExecutor` to run.
+            symtuner: A `symtuner.klee.KLEESymTuner` to evaluate testcases with.
+            output_dir: A directory to run symbolic executor in.
+            llvm_bc: A target program to run symbolic executor with. If not specified, the
+                target of the coordinator is used.
+            gcov_obj: A target program to evaluate testcases with. If not specified, the target
+                of the coordinator is used.
+            jobs: The number of symbolic executor instances to run concurrently.
+            evaluation_kwargs: A dictionary of keyword arguments pass to evaluate method. If not
+                specified, the arguments of the coordinator are used.
+            stall_timeout: Seconds to wait for a new testcase before stopping symbolic executor.
+                If not specified, the setting of the coordinator is used.
+            name: Name of the worker shown at the coordinator. By default, the host name and the
+                process id.
+            connect_timeout: Seconds to keep trying to connect, as the coordinator may start
+                after workers. By default, this will be set as 60.
+        '''
+
+        self.address = address
+        self.token = token
+        self.symbolic_executor = symbolic_executor
+        self.symtuner = symtuner
+        self.output_dir = Path(output_dir).absolute()
+        self.llvm_bc = llvm_bc
+        self.gcov_obj = gcov_obj
+        self.jobs = jobs
+        self.evaluation_kwargs = evaluation_kwargs
+        self.stall_timeout = stall_timeout
+        self.name = name if name is not None else f'{socket.gethostname()}:{os.getpid()}'
+        self.connect_timeout = connect_timeout
+
+    def connect(self):
+        '''Connect to the coordinator
+
+        Returns:
+            A `Connection` to the coordinator.
+
+        Raises:
+            ConnectionError: If the coordinator is not reachable within `connect_timeout`.
+        '''
+
+        family, address = parse_address(self.address)
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.connect(address)
+                return Connection(sock)
+            except OSError as e:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f'Failed to connect to the coordinator '
+                                          f'{self.address}: {e}')
+            time.sleep(1)
+
+    def run(self):
+        '''Run jobs from the coordinator until it stops the worker
+
+        Raises:
+            ConnectionError: If the coordinator is not reachable or does not accept the worker.
+        '''
+
+        connection = self.connect()
+        connection.send({'type': 'hello', 'name': self.name, 'jobs': self.jobs,
+                         'token': self.token})
+        welcome = connection.receive()
+        if welcome is None:
+            raise ConnectionError(f'Coordinator closed the connection: {self.address}')
+        if welcome['type'] == 'rejected':
+            connection.close()
+            raise ConnectionError(f'Coordinator rejected the worker: {welcome.get("reason")}')
+        get_logger().info(f'Connected to the coordinator: {self.address}')
+
+        llvm_bc = self.llvm_bc if self.llvm_bc is not None else welcome['llvm_bc']
+        gcov_obj = self.gcov_obj if self.gcov_obj is not None else welcome['gcov_obj']
+        evaluation_kwargs = self.evaluation_kwargs
+        if evaluation_kwargs is None:
+            evaluation_kwargs = welcome.get('evaluation_kwargs', {})
+        stall_timeout = self.stall_timeout
+        if stall_timeout is None:
+            stall_timeout = welcome.get('stall_timeout')
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while True:
+                try:
+                    message = connection.receive()
+                except (OSError, ValueError):
+                    message = None
+                if message is None or message['type'] == 'stop':
+                    break
+                if message['type'] == 'job':
+                    executor.submit(self._run_job, connection, message, llvm_bc, gcov_obj,
+                                    evaluation_kwargs, stall_timeout)
+        connection.close()
+        get_logger().info('Worker stopped.')
+
+    def _run_job(self, connection, message, llvm_bc, gcov_obj, evaluation_kwargs,
+                 stall_timeout):
+        iteration = message['iteration']
+        try:
+            result = self.run_job(message, llvm_bc, gcov_obj, evaluation_kwargs, stall_timeout)
+        except Exception as e:
+            get_logger().warning(f'Job of iteration {iteration + 1} failed: {e}')
+            result = {'type': 'error', 'iteration': iteration, 'error': str(e)}
+        try:
+            connection.send(result)
+        except OSError as e:
+            get_logger().warning(f'Failed to send the result of iteration {iteration + 1}: {e}')
+
+    def run_job(self, message, llvm_bc, gcov_obj, evaluation_kwargs, stall_timeout=None):
+        '''Run a job
+
+        Run symbolic executor with the parameters of the job, and evaluate the generated
+        testcases. The outputs of symbolic executor are deleted once the result is made.
+
+        Args:
+            message: A job message from the coordinator.
+            llvm_bc: A target program to run symbolic executor with.
+            gcov_obj: A target program to evaluate testcases with.
+            evaluation_kwargs: A dictionary of keyword arguments pass to evaluate method.
+            stall_timeout: Seconds to wait for a new testcase before stopping symbolic executor.
+
+        Returns:
+            A result message to send to the coordinator.
+        '''
+
+        iteration = message['iteration']
+        iteration_dir = self.output_dir / f'iteration-{iteration}'
+        seed_dir = self.output_dir / f'seeds-{iteration}'
+        for directory in (iteration_dir, seed_dir):
+            if directory.exists():
+                shutil.rmtree(str(directory))
+
+        # Replace seed files of the coordinator with local copies
+        parameters = message['parameters']
+        files = {}
+        for i, (path, data) in enumerate(message['files'].items()):
+            seed_dir.mkdir(parents=True, exist_ok=True)
+            files[path] = seed_dir / f'{i}-{Path(path).name}'
+            files[path].write_bytes(base64.b64decode(data))
+        for key in SEED_FILE_KEYS:
+            if key not in parameters:
+                continue
+            values = parameters[key]
+            if isinstance(values, list):
+                parameters[key] = [str(files.get(value, value)) for value in values]
+            else:
+                parameters[key] = str(files.get(values, values))
+        for key in ('-output-dir', '--output-dir'):
+            parameters.pop(key, None)
+        parameters['-output-dir'] = str(iteration_dir)
+
+        try:
+            start = time.monotonic()
+            testcases, stalled = self.symbolic_executor.run(llvm_bc, parameters,
+                                                            stall_timeout=stall_timeout)
+            running_time = time.monotonic() - start
+
+            # Replay with GCOV_PREFIX, as jobs run concurrently
+            start = time.monotonic()
+            evaluations = [self.symtuner.submit_evaluation(gcov_obj, testcase,
+                                                           **evaluation_kwargs)
+                           for testcase in testcases]
+            testcase_results = []
+            for testcase, evaluation in zip(testcases, evaluations):
+                branches, bugs = evaluation.result()
+                testcase_results.append({
+                    'name': Path(testcase).name,
+                    'data': base64.b64encode(Path(testcase).read_bytes()).decode(),
+                    'branches': encode_branches(branches),
+                    'bugs': sorted(bugs),
+                })
+            evaluation_time = time.monotonic() - start
+        finally:
+            for directory in (iteration_dir, seed_dir):
+                if directory.exists():
+                    shutil.rmtree(str(directory))
+
+        return {
+            'type': 'result',
+            'iteration': iteration,
+            'running_time': running_time,
+            'evaluation_time': evaluation_time,
+            'stalled': stalled,
+            'testcases': testcase_results,
+        }
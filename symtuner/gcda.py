@@ -0,0 +1,504 @@
+'''Native reader for GCov notes and data files
+
+This module reads `.gcno` (notes) and `.gcda` (data) files written by GCC without running GCov.
+Branch coverage is computed directly from the arc counters, so no subprocess and no intermediate
+`.gcov` file is needed. This module includes the file readers and a coverage backend that can be
+used in place of `symtuner.klee.GCov`.
+'''
+
+from pathlib import Path
+import os
+import struct
+import threading
+
+import numpy as np
+
+from symtuner.logger import get_logger
+
+
+GCOV_NOTE_MAGIC = 0x67636e6f
+GCOV_DATA_MAGIC = 0x67636461
+
+GCOV_TAG_FUNCTION = 0x01000000
+GCOV_TAG_BLOCKS = 0x01410000
+GCOV_TAG_ARCS = 0x01430000
+GCOV_TAG_LINES = 0x01450000
+GCOV_TAG_ARC_COUNTS = 0x01a10000
+
+GCOV_ARC_ON_TREE = 1 << 0
+GCOV_ARC_FAKE = 1 << 1
+
+
+class GCovFormatError(Exception):
+    '''Error on reading GCov notes or data files'''
+
+
+class GCovFile:
+    '''Reader for the record based file format shared by `.gcno` and `.gcda` files
+
+    Reader for the file format shared by `.gcno` and `.gcda` files. The layout of the header,
+    strings and record lengths depends on the GCC version that wrote the file.
+    '''
+
+    def __init__(self, path, magic):
+        '''Open a GCov file and read its header
+
+        Args:
+            path: Path to a `.gcno` or `.gcda` file.
+            magic: Expected magic number of the file.
+
+        Raises:
+            GCovFormatError: If the file does not start with the expected magic number.
+        '''
+
+        self.path = Path(path)
+        self.data = self.path.read_bytes()
+        self.pos = 0
+
+        self.endian = '<'
+        if len(self.data) < 12:
+            raise GCovFormatError(f'Too short to be a gcov file: {self.path}')
+        if self.read_unsigned() != magic:
+            self.endian = '>'
+            self.pos = 0
+            if self.read_unsigned() != magic:
+                raise GCovFormatError(f'Unknown magic number: {self.path}')
+
+        version = self.read_unsigned()
+        self.major = self.parse_version(version)
+        self.stamp = self.read_unsigned()
+        if self.major >= 12:
+            self.checksum = self.read_unsigned()
+
+    @staticmethod
+    def parse_version(version):
+        '''Get the major version of GCC from the version field
+
+        Args:
+            version: Version field of a GCov file. For example, GCC 7.5 writes `A75*` and
+                GCC 12.2 writes `B22*`.
+
+        Returns:
+            The major version of GCC.
+        '''
+
+        first = (version >> 24) & 0xff
+        second = (version >> 16) & 0xff
+        if first >= ord('A'):
+            return (first - ord('A')) * 10 + (second - ord('0'))
+        return first - ord('0')
+
+    @property
+    def bytes_length(self):
+        '''Whether lengths of records and strings are written in bytes (GCC 12 or later)'''
+
+        return self.major >= 12
+
+    def read_unsigned(self):
+        '''Read a 32-bit unsigned integer'''
+
+        value, = struct.unpack_from(f'{self.endian}I', self.data, self.pos)
+        self.pos += 4
+        return value
+
+    def read_signed(self):
+        '''Read a 32-bit signed integer'''
+
+        value, = struct.unpack_from(f'{self.endian}i', self.data, self.pos)
+        self.pos += 4
+        return value
+
+    def read_string(self):
+        '''Read a string
+
+        Returns:
+            A string read. Returns None for the null string.
+        '''
+
+        length = self.read_unsigned()
+        if length == 0:
+            return None
+        if not self.bytes_length:
+            length *= 4
+        raw = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return raw.split(b'\0', 1)[0].decode(errors='replace')
+
+    def read_counters(self, length):
+        '''Read 64-bit counters of a counter record
+
+        Args:
+            length: Length of the record. Negative length means the counters are all zero and
+                not written in the file.
+
+        Returns:
+            A numpy array of counters.
+        '''
+
+        unit = 1 if self.bytes_length else 4
+        if length < 0:
+            return np.zeros(-length * unit // 8, dtype=np.int64)
+        size = length * unit
+        words = np.frombuffer(self.data, dtype=f'{self.endian}u4',
+                              count=size // 4, offset=self.pos)
+        self.pos += size
+        words = words.reshape(-1, 2).astype(np.int64)
+        return words[:, 0] | (words[:, 1] << 32)
+
+    def records(self):
+        '''Iterate records in the file
+
+        Yields:
+            A tuple of tag, length, and the offset of the end of the record. Length is the raw
+            (signed) length field. The reader position is at the start of the record body.
+        '''
+
+        unit = 1 if self.bytes_length else 4
+        while self.pos + 8 <= len(self.data):
+            tag = self.read_unsigned()
+            length = self.read_signed()
+            end = self.pos + max(length, 0) * unit
+            yield tag, length, end
+            self.pos = end
+
+
+class FunctionGraph:
+    '''Control flow graph of a function read from notes
+
+    Control flow graph of a function read from a `.gcno` file. The positions of the branch arcs
+    and the spanning tree are precomputed so that counters can be evaluated quickly.
+    '''
+
+    def __init__(self, ident, name):
+        self.ident = ident
+        self.name = name
+        self.n_blocks = 0
+        self.arcs = []
+        self.lines = {}
+
+        self.succ = None
+        self.pred = None
+        self.instrumented = None
+        self.branches = None
+
+    def finalize(self):
+        '''Precompute adjacency lists, instrumented arcs and branch arcs'''
+
+        self.n_blocks = max([self.n_blocks] + [max(src, dst) + 1 for src, dst, _ in self.arcs])
+        self.succ = [[] for _ in range(self.n_blocks)]
+        self.pred = [[] for _ in range(self.n_blocks)]
+        for i, (src, dst, _) in enumerate(self.arcs):
+            self.succ[src].append(i)
+            self.pred[dst].append(i)
+
+        # Counters are written for arcs not on the spanning tree, in the order of blocks
+        self.instrumented = [i for block in self.succ for i in block
+                             if not self.arcs[i][2] & GCOV_ARC_ON_TREE]
+
+        # Branches are reported at the last line of the block like GCov
+        self.branches = []
+        for block, arcs in enumerate(self.succ):
+            if block not in self.lines:
+                continue
+            non_fake = [i for i in arcs if not self.arcs[i][2] & GCOV_ARC_FAKE]
+            if len(non_fake) < 2:
+                continue
+            file_name, line = self.lines[block]
+            for position, i in enumerate(non_fake):
+                self.branches.append((i, f'{file_name} {line}:{self.ident}.{block}.{position}'))
+
+    def solve(self, counters):
+        '''Calculate counts of all arcs from the counters of instrumented arcs
+
+        Calculate counts of arcs on the spanning tree with flow conservation.
+
+        Args:
+            counters: Counters of the instrumented arcs.
+
+        Returns:
+            A list of counts of every arc.
+        '''
+
+        counts = [None] * len(self.arcs)
+        for i, count in zip(self.instrumented, counters.tolist()):
+            counts[i] = count
+
+        block_counts = [None] * self.n_blocks
+        unknown_succ = [sum(1 for i in arcs if counts[i] is None) for arcs in self.succ]
+        unknown_pred = [sum(1 for i in arcs if counts[i] is None) for arcs in self.pred]
+
+        changed = True
+        while changed:
+            changed = False
+            for block in range(self.n_blocks):
+                if block_counts[block] is None:
+                    if len(self.succ[block]) > 0 and unknown_succ[block] == 0:
+                        block_counts[block] = sum(counts[i] for i in self.succ[block])
+                    elif len(self.pred[block]) > 0 and unknown_pred[block] == 0:
+                        block_counts[block] = sum(counts[i] for i in self.pred[block])
+                    else:
+                        continue
+                    changed = True
+                total = block_counts[block]
+                if unknown_succ[block] == 1:
+                    i = next(i for i in self.succ[block] if counts[i] is None)
+                    counts[i] = total - sum(counts[j] for j in self.succ[block] if j != i)
+                    unknown_succ[block] -= 1
+                    unknown_pred[self.arcs[i][1]] -= 1
+                    changed = True
+                if unknown_pred[block] == 1:
+                    i = next(i for i in self.pred[block] if counts[i] is None)
+                    counts[i] = total - sum(counts[j] for j in self.pred[block] if j != i)
+                    unknown_pred[block] -= 1
+                    unknown_succ[self.arcs[i][0]] -= 1
+                    changed = True
+        return counts
+
+
+def read_notes(path):
+    '''Read control flow graphs from a notes file
+
+    Args:
+        path: Path to a `.gcno` file.
+
+    Returns:
+        A dictionary whose keys are the function identifiers and values are `FunctionGraph`s.
+        Artificial functions, which GCov does not report, are excluded.
+    '''
+
+    notes = GCovFile(path, GCOV_NOTE_MAGIC)
+    if notes.major >= 9:
+        _ = notes.read_string()  # Working directory
+    if notes.major >= 8:
+        _ = notes.read_unsigned()  # Support for unexecuted blocks
+
+    functions = {}
+    function = None
+    for tag, length, _ in notes.records():
+        if tag == GCOV_TAG_FUNCTION:
+            ident = notes.read_unsigned()
+            _ = notes.read_unsigned()  # Line number checksum
+            _ = notes.read_unsigned()  # CFG checksum
+            name = notes.read_string()
+            artificial = notes.read_unsigned() if notes.major >= 8 else 0
+            function = FunctionGraph(ident, name)
+            if not artificial:
+                functions[ident] = function
+        elif function is None:
+            continue
+        elif tag == GCOV_TAG_BLOCKS:
+            size = length if notes.bytes_length else length * 4
+            # Older versions write flags for each block, newer versions write the number of blocks
+            function.n_blocks = notes.read_unsigned() if size == 4 else size // 4
+        elif tag == GCOV_TAG_ARCS:
+            size = length if notes.bytes_length else length * 4
+            src = notes.read_unsigned()
+            for _ in range((size - 4) // 8):
+                dst = notes.read_unsigned()
+                flags = notes.read_unsigned()
+                function.arcs.append((src, dst, flags))
+        elif tag == GCOV_TAG_LINES:
+            block = notes.read_unsigned()
+            file_name = None
+            last = None
+            while True:
+                line = notes.read_unsigned()
+                if line != 0:
+                    last = (file_name, line)
+                    continue
+                file_name = notes.read_string()
+                if file_name is None:
+                    break
+            if last is not None:
+                function.lines[block] = last
+
+    for function in functions.values():
+        function.finalize()
+    return functions
+
+
+def read_counters(path):
+    '''Read arc counters from a data file
+
+    Args:
+        path: Path to a `.gcda` file.
+
+    Returns:
+        A dictionary whose keys are the function identifiers and values are numpy arrays of
+        the arc counters.
+    '''
+
+    data = GCovFile(path, GCOV_DATA_MAGIC)
+    counters = {}
+    ident = None
+    for tag, length, _ in data.records():
+        if tag == GCOV_TAG_FUNCTION:
+            ident = data.read_unsigned() if length != 0 else None
+        elif tag == GCOV_TAG_ARC_COUNTS and ident is not None:
+            counters[ident] = data.read_counters(length)
+    return counters
+
+
+class GCDAReader:
+    '''Coverage backend that reads gcda files natively
+
+    Coverage backend that computes covered branches directly from `gcda` counters and `gcno`
+    control flow graphs. This has the same interface as `symtuner.klee.GCov`, but the branch
+    identifiers are made of the source file, the line, and the arc instead of the line position in
+    `.gcov` files. Therefore, do not mix the results with the results from `symtuner.klee.GCov`.
+    '''
+
+    def __init__(self):
+        '''Create a native coverage backend'''
+
+        self.notes = {}
+        self.lock = threading.Lock()
+        get_logger().info('Use native gcda reader to calculate coverage.')
+
+    def get_notes(self, gcno):
+        '''Get the control flow graphs of a notes file
+
+        Get the control flow graphs of a notes file. Parsed notes are cached until the notes file
+        is modified.
+
+        Args:
+            gcno: Path to a `.gcno` file.
+
+        Returns:
+            A dictionary of `FunctionGraph`s returned by `read_notes`.
+        '''
+
+        gcno = Path(gcno)
+        key = str(gcno)
+        mtime = gcno.stat().st_mtime_ns
+        with self.lock:
+            cached = self.notes.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        functions = read_notes(gcno)
+        with self.lock:
+            self.notes[key] = (mtime, functions)
+        return functions
+
+    def run(self, target, gcdas, folder_depth=1, gcov_prefix=None):
+        '''Collect covered branches with given gcdas
+
+        Collect the covered branch set with given gcdas.
+
+        Args:
+            target: Target binary that `gcdas` are collected from.
+            gcdas: A List of `gcda` files.
+            folder_depth: Not used. This is just for compatability with `symtuner.klee.GCov`.
+            gcov_prefix: A directory that `gcdas` are written into with `GCOV_PREFIX`. If set,
+                `gcno` files are looked up in the original object directories.
+
+        Returns:
+            A set of covered branches.
+        '''
+
+        covered = set()
+        for gcda in gcdas:
+            gcda = Path(gcda).absolute()
+            if gcov_prefix is not None:
+                original = Path('/') / gcda.relative_to(Path(gcov_prefix).absolute())
+            else:
+                original = gcda
+            gcno = original.with_suffix('.gcno')
+            if not gcno.exists():
+                get_logger().debug(f'gcno not found: {gcno}')
+                continue
+
+            try:
+                functions = self.get_notes(gcno)
+                counters = read_counters(gcda)
+            except (GCovFormatError, struct.error, ValueError) as e:
+                get_logger().warning(f'Failed to read {gcda}: {e}')
+                continue
+
+            for ident, counter in counters.items():
+                function = functions.get(ident)
+                if function is None or len(function.branches) == 0:
+                    continue
+                if len(counter) != len(function.instrumented):
+                    get_logger().debug(f'Counters do not match to notes: {gcda} ({function.name})')
+                    continue
+                # A function never executed does not cover any branch
+                if not np.any(counter):
+                    continue
+                counts = function.solve(counter)
+                for i, bid in function.branches:
+                    if counts[i] is not None and counts[i] > 0:
+                        covered.add(bid)
+        return covered
+
+
+class GCDAIndex:
+    '''Index of the coverage files of an object tree
+
+    Index of `gcno` files in an object tree, built by walking the tree once. A program built with
+    coverage writes each `gcda` file next to its `gcno` file (or under `GCOV_PREFIX`, with the
+    absolute path of the object appended), so `gcda` files are cleaned up and collected by
+    checking only these locations instead of walking the tree for every testcase.
+    '''
+
+    def __init__(self, root):
+        '''Index an object tree
+
+        Args:
+            root: Root directory of the object tree.
+        '''
+
+        self.root = Path(os.path.normpath(str(Path(root).absolute())))
+        self.notes = sorted(self.root.glob('**/*.gcno'))
+        self.gcdas = [gcno.with_suffix('.gcda') for gcno in self.notes]
+        # Locations of gcda files under each prefix
+        self.prefixed = {}
+        get_logger().debug(f'{len(self.notes)} gcno files found under: {self.root}')
+
+    def __len__(self):
+        return len(self.notes)
+
+    def locations(self, gcov_prefix=None):
+        '''Get the locations of gcda files
+
+        Args:
+            gcov_prefix: A directory that gcda files are written into with `GCOV_PREFIX`. If not
+                specified, gcda files are written next to gcno files.
+
+        Returns:
+            A list of paths where gcda files are written.
+        '''
+
+        if gcov_prefix is None:
+            return self.gcdas
+        prefix = str(Path(gcov_prefix).absolute())
+        locations = self.prefixed.get(prefix)
+        if locations is None:
+            locations = [Path(prefix + str(gcda)) for gcda in self.gcdas]
+            self.prefixed[prefix] = locations
+        return locations
+
+    def collect(self, gcov_prefix=None):
+        '''Collect written gcda files
+
+        Args:
+            gcov_prefix: A directory that gcda files are written into with `GCOV_PREFIX`.
+
+        Returns:
+            A list of gcda files that exist.
+        '''
+
+        return [gcda for gcda in self.locations(gcov_prefix) if gcda.exists()]
+
+    def clean(self, gcov_prefix=None):
+        '''Delete written gcda files
+
+        Args:
+            gcov_prefix: A directory that gcda files are written into with `GCOV_PREFIX`.
+        '''
+
+        for gcda in self.locations(gcov_prefix):
+            try:
+                gcda.unlink()
+            except FileNotFoundError:
+                pass
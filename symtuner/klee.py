@@ -5,17 +5,33 @@ testcases by KLEE. This module includes executable wrappers (for KLEE, KLEE-repl
 and SymTuner implementation for KLEE.
 '''
 
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import hashlib
 import os
+import queue
 import random
+import shlex
+import shutil
+import signal
 import subprocess as sp
+import tempfile
+import threading
+import time
 
+from symtuner.cache import ReplayCache
+from symtuner.gcda import GCDAIndex
 from symtuner.logger import get_logger
 from symtuner.symbolic_executor import SymbolicExecutor
 from symtuner.symtuner import SymTuner
 
 
+# Size of the end of KLEE stderr to keep for error classification
+STDERR_TAIL_SIZE = 64 * 1024
+# Seconds to wait for KLEE to terminate nicely after stopping a stalled run
+STALL_GRACE_PERIOD = 30
+
+
 class GCov:
     '''GCov executable wrapper
 
@@ -32,6 +48,9 @@ class GCov:
         '''
 
         self.bin = bin
+        self.supports_stdout = False
+        self.version = ''
+        self.lock = threading.Lock()
         self.smoke_test()
         if self.bin != 'gcov':
             get_logger().info(f'Use gcov executable at: {self.bin}')
@@ -39,21 +58,49 @@ class GCov:
     def smoke_test(self):
         '''Test GCov executable exists
 
-        Test GCov executable exists.
+        Test GCov executable exists. This also checks whether GCov can write its output to stdout
+        (`--stdout` option), which lets multiple GCov processes run in the same directory.
 
         Raises:
             CalledProcessError: If failed to find GCov at the given `bin`.
         '''
 
         try:
-            _ = sp.run(f'{self.bin} -version', stdout=sp.PIPE, stderr=sp.PIPE,
-                       shell=True, check=True)
+            version = sp.run(f'{self.bin} -version', stdout=sp.PIPE, stderr=sp.PIPE,
+                             shell=True, check=True)
         except sp.CalledProcessError as e:
             get_logger().fatal(f'Failed to find gcov: {self.bin}')
             raise e
         get_logger().debug(f'gcov found: {self.bin}')
+        self.version = version.stdout.decode(errors='replace').strip()
+
+        usage = sp.run(f'{self.bin} --help', stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+        self.supports_stdout = b'--stdout' in usage.stdout
+        get_logger().debug(f'gcov supports --stdout: {self.supports_stdout}')
+
+    def fingerprint(self):
+        '''Get the fingerprint of GCov
+
+        Get the fingerprint of GCov from its version and the content of its executable, so that
+        the fingerprint changes if GCov is upgraded in place.
+
+        Returns:
+            A string identifying GCov.
+        '''
 
-    def run(self, target, gcdas, folder_depth=1):
+        # GCov may be given as a command such as `python3 gcov.py`, so hash every file in it
+        digest = hashlib.sha256()
+        for word in shlex.split(str(self.bin)):
+            executable = shutil.which(word) or word
+            if not os.path.isfile(executable):
+                continue
+            with open(os.path.realpath(executable), 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        version = self.version.splitlines()[0] if len(self.version) > 0 else ''
+        return f'{type(self).__name__} {version} {digest.hexdigest()}'
+
+    def run(self, target, gcdas, folder_depth=1, gcov_prefix=None):
         '''Collect covered branches with given gcdas
 
         Collect the covered branch set with given gcdas.
@@ -63,6 +110,8 @@ class GCov:
             gcdas: A List of `gcda` files.
             folder_depth: Depth of folders to collect gcov files. For example, if `folder_depth`
                 is set to 2, gcov files are collected with the `../../**/*.gcov` pattern.
+            gcov_prefix: A directory that `gcdas` are written into with `GCOV_PREFIX`. If set,
+                `gcno` files are linked next to the `gcdas` so that GCov can find them.
 
         Returns:
             A set of covered branches.
@@ -72,40 +121,102 @@ class GCov:
         if len(gcdas) == 0:
             return set()
 
-        # Move to program directory.
-        original_path = Path().absolute()
-        target_dir = Path(target).parent
+        target_dir = Path(target).absolute().parent
         gcdas = [gcda.absolute() for gcda in gcdas]
-        os.chdir(str(target_dir))
+        if gcov_prefix is not None:
+            self.link_notes(gcdas, gcov_prefix)
+
+        # Run Gcov in the program directory.
+        if self.supports_stdout:
+            cmd = [str(self.bin), '-b', '-t', *list(map(str, gcdas))]
+            cmd = ' '.join(cmd)
+            get_logger().debug(f'gcov command: {cmd}')
+            process = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE, cwd=str(target_dir),
+                             shell=True, check=True)
+            stdout = process.stdout.decode(encoding='UTF-8', errors='replace')
+            return self.parse(stdout.splitlines())
+
+        # GCov without --stdout writes gcov files in the program directory, so only one GCov
+        # process can work at a time.
+        with self.lock:
+            cmd = [str(self.bin), '-b', *list(map(str, gcdas))]
+            cmd = ' '.join(cmd)
+            get_logger().debug(f'gcov command: {cmd}')
+            process = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE, cwd=str(target_dir),
+                             shell=True, check=True)
+
+            # Get gcov files from the messages of GCov (e.g. `Creating 'foo.c.gcov'`), or by
+            # searching if GCov does not tell.
+            stdout = process.stdout.decode(encoding='UTF-8', errors='replace')
+            gcovs = [target_dir / line.split("'")[1] for line in stdout.splitlines()
+                     if line.startswith('Creating ') and line.count("'") >= 2]
+            if len(gcovs) == 0:
+                base = Path()
+                for _ in range(folder_depth):
+                    base = base / '..'
+                gcov_pattern = base / '**/*.gcov'
+                gcovs = list(target_dir.glob(str(gcov_pattern)))
+            get_logger().debug(f'found gcovs: {", ".join(map(str, gcovs))}')
+
+            # Get covered branches.
+            covered = set()
+            for gcov in gcovs:
+                if not gcov.exists():
+                    continue
+                with gcov.open(encoding='UTF-8', errors='replace') as f:
+                    covered = covered | self.parse(f)
+                gcov.unlink()
+        return covered
+
+    def parse(self, lines):
+        '''Collect covered branches from gcov outputs
+
+        Collect covered branches from the lines of gcov files. Lines of multiple gcov files can be
+        given at once, each of them starts with the `Source` header.
+
+        Args:
+            lines: An iterable of lines of gcov files.
+
+        Returns:
+            A set of covered branches.
+        '''
 
-        # Run Gcov.
-        cmd = [str(self.bin), '-b', *list(map(str, gcdas))]
-        cmd = ' '.join(cmd)
-        get_logger().debug(f'gcov command: {cmd}')
-        _ = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True, check=True)
-
-        # Get gcov files.
-        base = Path()
-        for _ in range(folder_depth):
-            base = base / '..'
-        gcov_pattern = base / '**/*.gcov'
-        gcovs = list(Path().glob(str(gcov_pattern)))
-        get_logger().debug(f'found gcovs: {", ".join(map(str, gcovs))}')
-
-        # Get covered branches.
         covered = set()
-        for gcov in gcovs:
-            with gcov.open(encoding='UTF-8', errors='replace') as f:
-                file_name = f.readline().strip().split(':')[-1]
-                for i, line in enumerate(f):
-                    if ('branch' in line) and ('never' not in line) and ('taken 0%' not in line):
-                        bid = f'{file_name} {i}'
-                        covered.add(bid)
-
-        # Restore original directory.
-        os.chdir(str(original_path))
+        file_name = None
+        i = 0
+        for line in lines:
+            fields = line.split(':', 2)
+            if len(fields) == 3 and fields[1].strip() == '0' and fields[2].startswith('Source:'):
+                file_name = line.strip().split(':')[-1]
+                i = 0
+                continue
+            if ('branch' in line) and ('never' not in line) and ('taken 0%' not in line):
+                bid = f'{file_name} {i}'
+                covered.add(bid)
+            i += 1
         return covered
 
+    def link_notes(self, gcdas, gcov_prefix):
+        '''Link gcno files next to gcdas written under a prefix
+
+        With `GCOV_PREFIX`, gcda files are written under the prefix directory while the matching
+        gcno files stay in the object directory. Link each gcno file next to its gcda file.
+
+        Args:
+            gcdas: A list of `gcda` files written under `gcov_prefix`.
+            gcov_prefix: A directory that `gcdas` are written into.
+        '''
+
+        gcov_prefix = Path(gcov_prefix).absolute()
+        for gcda in gcdas:
+            gcno = gcda.with_suffix('.gcno')
+            if gcno.exists():
+                continue
+            original = Path('/') / gcda.relative_to(gcov_prefix)
+            original = original.with_suffix('.gcno')
+            if original.exists():
+                gcno.symlink_to(original)
+
 
 class KLEE(SymbolicExecutor):
     '''KLEE executable wrapper
@@ -144,7 +255,8 @@ class KLEE(SymbolicExecutor):
             raise e
         get_logger().debug(f'klee found: {self.bin}')
 
-    def run(self, target, parameters, **kwargs):
+    def run(self, target, parameters, stall_timeout=None, poll_interval=1, on_testcase=None,
+            on_start=None, **kwargs):
         '''Run KLEE with the given parameters
 
         Run KLEE and collect generated testcases (`.ktest` files).
@@ -152,11 +264,22 @@ class KLEE(SymbolicExecutor):
         Args:
             target: LLVM byte code file.
             parameters: A dictionary with KLEE parameters.
+            stall_timeout: Seconds to wait for a new testcase. If KLEE does not generate any new
+                testcase for this long, KLEE is asked to halt early. Only works when the output
+                directory is given in `parameters`. By default, KLEE is never stopped early.
+            poll_interval: Seconds between checks of the output directory while KLEE runs.
+            on_testcase: A function called with each testcase as soon as KLEE finishes writing
+                it, so that testcases can be evaluated while KLEE is still running. Only works
+                when the output directory is given in `parameters`. Every testcase returned is
+                passed to this function exactly once, in the order of generation.
+            on_start: A function called with the KLEE process (`subprocess.Popen`) as soon as it
+                starts, e.g. to report its pid.
             kwargs: Symbolic executor specific keyword arguments. This is just for compatability
                 with other symbolic executors.
 
         Returns:
-            A list of testcases (`.ktest` files) founds.
+            A tuple of a list of testcases (`.ktest` files) founds, and whether KLEE was stopped
+            early because it generated no new testcase for `stall_timeout` seconds.
 
         Raises:
             CalledProcessError: If some errors occur during executing KLEE.
@@ -165,6 +288,7 @@ class KLEE(SymbolicExecutor):
         target = Path(target).absolute()
 
         # Convert to absolute path if output-dir option is set
+        output_dir = None
         possible_output_dir = ['-output-dir', '--output-dir']
         for output_dir_param in possible_output_dir:
             if output_dir_param in parameters.keys():
@@ -172,10 +296,6 @@ class KLEE(SymbolicExecutor):
                 parameters[output_dir_param] = str(output_dir)
                 break
 
-        # Move to program directory
-        original_path = Path().absolute()
-        os.chdir(str(target.parent))
-
         # Build command
         klee_options = []
         # Program arguments: -sym-arg[s] -sym-files -sym-stdin -sym-stdout
@@ -215,52 +335,147 @@ class KLEE(SymbolicExecutor):
         cmd = [str(self.bin), *klee_options, str(target),
                *sym_arg_options, *sym_files_options, *sym_stdin_options, *sym_stdout_options]
 
-        # Run KLEE
+        # Run KLEE in the program directory. Use an explicit working directory instead of
+        # changing the directory of the whole process, so that multiple KLEE instances can run
+        # concurrently. KLEE creates the output directory by itself, so outputs are streamed
+        # into log files next to it and moved into it when KLEE terminates.
         cmd = ' '.join(cmd)
         get_logger().debug(f'klee command: {cmd}')
-        try:
-            _ = sp.run(cmd, stdout=sp.PIPE, stderr=sp.PIPE,
-                       shell=True, check=True)
-        except sp.CalledProcessError as e:
-            stderr = e.stderr.decode(errors='replace')
-            lastline = stderr.strip().splitlines()[-1]
+        if output_dir is not None:
+            log_prefix = output_dir.parent / output_dir.name
+        else:
+            log_prefix = target.parent / 'klee'
+        stdout_log = Path(f'{log_prefix}.stdout')
+        stderr_log = Path(f'{log_prefix}.stderr')
+        with stdout_log.open('wb') as stdout, stderr_log.open('wb') as stderr:
+            process = sp.Popen(shlex.split(cmd), stdout=stdout, stderr=stderr,
+                               cwd=str(target.parent))
+            if on_start is not None:
+                on_start(process)
+            reported = set()
+            returncode, stalled = self.wait(process, output_dir, stall_timeout, poll_interval,
+                                            on_testcase, reported)
+
+        if output_dir is None:
+            output_dir = target.parent / 'klee-last'
+            if output_dir.exists():
+                output_dir = output_dir.resolve()
+            else:
+                output_dir = Path().absolute()
+        else:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        for log in (stdout_log, stderr_log):
+            log.replace(output_dir / f'klee{log.suffix}')
+        stdout_log = output_dir / 'klee.stdout'
+        stderr_log = output_dir / 'klee.stderr'
+
+        if stalled:
+            get_logger().warning(f'KLEE stopped early: no new testcase for {stall_timeout} seconds '
+                                 f'({output_dir})')
+        elif returncode != 0:
+            tail = self.read_tail(stderr_log)
+            lastline = tail.strip().splitlines()[-1] if len(tail.strip()) > 0 else ''
             if 'KLEE' in lastline and 'kill(9)' in lastline:
                 get_logger().warning(f'KLEE process kill(9)ed. Failed to terminate nicely.')
             else:
                 # Log and bypass if unknown error
-                possible_output_dir = ['-output-dir', '--output-dir']
-                for output_dir_param in possible_output_dir:
-                    if output_dir_param in parameters.keys():
-                        output_dir = Path(parameters[output_dir_param])
-                        break
-                else:
-                    output_dir = target.parent / 'klee-last'
-                    if output_dir.exists():
-                        output_dir = output_dir.resolve()
-                    else:
-                        output_dir = original_path
                 log_file = output_dir / 'symtuner.log'
-                get_logger().warning(f'Fail({e.returncode})ed to execute KLEE. '
+                get_logger().warning(f'Fail({returncode})ed to execute KLEE. '
                                      f'See for more details: {log_file}')
                 with log_file.open('w', encoding='UTF-8') as f:
                     f.write(f'command: {cmd}\n')
-                    f.write(f'return code: {e.returncode}\n')
+                    f.write(f'return code: {returncode}\n')
+                    f.write(f'stdout: {stdout_log}\n')
+                    f.write(f'stderr: {stderr_log}\n')
                     f.write('\n')
-                    f.write('-- stdout --\n')
-                    stdout = e.stdout.decode(errors='replace')
-                    f.write(f'{stdout}\n')
-                    f.write('-- stderr --\n')
-                    stderr = e.stderr.decode(errors='replace')
-                    f.write(f'{stderr}\n')
+                    f.write('-- tail of stderr --\n')
+                    f.write(f'{tail}\n')
 
         # Get testcases
-        testcases = list(output_dir.glob('*.ktest'))
+        testcases = sorted(output_dir.glob('*.ktest'))
         testcases = [tc.absolute() for tc in testcases]
+        if on_testcase is not None:
+            for testcase in testcases:
+                if testcase not in reported:
+                    on_testcase(testcase)
+
+        return testcases, stalled
+
+    def wait(self, process, output_dir, stall_timeout=None, poll_interval=1, on_testcase=None,
+             reported=None):
+        '''Wait for KLEE to terminate while watching its progress
+
+        Wait for KLEE to terminate. If `stall_timeout` or `on_testcase` is set, check testcases in
+        the output directory at every `poll_interval` seconds. KLEE writes testcases one by one in
+        the order of their names, so a testcase is reported to `on_testcase` once KLEE has started
+        writing the next one. If no new testcase is generated for `stall_timeout` seconds, KLEE is
+        interrupted first so that it can terminate nicely, and killed if it does not terminate in
+        `STALL_GRACE_PERIOD` seconds.
+
+        Args:
+            process: A `subprocess.Popen` object of KLEE.
+            output_dir: Output directory of KLEE.
+            stall_timeout: Seconds to wait for a new testcase.
+            poll_interval: Seconds between checks of the output directory.
+            on_testcase: A function called with each testcase KLEE finished writing.
+            reported: A set to record testcases passed to `on_testcase` in.
+
+        Returns:
+            A tuple of the return code of KLEE and whether KLEE is stopped due to the stall.
+        '''
+
+        if output_dir is None or (stall_timeout is None and on_testcase is None):
+            return process.wait(), False
+        if reported is None:
+            reported = set()
+
+        last_count = 0
+        last_progress = time.monotonic()
+        while True:
+            try:
+                return process.wait(timeout=poll_interval), False
+            except sp.TimeoutExpired:
+                pass
+            testcases = sorted(output_dir.glob('*.ktest')) if output_dir.exists() else []
+            if on_testcase is not None:
+                for testcase in testcases[:-1]:
+                    testcase = testcase.absolute()
+                    if testcase not in reported:
+                        reported.add(testcase)
+                        on_testcase(testcase)
+            now = time.monotonic()
+            if len(testcases) != last_count:
+                last_count = len(testcases)
+                last_progress = now
+            elif stall_timeout is not None and now - last_progress >= stall_timeout:
+                break
+
+        process.send_signal(signal.SIGINT)
+        try:
+            return process.wait(timeout=STALL_GRACE_PERIOD), True
+        except sp.TimeoutExpired:
+            process.kill()
+            return process.wait(), True
+
+    @staticmethod
+    def read_tail(path, size=STDERR_TAIL_SIZE):
+        '''Read the end of a log file
+
+        Read at most `size` bytes from the end of a log file, so that a huge log is not loaded into
+        memory.
+
+        Args:
+            path: Path to a log file.
+            size: Maximum number of bytes to read.
 
-        # Restore original directory.
-        os.chdir(str(original_path))
+        Returns:
+            A decoded string of the end of the log file.
+        '''
 
-        return testcases
+        with Path(path).open('rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - size, 0))
+            return f.read().decode(errors='replace')
 
     def get_time_parameter(self):
         '''Paramter to set time budget
@@ -311,7 +526,8 @@ class KLEEReplay:
             raise e
         get_logger().debug(f'klee-replay found: {self.bin}')
 
-    def run(self, target, testcase, error_type=None, folder_depth=1):
+    def run(self, target, testcase, error_type=None, folder_depth=1, gcov_prefix=None,
+            gcda_index=None):
         '''Replay the testcase
 
         Replay the given KLEE testcase (`.ktest` file) with the GCov object. Then, collect the bugs
@@ -324,6 +540,11 @@ class KLEEReplay:
                 considered: `CRASHED signal 11` and `CRASHED signal 6`.
             folder_depth: Depth of folders to collect gcov files. For example, if `folder_depth`
                 is set to 2, gcda files are collected with the `../../**/*.gcda` pattern.
+            gcov_prefix: A directory to write `gcda` files into (`GCOV_PREFIX`). If set, `gcda`
+                files are written under this directory instead of the object directory, so that
+                replays with different prefixes can run concurrently.
+            gcda_index: A `symtuner.gcda.GCDAIndex` of the object tree. If set, `gcda` files are
+                collected from the indexed locations instead of searching the object tree.
 
         Returns:
             A tuple of bugs, and `gcda` files. First element of the tuple is the found bugs, and
@@ -333,21 +554,26 @@ class KLEEReplay:
         target = Path(target).absolute()
         testcase = Path(testcase).absolute()
 
-        # Move to program directory.
-        original_path = Path().absolute()
-        os.chdir(str(target.parent))
-
         # Error types interested in
         if error_type is None:
             error_type = ['CRASHED signal 11', 'CRASHED signal 6']
         if isinstance(error_type, str):
             error_type = [error_type]
 
-        # Run KLEE-replay
+        # Redirect gcda files into the prefix directory
+        env = None
+        if gcov_prefix is not None:
+            gcov_prefix = Path(gcov_prefix).absolute()
+            env = os.environ.copy()
+            env['GCOV_PREFIX'] = str(gcov_prefix)
+            env['GCOV_PREFIX_STRIP'] = '0'
+
+        # Run KLEE-replay in the program directory
         cmd = [str(self.bin), str(target), str(testcase)]
         cmd = ' '.join(cmd)
         get_logger().debug(f'klee-replay command: {cmd}')
-        process = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
+        process = sp.Popen(cmd, stdout=sp.PIPE, stderr=sp.PIPE, cwd=str(target.parent),
+                           env=env, shell=True)
         errors = set()
         try:
             _, stderr = process.communicate(timeout=0.1)
@@ -371,19 +597,88 @@ class KLEEReplay:
             process.kill()
 
         # Find *.gcda files.
-        base = Path()
-        for _ in range(folder_depth):
-            base = base / '..'
-        gcda_pattern = base / '**/*.gcda'
-        gcdas = list(target.parent.glob(str(gcda_pattern)))
+        if gcda_index is not None:
+            gcdas = gcda_index.collect(gcov_prefix)
+        elif gcov_prefix is not None:
+            gcdas = list(gcov_prefix.glob('**/*.gcda'))
+        else:
+            base = Path()
+            for _ in range(folder_depth):
+                base = base / '..'
+            gcda_pattern = base / '**/*.gcda'
+            gcdas = list(target.parent.glob(str(gcda_pattern)))
         gcdas = [gcda.absolute() for gcda in gcdas]
 
-        # Restore original directory.
-        os.chdir(str(original_path))
-
         return errors, gcdas
 
 
+class ReplayPool:
+    '''Pool of replay workers
+
+    Pool of threads to replay testcases on. If there are multiple replay workers, each of them
+    writes `gcda` files into its own `GCOV_PREFIX` directory, so that testcases can be replayed
+    concurrently. A single replay worker replays testcases one at a time in place, writing `gcda`
+    files in the object directory. A pool can be shared by SymTuners of multiple targets.
+    '''
+
+    def __init__(self, jobs=1, gcov_prefix_dir=None):
+        '''Create a pool of replay workers
+
+        Create a pool of replay workers. Threads and `GCOV_PREFIX` directories are made at the
+        first submission.
+
+        Args:
+            jobs: The number of replay workers. By default, this will be set as 1.
+            gcov_prefix_dir: A directory to make `GCOV_PREFIX` directories of replay workers in.
+                If not specified, a temporary directory is used. Not used if there is only one
+                replay worker.
+        '''
+
+        self.jobs = jobs
+        self.gcov_prefix_dir = gcov_prefix_dir
+        self.lock = threading.Lock()
+        self.executor = None
+        self.gcov_prefixes = None
+
+    def submit(self, fn, *args, **kwargs):
+        '''Run a function on a replay worker
+
+        Args:
+            fn: A function to run. Called with the `GCOV_PREFIX` directory of the replay worker
+                as `gcov_prefix` keyword argument, which is None if there is only one replay
+                worker.
+            args: Positional arguments of the function.
+            kwargs: Keyword arguments of the function.
+
+        Returns:
+            A `concurrent.futures.Future` of the return value of the function.
+        '''
+
+        # Functions may be submitted from multiple threads
+        with self.lock:
+            if self.executor is None and self.jobs <= 1:
+                self.executor = ThreadPoolExecutor(max_workers=1)
+            elif self.executor is None:
+                if self.gcov_prefix_dir is None:
+                    self.gcov_prefix_dir = tempfile.mkdtemp(prefix='symtuner-gcov-')
+                self.gcov_prefixes = queue.Queue()
+                for i in range(self.jobs):
+                    gcov_prefix = Path(self.gcov_prefix_dir).absolute() / f'worker-{i}'
+                    gcov_prefix.mkdir(parents=True, exist_ok=True)
+                    self.gcov_prefixes.put(gcov_prefix)
+                self.executor = ThreadPoolExecutor(max_workers=self.jobs)
+        return self.executor.submit(self._run, fn, args, kwargs)
+
+    def _run(self, fn, args, kwargs):
+        if self.gcov_prefixes is None:
+            return fn(*args, gcov_prefix=None, **kwargs)
+        gcov_prefix = self.gcov_prefixes.get()
+        try:
+            return fn(*args, gcov_prefix=gcov_prefix, **kwargs)
+        finally:
+            self.gcov_prefixes.put(gcov_prefix)
+
+
 class KLEESymTuner(SymTuner):
     '''SymTuner implementation for KLEE
 
@@ -391,14 +686,28 @@ class KLEESymTuner(SymTuner):
     testcaes, and parameter space updates for `-seed-file` field.
     '''
 
-    def __init__(self, klee_replay=None, gcov=None, k_seeds=10, *args, **kwargs):
+    def __init__(self, klee_replay=None, gcov=None, k_seeds=10, *args,
+                 replay_jobs=1, gcov_prefix_dir=None, replay_cache=None, replay_pool=None,
+                 **kwargs):
         '''Create a new SymTuner for KLEE
 
         Args:
             klee_replay: A reference to klee-replay executable. Must be a string or
                 a `symtuner.klee.KLEEReplay` instance.
             gcov: A reference to gcov executable. Must be a string or
-                a `symtuner.klee.GCov` instance.
+                a `symtuner.klee.GCov` instance. A `symtuner.gcda.GCDAReader` instance can also
+                be given to read gcda files without gcov.
+            replay_jobs: The number of testcases to replay concurrently. If larger than 1, each
+                replay worker writes `gcda` files into its own `GCOV_PREFIX` directory. By
+                default, this will be set as 1.
+            gcov_prefix_dir: A directory to make `GCOV_PREFIX` directories of replay workers in.
+                If not specified, a temporary directory is used.
+            replay_cache: Path to a replay cache database or a `symtuner.cache.ReplayCache`
+                instance. If set, testcases with the same content as already evaluated testcases
+                are not replayed again. By default, no cache is used.
+            replay_pool: A `symtuner.klee.ReplayPool` to replay testcases on, e.g. shared with
+                SymTuners of other targets. If set, `replay_jobs` and `gcov_prefix_dir` are
+                ignored. By default, a pool is made at the first submission.
             args: Any positional arguments that are needed to initialize
                 `symtuner.symtuner.SymTuner` object.
             kwargs: Any keyword arguments that are needed to initialize
@@ -420,6 +729,22 @@ class KLEESymTuner(SymTuner):
 
         self.k_seeds = k_seeds
 
+        self.replay_jobs = replay_jobs
+        self.replay_pool = replay_pool
+        self.replay_lock = threading.Lock()
+        self.replay_queued = 0
+        self.gcov_prefix_dir = gcov_prefix_dir
+        self.gcda_indexes = {}
+        self.index_lock = threading.Lock()
+
+        if replay_cache is not None and not isinstance(replay_cache, ReplayCache):
+            if hasattr(self.gcov, 'fingerprint'):
+                namespace = self.gcov.fingerprint()
+            else:
+                namespace = type(self.gcov).__name__
+            replay_cache = ReplayCache(replay_cache, namespace)
+        self.replay_cache = replay_cache
+
     def sample(self, policy=None):
         '''Sample a set of parameters to use
 
@@ -441,76 +766,72 @@ class KLEESymTuner(SymTuner):
             value = parameters[key]
 
             if value == 'random_from_all':
-                testcases = [tc for _, _, tc, _ in self.data]
-                if len(testcases) > 0:
-                    testcase = random.choice(testcases)
+                testcase = None
+                if len(self.data) > 0:
+                    _, _, testcase, _ = self.data[random.randrange(len(self.data))]
+                # Testcases may be pruned from the disk
+                if testcase is not None and Path(testcase).exists():
                     parameters[key] = str(testcase)
                 else:
                     del parameters[key]
 
         return parameters
 
-    def add(self, target, parameters, testcases, evaluation_kwargs=None):
-        '''Evaluate and update data
+    def add_results(self, parameters, testcases, results, stalled=False):
+        '''Update data with evaluated testcases
 
         Update data and space and variables for -seed-file.
 
         Args:
-            target: A target program to evaluate with.
             paramters: A set of parameters used to generated testcases.
             testcases: Testcases genereted with parameters.
-            evaluation_kwargs: A dictionary of keyword arguments pass to evaluate method.
+            results: A list of tuples of covered branches and found bugs of each testcase.
+            stalled: Whether KLEE was stopped early because it stalled. By default, this will be
+                set as False.
 
         Returns:
             Self object for chaining. All updates is recorded in the object.
         '''
 
-        super(KLEESymTuner, self).add(target, parameters, testcases,
-                                      evaluation_kwargs)
+        super(KLEESymTuner, self).add_results(parameters, testcases, results, stalled)
 
         # Skip if -seed-file is not defined in space
         if '-seed-file' not in self.space.keys() and '--seed-file' not in self.space.keys():
             return self
 
-        # Find buggy testcases
-        buggy_seeds = []
-        found_bugs = []
-        for _, bugs, tc, _ in self.data[::-1]:
-            for bug in bugs:
-                if bug not in found_bugs:
-                    found_bugs.append(bug)
-                    buggy_seeds.append(tc)
-
-        # Find top k testcases that covers most
-        accumulated_coverage = set()
-        copied_data = deepcopy(self.data)
-        top_k_seeds = []
-
-        for _ in range(self.k_seeds):
-            if len(copied_data) == 0:
-                break
-            copied_data = sorted(copied_data,
-                                 key=lambda elem: len(elem[0]),
-                                 reverse=True)
-            top_cov, _, tc, _ = copied_data.pop(0)
-            if len(top_cov) > 0:
-                accumulated_coverage = accumulated_coverage | top_cov
-                copied_data = [(cov - accumulated_coverage, bug, tc, param)
-                               for cov, bug, tc, param in copied_data]
-                top_k_seeds.append(tc)
-            else:
-                break
+        # Find buggy testcases and top k testcases that covers most
+        buggy_seeds = [self.data[i][2] for i in self.core_set.bug_finders()]
+        top_k_seeds = [self.data[i][2] for i in self.core_set.cover(self.k_seeds)]
 
-        # Update space for -seed-file
+        # Update space for -seed-file, without testcases pruned from the disk
         key = '-seed-file' if '-seed-file' in self.space.keys() else '--seed-file'
-        seed_files = buggy_seeds + top_k_seeds
+        seed_files = [seed for seed in buggy_seeds + top_k_seeds if Path(seed).exists()]
         self.space[key] = (seed_files, self.space[key][1])
         for seed in seed_files:
-            if seed not in self.cnts[key].keys():
+            if seed not in self.cnts[key]:
                 self.cnts[key][seed] = 0
         return self
 
-    def evaluate(self, target, testcase, folder_depth=1):
+    def get_retained_testcases(self, start=0):
+        '''Get testcases worth keeping
+
+        Get testcases that covered new branches or found bugs when added, among the testcases
+        added from `start`, and the seed files in the tuning space.
+
+        Args:
+            start: Index of the first testcase to consider. By default, consider all testcases.
+
+        Returns:
+            A set of testcases.
+        '''
+
+        retained = super(KLEESymTuner, self).get_retained_testcases(start)
+        for key in ('-seed-file', '--seed-file'):
+            if key in self.space.keys():
+                retained.update(self.space[key][0])
+        return retained
+
+    def evaluate(self, target, testcase, folder_depth=1, gcov_prefix=None):
         '''Evaluate the given testcase
 
         Evalutate the given testcase with KLEE replay and GCov.
@@ -519,25 +840,129 @@ class KLEESymTuner(SymTuner):
         testcase: A testcase (`.ktest` file) to replay.
         folder_depth: Depth of folders to collect gcov files. This argument is passed
             to `GCov.run` and `KLEEReplay.run` methods.
+        gcov_prefix: A directory to write `gcda` files into. If not specified, `gcda` files are
+            written in the object directory of the target program.
 
         Returns:
             A tuple of covered braches and found bugs. The first element of the tuple
             is a set of covered branches and the second element is a set of found bugs.
         '''
 
+        # Reuse the result of a testcase with the same content
+        if self.replay_cache is not None:
+            key = self.replay_cache.key(target, testcase)
+            cached = self.replay_cache.get(key)
+            if cached is not None:
+                return cached
+
         # Remove existing gcdas and gcovs
-        base = Path(target).parent
-        for _ in range(folder_depth):
-            base = base / '..'
-        cmd = ['rm', '-f', str(base / '**/*.gcda'), str(base / '**/*.gcov')]
-        cmd = ' '.join(cmd)
-        get_logger().debug(f'gcda gcov clean up command: {cmd}')
-        _ = sp.run(cmd, shell=True, check=True)
-        errors, gcdas = self.klee_replay.run(target, testcase,
-                                             folder_depth=folder_depth)
-        branches = self.gcov.run(target, gcdas, folder_depth=folder_depth)
+        gcda_index = self.get_gcda_index(target, folder_depth)
+        with self.timer.phase('cleanup'):
+            if gcda_index is not None:
+                gcda_index.clean(gcov_prefix)
+            elif gcov_prefix is not None:
+                for gcda in Path(gcov_prefix).glob('**/*.gcda'):
+                    gcda.unlink()
+            else:
+                base = Path(target).parent
+                for _ in range(folder_depth):
+                    base = base / '..'
+                cmd = ['rm', '-f', str(base / '**/*.gcda'), str(base / '**/*.gcov')]
+                cmd = ' '.join(cmd)
+                get_logger().debug(f'gcda gcov clean up command: {cmd}')
+                _ = sp.run(cmd, shell=True, check=True)
+        with self.timer.phase('replay'):
+            errors, gcdas = self.klee_replay.run(target, testcase, folder_depth=folder_depth,
+                                                 gcov_prefix=gcov_prefix, gcda_index=gcda_index)
+        with self.timer.phase('coverage'):
+            branches = self.gcov.run(target, gcdas, folder_depth=folder_depth,
+                                     gcov_prefix=gcov_prefix)
+        # Do not keep empty coverage, which is usually from a failed (e.g. timed out) replay
+        if self.replay_cache is not None and len(branches) > 0:
+            self.replay_cache.put(key, branches, errors)
         return branches, errors
 
+    def get_gcda_index(self, target, folder_depth=1):
+        '''Get the index of coverage files of the target program
+
+        Get the index of `gcno` files in the object tree of the target program (`folder_depth`
+        levels above the target program). The object tree is indexed once, at the first call for
+        the target program.
+
+        Args:
+            target: A target program to evaluate with. Must be compiled with GCov settings.
+            folder_depth: Depth of folders to index from the target program.
+
+        Returns:
+            A `symtuner.gcda.GCDAIndex`, or None if no `gcno` file is found. Then, the object
+            tree is searched for every testcase.
+        '''
+
+        key = (str(target), folder_depth)
+        with self.index_lock:
+            if key not in self.gcda_indexes:
+                base = Path(target).absolute().parent
+                for _ in range(folder_depth):
+                    base = base / '..'
+                gcda_index = GCDAIndex(base)
+                if len(gcda_index) == 0:
+                    get_logger().warning(f'No gcno file found under: {gcda_index.root}. '
+                                         'The object tree is searched for every testcase.')
+                    gcda_index = None
+                self.gcda_indexes[key] = gcda_index
+            return self.gcda_indexes[key]
+
+    def evaluate_all(self, target, testcases, folder_depth=1):
+        '''Evaluate the given testcases
+
+        Evaluate the given testcases. If `replay_jobs` is larger than 1 or a replay pool is
+        given, testcases are replayed on the replay workers of the pool.
+
+        Args:
+            target: A target program to evaluate with. Must be compiled with GCov settings.
+            testcases: A list of testcases (`.ktest` files) to replay.
+            folder_depth: Depth of folders to collect gcov files. This argument is passed
+                to `KLEESymTuner.evaluate` method.
+
+        Returns:
+            A list of tuples of covered branches and found bugs, in the order of `testcases`.
+        '''
+
+        if self.replay_jobs <= 1 and self.replay_pool is None:
+            return super(KLEESymTuner, self).evaluate_all(target, testcases,
+                                                          folder_depth=folder_depth)
+        futures = [self.submit_evaluation(target, testcase, folder_depth)
+                   for testcase in testcases]
+        return [future.result() for future in futures]
+
+    def submit_evaluation(self, target, testcase, folder_depth=1):
+        '''Evaluate the given testcase in background
+
+        Schedule the evaluation of the given testcase on a replay worker of the replay pool.
+
+        Args:
+            target: A target program to evaluate with. Must be compiled with GCov settings.
+            testcase: A testcase (`.ktest` file) to replay.
+            folder_depth: Depth of folders to collect gcov files. This argument is passed
+                to `KLEESymTuner.evaluate` method.
+
+        Returns:
+            A `concurrent.futures.Future` of the result of `KLEESymTuner.evaluate`.
+        '''
+
+        # Testcases may be submitted from multiple symbolic executor threads
+        with self.replay_lock:
+            if self.replay_pool is None:
+                self.replay_pool = ReplayPool(self.replay_jobs, self.gcov_prefix_dir)
+            self.replay_queued += 1
+        return self.replay_pool.submit(self._evaluate_queued, target, testcase,
+                                       folder_depth=folder_depth)
+
+    def _evaluate_queued(self, target, testcase, folder_depth=1, gcov_prefix=None):
+        with self.replay_lock:
+            self.replay_queued -= 1
+        return self.evaluate(target, testcase, folder_depth=folder_depth, gcov_prefix=gcov_prefix)
+
     @classmethod
     def get_default_space(cls):
         '''Default tuning space for KLEE
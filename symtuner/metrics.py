@@ -0,0 +1,126 @@
+'''Timing instrumentation for SymTuner
+
+This module contains a timer to measure how much wall time goes to each phase of SymTuner
+(sampling, symbolic execution, replaying, computing coverage, updating, ...), and helpers to
+report it per iteration.
+'''
+
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+
+class PhaseTimer:
+    '''Wall time spent in each phase
+
+    Wall time spent in each phase of SymTuner. Phases may be timed from multiple threads (e.g.
+    replay workers) and may be nested (e.g. extracting core parameters while sampling), so the
+    time of phases may add up to more than the wall time.
+    '''
+
+    def __init__(self):
+        '''Create a phase timer
+
+        Create a phase timer. Wall time is measured from the creation of the timer.
+        '''
+
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.counts = {}
+        self.pending = {}
+        self.start = time.monotonic()
+        self.last = self.start
+
+    @contextmanager
+    def phase(self, name):
+        '''Time a phase
+
+        Context manager to add the wall time of its block to the given phase.
+
+        Args:
+            name: Name of the phase.
+        '''
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - start)
+
+    def record(self, name, seconds):
+        '''Add time to a phase
+
+        Add time measured elsewhere (e.g. the running time of symbolic executor) to a phase.
+
+        Args:
+            name: Name of the phase.
+            seconds: Time in seconds to add.
+        '''
+
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0.) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self.pending[name] = self.pending.get(name, 0.) + seconds
+
+    def collect(self):
+        '''Get time of each phase since the last collection
+
+        Get time of each phase and wall time since the last call to `PhaseTimer.collect` (or the
+        creation of the timer), and start a new interval.
+
+        Returns:
+            A tuple of a dictionary of time of each phase in seconds and wall time in seconds.
+        '''
+
+        with self.lock:
+            now = time.monotonic()
+            phases, self.pending = self.pending, {}
+            wall, self.last = now - self.last, now
+        return phases, wall
+
+    def summary(self):
+        '''Get total time of each phase
+
+        Returns:
+            A tuple of a dictionary of total time of each phase in seconds, a dictionary of the
+            number of times each phase was timed, and the wall time in seconds since the creation
+            of the timer.
+        '''
+
+        with self.lock:
+            return dict(self.totals), dict(self.counts), time.monotonic() - self.start
+
+
+def overhead_ratio(symbolic_execution, wall, workers=1):
+    '''Portion of time not spent in symbolic execution
+
+    Portion of time that symbolic executor workers are not running symbolic execution, i.e. spent
+    in SymTuner itself (sampling, replaying, computing coverage, ...) or idle.
+
+    Args:
+        symbolic_execution: Time spent in symbolic execution in seconds, summed over workers.
+        wall: Wall time in seconds.
+        workers: The number of symbolic executor instances run concurrently.
+
+    Returns:
+        A ratio between 0 and 1.
+    '''
+
+    if wall <= 0:
+        return 0.
+    return max(0., 1. - symbolic_execution / (wall * workers))
+
+
+def write_metrics(path, record):
+    '''Append a metrics record
+
+    Append a metrics record to a JSON lines file.
+
+    Args:
+        path: Path to the metrics file.
+        record: A dictionary to write.
+    '''
+
+    with open(path, 'a') as stream:
+        stream.write(json.dumps(record) + '\n')
@@ -0,0 +1,201 @@
+'''Samplers of parameters for SymTuner
+
+This module contains samplers that learn which parameters pay off incrementally, as an
+alternative to the explore and exploit policies of SymTuner that recompute their probabilities
+from all testcases collected so far.
+'''
+
+from abc import ABC
+from abc import abstractmethod
+
+import numpy as np
+
+from symtuner.counts import CountTable
+
+
+class Sampler(ABC):
+    '''Abstract class for all samplers
+
+    All samplers *must* inherit this class and implement the `Sampler.sample` method and the
+    `Sampler.update` method. Both must not depend on the number of testcases collected so far.
+    '''
+
+    @abstractmethod
+    def sample(self, space):
+        '''Sample values of parameters
+
+        Args:
+            space: A dictionary of tuning space. Key is the name of the parameter and the value
+                is a tuple of a list of values and the maximum number of values to sample.
+
+        Returns:
+            A dictionary of sampled parameters. Key is the name of the parameter and the value is
+            a list of sampled values.
+        '''
+
+    @abstractmethod
+    def update(self, space, parameters, reward):
+        '''Update with the result of a symbolic executor run
+
+        Args:
+            space: A dictionary of tuning space, in the same form as for `Sampler.sample`.
+            parameters: A dictionary of parameters used in the run.
+            reward: Whether the run paid off, i.e. covered new branches or found new bugs.
+        '''
+
+    def set_prior(self, prior):
+        '''Set the prior from previous campaigns
+
+        By default, the prior is ignored.
+
+        Args:
+            prior: A dictionary of counts of previous campaigns made by
+                `symtuner.symtuner.SymTuner.set_prior`.
+        '''
+
+        pass
+
+
+class ThompsonSampler(Sampler):
+    '''Thompson sampling over parameter values
+
+    Thompson sampling with a Beta posterior for each value of each parameter, and for each number
+    of values to sample. A run with the value is a success if it covered new branches or found
+    new bugs. Each value of a parameter is picked by drawing from the posteriors of all values
+    of the parameter and taking the largest draw, so values are picked with replacement like the
+    policies of SymTuner.
+    '''
+
+    def __init__(self):
+        '''Create a Thompson sampler
+
+        Create a Thompson sampler with uniform priors.
+        '''
+
+        self.successes = {}
+        self.failures = {}
+        self.len_successes = {}
+        self.len_failures = {}
+        self.prior = None
+
+    def set_prior(self, prior):
+        '''Set the prior from previous campaigns
+
+        Values are seeded with successes as many as their counts in the core parameters of
+        previous campaigns, and failures as many as the rest of their counts, when their
+        posteriors are created.
+
+        Args:
+            prior: A dictionary of counts of previous campaigns made by
+                `symtuner.symtuner.SymTuner.set_prior`.
+        '''
+
+        self.prior = prior
+
+    def _ensure(self, param, values, lengths):
+        '''Create or extend the posteriors of a parameter
+
+        Args:
+            param: Name of the parameter.
+            values: Values of the parameter to have posteriors.
+            lengths: Numbers of values of the parameter to have posteriors.
+
+        Returns:
+            A tuple of `symtuner.counts.CountTable` of successes and failures of values, and
+            successes and failures of numbers of values of the parameter.
+        '''
+
+        if param not in self.successes:
+            self.successes[param] = CountTable()
+            self.failures[param] = CountTable()
+            self.len_successes[param] = CountTable()
+            self.len_failures[param] = CountTable()
+        tables = (self.successes[param], self.failures[param],
+                  self.len_successes[param], self.len_failures[param])
+        successes, failures, len_successes, len_failures = tables
+        for keys, success_table, failure_table, kind in (
+                (values, successes, failures, 'cnts'),
+                (lengths, len_successes, len_failures, 'len_cnts')):
+            for key in keys:
+                if key in success_table:
+                    continue
+                success, failure = 0, 0
+                if self.prior is not None and param in self.prior[kind]:
+                    used = self.prior[kind][param].get(key, 0)
+                    success = min(self.prior[f'core_{kind}'][param].get(key, 0), used)
+                    success, failure = int(round(success)), int(round(used - success))
+                success_table[key] = success
+                failure_table[key] = failure
+        return tables
+
+    @staticmethod
+    def draw(successes, failures, values, size=None):
+        '''Draw from the posteriors of values
+
+        Args:
+            successes: A `symtuner.counts.CountTable` of successes.
+            failures: A `symtuner.counts.CountTable` of failures.
+            values: A list of values to draw for.
+            size: The number of draws of each value. If not specified, draw once.
+
+        Returns:
+            A numpy array of draws, with a row for each draw if `size` is given.
+        '''
+
+        # Positions first, as new values grow the arrays
+        positions, failure_positions = successes.positions(values), failures.positions(values)
+        alpha = successes.array()[positions] + 1
+        beta = failures.array()[failure_positions] + 1
+        if size is not None:
+            return np.random.beta(alpha, beta, size=(size, len(values)))
+        return np.random.beta(alpha, beta)
+
+    def sample(self, space):
+        '''Sample values of parameters
+
+        Args:
+            space: A dictionary of tuning space. Key is the name of the parameter and the value
+                is a tuple of a list of values and the maximum number of values to sample.
+
+        Returns:
+            A dictionary of sampled parameters. Key is the name of the parameter and the value is
+            a list of sampled values.
+        '''
+
+        sampled = {}
+        for param, (values, n_sample) in space.items():
+            if len(values) == 0:
+                continue
+            lengths = range(1, n_sample + 1)
+            successes, failures, len_successes, len_failures = self._ensure(param, values,
+                                                                            lengths)
+            n_sample = int(np.argmax(self.draw(len_successes, len_failures, lengths))) + 1
+            picked = np.argmax(self.draw(successes, failures, values, size=n_sample), axis=1)
+            sampled[param] = [values[i] for i in picked]
+        return sampled
+
+    def update(self, space, parameters, reward):
+        '''Update with the result of a symbolic executor run
+
+        Update the posteriors of the used values, including runs with parameters that are not
+        sampled by this sampler (e.g. sampled with the explore policy). Parameters not in the
+        tuning space (e.g. fixed default parameters) are ignored.
+
+        Args:
+            space: A dictionary of tuning space, in the same form as for `Sampler.sample`.
+            parameters: A dictionary of parameters used in the run.
+            reward: Whether the run paid off, i.e. covered new branches or found new bugs.
+        '''
+
+        for param, values in parameters.items():
+            if param not in space or not isinstance(values, list):
+                continue
+            space_values, n_sample = space[param]
+            # Count each value once per run, even if it is sampled multiple times
+            used = list(dict.fromkeys(values))
+            successes, failures, len_successes, len_failures = self._ensure(
+                param, [*space_values, *used], range(1, max(n_sample, len(values)) + 1))
+            counts, len_counts = (successes, len_successes) if reward else (failures, len_failures)
+            len_counts.add(len(values))
+            for value in used:
+                counts.add(value)
@@ -0,0 +1,253 @@
+'''Live status of SymTuner campaigns
+
+This module contains the live status of a campaign, which is written into a JSON file as a
+heartbeat and optionally served over HTTP (as JSON and OpenMetrics text), so that the progress of
+a campaign can be polled without parsing logs.
+'''
+
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn
+import json
+import os
+import threading
+
+from symtuner.logger import get_logger
+
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+
+class CampaignStatus:
+    '''Live status of a campaign
+
+    Live status of a campaign: progress updated by the campaign, and fields polled when the
+    status is read (e.g. elapsed time). The status is written into a JSON file atomically every
+    time it is updated and every `interval` seconds in between, so the modification time of the
+    file is a heartbeat of the campaign.
+    '''
+
+    def __init__(self, path=None, interval=10, poll=None, **fields):
+        '''Create a live status
+
+        Args:
+            path: Path to the JSON file to write the status into. If not specified, the status
+                is not written.
+            interval: Seconds between writes of the status while it is not updated.
+            poll: A function returning a dictionary of fields to update whenever the status is
+                read, e.g. elapsed time.
+            fields: Initial fields of the status.
+        '''
+
+        self.path = Path(path) if path is not None else None
+        self.interval = interval
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.fields = dict(fields, pid=os.getpid(), started=datetime.now().isoformat(),
+                           state='running')
+        self.klee = {}
+        self.stopped = threading.Event()
+        self.heartbeat = None
+
+    def start(self):
+        '''Start writing the status periodically
+
+        Returns:
+            Self object for chaining.
+        '''
+
+        self.write()
+        if self.path is not None and self.heartbeat is None:
+            self.heartbeat = threading.Thread(target=self._beat, daemon=True)
+            self.heartbeat.start()
+        return self
+
+    def stop(self, state='done'):
+        '''Stop writing the status periodically
+
+        Stop the heartbeat and write the final status.
+
+        Args:
+            state: The final state of the campaign.
+        '''
+
+        self.stopped.set()
+        if self.heartbeat is not None:
+            self.heartbeat.join()
+            self.heartbeat = None
+        self.update(state=state)
+
+    def _beat(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                get_logger().warning(f'Failed to write status: {e}')
+
+    def update(self, **fields):
+        '''Update fields of the status and write it
+
+        Args:
+            fields: Fields to update.
+        '''
+
+        with self.lock:
+            self.fields.update(fields)
+        self.write()
+
+    def start_klee(self, iteration, pid, time_budget, parameters):
+        '''Record a started symbolic executor
+
+        Args:
+            iteration: The iteration of the symbolic executor run.
+            pid: Process id of the symbolic executor.
+            time_budget: Time budget of the run in seconds.
+            parameters: Parameters of the run.
+        '''
+
+        with self.lock:
+            self.klee[iteration] = {
+                'iteration': iteration + 1,
+                'pid': pid,
+                'time_budget': time_budget,
+                'parameters': parameters,
+            }
+        self.write()
+
+    def finish_klee(self, iteration):
+        '''Record a finished symbolic executor
+
+        Args:
+            iteration: The iteration of the symbolic executor run.
+        '''
+
+        with self.lock:
+            self.klee.pop(iteration, None)
+
+    def snapshot(self):
+        '''Get the current status
+
+        Returns:
+            A dictionary of the current status.
+        '''
+
+        polled = self.poll() if self.poll is not None else {}
+        with self.lock:
+            status = dict(self.fields, **polled)
+            status['klee'] = [self.klee[i] for i in sorted(self.klee)]
+        status['updated'] = datetime.now().isoformat()
+        return status
+
+    def to_json(self):
+        '''Get the current status as JSON
+
+        Returns:
+            A JSON string of the current status.
+        '''
+
+        # Parameters may contain values that are not JSON types (e.g. paths of seed files)
+        return json.dumps(self.snapshot(), indent=4, default=str)
+
+    def to_openmetrics(self):
+        '''Get the current status as OpenMetrics text
+
+        Returns:
+            A string of counters and gauges of the current status in OpenMetrics text format.
+        '''
+
+        status = self.snapshot()
+        metrics = [
+            ('iterations', 'counter', 'Finished symbolic executor runs',
+             status.get('iteration', 0)),
+            ('testcases', 'counter', 'Evaluated testcases', status.get('testcases', 0)),
+            ('coverage_branches', 'gauge', 'Covered branches', status.get('coverage', 0)),
+            ('bugs', 'gauge', 'Found bugs', status.get('bugs', 0)),
+            ('elapsed_seconds', 'gauge', 'Elapsed time', status.get('elapsed', 0)),
+            ('budget_seconds', 'gauge', 'Total time budget', status.get('budget', 0)),
+            ('running_symbolic_executors', 'gauge', 'Running symbolic executors',
+             len(status['klee'])),
+            ('replay_queue', 'gauge', 'Testcases waiting to be replayed',
+             status.get('replay_queue', 0)),
+        ]
+        lines = []
+        for name, kind, description, value in metrics:
+            lines.append(f'# TYPE symtuner_{name} {kind}')
+            lines.append(f'# HELP symtuner_{name} {description}.')
+            suffix = '_total' if kind == 'counter' else ''
+            lines.append(f'symtuner_{name}{suffix} {value}')
+        phases = status.get('phases', {})
+        if len(phases) > 0:
+            lines.append('# TYPE symtuner_phase_seconds counter')
+            lines.append('# HELP symtuner_phase_seconds Time spent in each phase.')
+            for phase, seconds in sorted(phases.items()):
+                lines.append(f'symtuner_phase_seconds_total{{phase="{phase}"}} {seconds:.3f}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        '''Write the current status into the status file atomically'''
+
+        if self.path is None:
+            return
+        text = self.to_json()
+        # Each writer uses its own temporary file, as the heartbeat writes concurrently
+        tmp = self.path.parent / f'.{self.path.name}.{threading.get_ident()}.tmp'
+        tmp.write_text(text)
+        os.replace(str(tmp), str(self.path))
+
+
+class _StatusServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StatusServer:
+    '''HTTP endpoint of a live status
+
+    HTTP endpoint serving a `CampaignStatus`: `/status` (and `/`) as JSON and `/metrics` as
+    OpenMetrics text. The server runs in a daemon thread.
+    '''
+
+    def __init__(self, status, port, host='127.0.0.1'):
+        '''Create and start an HTTP endpoint
+
+        Args:
+            status: A `CampaignStatus` to serve.
+            port: Port to listen on. If 0, a free port is chosen.
+            host: Address to listen on. By default, only local connections are accepted.
+        '''
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path in ('/', '/status'):
+                    body, content_type = status.to_json(), 'application/json'
+                elif path == '/metrics':
+                    body, content_type = status.to_openmetrics(), OPENMETRICS_CONTENT_TYPE
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                get_logger().debug(f'status endpoint: {format % args}')
+
+        self.server = _StatusServer((host, port), Handler)
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        get_logger().info(f'Status is served at: http://{self.host}:{self.port}/status')
+
+    def close(self):
+        '''Stop the HTTP endpoint'''
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
@@ -0,0 +1,271 @@
+'''Stores of testcase evaluation results
+
+This module contains stores that keep the evaluation results of testcases, i.e. quadruples of
+coverage, found bugs, a testcase, and used parameters. `MemoryStore` keeps every result in memory.
+`DiskStore` keeps only the results that matter to SymTuner in memory and spills the others into
+a file, so that memory usage does not grow with the number of testcases.
+'''
+
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+import mmap
+
+from symtuner.coverage import Coverage
+
+
+class MemoryStore:
+    '''Store keeping every result in memory
+
+    Store keeping every result in memory. Results are kept in a column for each element of the
+    quadruple, and `MemoryStore.coverages` is the list of coverages itself.
+    '''
+
+    def __init__(self, records=None):
+        '''Create a memory store
+
+        Args:
+            records: A list of quadruples of coverage, found bugs, a testcase, and used parameters
+                to start with.
+        '''
+
+        self.coverages = []
+        self.bugs = []
+        self.testcases = []
+        self.parameters = []
+        if records is not None:
+            for record in records:
+                self.append(*record)
+
+    def __len__(self):
+        return len(self.coverages)
+
+    def __getitem__(self, index):
+        return (self.coverages[index], self.bugs[index], self.testcases[index],
+                self.parameters[index])
+
+    def __iter__(self):
+        return zip(self.coverages, self.bugs, self.testcases, self.parameters)
+
+    def append(self, coverage, bugs, testcase, parameters, contributing=True):
+        '''Add a result
+
+        Args:
+            coverage: A `symtuner.coverage.Coverage` of the testcase.
+            bugs: A set of bugs found by the testcase.
+            testcase: A testcase.
+            parameters: Parameters used to generate the testcase.
+            contributing: Whether the testcase covered new branches or found bugs. Ignored in this
+                store.
+        '''
+
+        self.coverages.append(coverage)
+        self.bugs.append(bugs)
+        self.testcases.append(testcase)
+        self.parameters.append(parameters)
+
+
+class CoverageView:
+    '''Read-only list of coverages in a `DiskStore`'''
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __getitem__(self, index):
+        return self.store.coverage(index)
+
+
+class DiskStore:
+    '''Store spilling results into a file
+
+    Store keeping results of contributing testcases (testcases that covered new branches or found
+    bugs when added) in memory and spilling the others into an append-only file. The number of
+    contributing testcases is bounded by the number of branches and bugs, so memory usage does not
+    grow with the number of testcases. For spilled results, only their offsets in the file and
+    their parameters are kept in memory. Spilled results are read back through a memory map, and
+    recently read coverages are cached up to `cache_size` bytes.
+
+    When unpickled from a checkpoint, the spill file is closed until `DiskStore.open` is called,
+    so that loading a checkpoint never modifies the spill file.
+    '''
+
+    def __init__(self, path, cache_size=64 * 1024 * 1024):
+        '''Create a disk store
+
+        Args:
+            path: Path to the file to spill results into. Truncated if exists.
+            cache_size: Maximum bytes of spilled coverages to cache in memory. By default, this
+                will be set as 64MiB.
+        '''
+
+        self.path = Path(path).absolute()
+        self.cache_size = cache_size
+
+        self.kept = {}
+        self.offsets = array('q')
+        self.coverage_sizes = array('l')
+        self.testcase_sizes = array('l')
+        self.parameter_ids = array('l')
+        self.parameter_list = []
+        self.parameter_index = {}
+        self.end = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_bytes(b'')
+        self.open(writable=True)
+
+    def open(self, directory=None, writable=False):
+        '''Open the spill file
+
+        Args:
+            directory: A directory to find the spill file in, e.g. the directory of the
+                checkpoint that the store is restored from. If not specified, the spill file is
+                opened where it was created.
+            writable: Whether to append results to the spill file. If set, results spilled after
+                the store was saved are truncated. By default, the spill file is opened read-only.
+
+        Returns:
+            Self object for chaining.
+        '''
+
+        if directory is not None:
+            self.path = Path(directory).absolute() / self.path.name
+        if writable:
+            self.file = self.path.open('r+b')
+            self.file.truncate(self.end)
+            self.file.seek(self.end)
+        else:
+            self.file = self.path.open('rb')
+        self.map = None
+        self.mapped = 0
+        self.cache = OrderedDict()
+        self.cached = 0
+        self.coverages = CoverageView(self)
+        return self
+
+    def __getstate__(self):
+        # Spilled results stay in the file, only the index is saved
+        if self.file is not None:
+            self.file.flush()
+        state = self.__dict__.copy()
+        for attr in ('file', 'map', 'mapped', 'cache', 'cached', 'coverages', 'parameter_index'):
+            del state[attr]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Parameters are indexed by their identities, which change when unpickled
+        self.parameter_index = {id(parameters): pid
+                                for pid, parameters in enumerate(self.parameter_list)}
+        self.file = None
+        self.map = None
+        self.mapped = 0
+        self.cache = OrderedDict()
+        self.cached = 0
+        self.coverages = CoverageView(self)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        record = self.kept.get(index)
+        if record is not None:
+            return record
+        offset = self.offsets[index]
+        coverage_size = self.coverage_sizes[index]
+        raw = self.read(offset + coverage_size, self.testcase_sizes[index])
+        testcase = Path(raw.decode())
+        parameters = self.parameter_list[self.parameter_ids[index]]
+        return self.coverage(index), set(), testcase, parameters
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, coverage, bugs, testcase, parameters, contributing=True):
+        '''Add a result
+
+        Args:
+            coverage: A `symtuner.coverage.Coverage` of the testcase.
+            bugs: A set of bugs found by the testcase.
+            testcase: A testcase.
+            parameters: Parameters used to generate the testcase.
+            contributing: Whether the testcase covered new branches or found bugs. Results of
+                contributing testcases and testcases finding bugs are kept in memory.
+        '''
+
+        index = len(self)
+        pid = self.parameter_index.get(id(parameters))
+        if pid is None:
+            pid = len(self.parameter_list)
+            self.parameter_index[id(parameters)] = pid
+            self.parameter_list.append(parameters)
+
+        if contributing or len(bugs) > 0:
+            self.kept[index] = (coverage, bugs, testcase, parameters)
+            raw_coverage, raw_testcase = b'', b''
+        else:
+            raw_coverage = int(coverage).to_bytes((coverage.bit_length() + 7) // 8, 'little')
+            raw_testcase = str(testcase).encode()
+            self.file.write(raw_coverage)
+            self.file.write(raw_testcase)
+
+        self.offsets.append(self.end)
+        self.coverage_sizes.append(len(raw_coverage))
+        self.testcase_sizes.append(len(raw_testcase))
+        self.parameter_ids.append(pid)
+        self.end += len(raw_coverage) + len(raw_testcase)
+
+    def coverage(self, index):
+        '''Get the coverage of a result
+
+        Args:
+            index: Index of the result.
+
+        Returns:
+            A `symtuner.coverage.Coverage` of the result.
+        '''
+
+        record = self.kept.get(index)
+        if record is not None:
+            return record[0]
+        coverage = self.cache.get(index)
+        if coverage is not None:
+            self.cache.move_to_end(index)
+            return coverage
+
+        size = self.coverage_sizes[index]
+        coverage = Coverage(int.from_bytes(self.read(self.offsets[index], size), 'little'))
+        self.cache[index] = coverage
+        self.cached += size
+        while self.cached > self.cache_size and len(self.cache) > 0:
+            evicted, _ = self.cache.popitem(last=False)
+            self.cached -= self.coverage_sizes[evicted]
+        return coverage
+
+    def read(self, offset, size):
+        '''Read bytes from the spill file
+
+        Args:
+            offset: Offset to read from.
+            size: Number of bytes to read.
+
+        Returns:
+            Bytes read.
+        '''
+
+        if size == 0:
+            return b''
+        if offset + size > self.mapped:
+            # Map again to see results appended after the last mapping
+            self.file.flush()
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapped = len(self.map)
+        return self.map[offset:offset + size]
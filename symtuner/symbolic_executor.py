@@ -16,7 +16,7 @@ class SymbolicExecutor(ABC):
 
     @abstractmethod
     def run(self, target, parameters, **kwargs):
-        '''Run symbolic executor with the given parameters and return a list of generated testcases
+        '''Run symbolic executor with the given parameters and return the generated testcases
 
         This method will make a command and run a symbolic executor internally and collect the
         generated testcases with the given parameters.
@@ -28,7 +28,8 @@ class SymbolicExecutor(ABC):
             kwargs: Any keyword arguments that are needed to run symbolic executor.
 
         Returns:
-            A list of all generated testcases with the given paramets.
+            A tuple of a list of all generated testcases with the given paramets, and whether
+            symbolic executor was stopped early because it stalled.
         '''
 
     @abstractmethod
@@ -7,14 +7,31 @@ and SymTuner interface (with implementation of common algorithm).
 from abc import ABC
 from abc import abstractclassmethod
 from abc import abstractmethod
-from copy import deepcopy
 from datetime import datetime
+from datetime import timedelta
 from pathlib import Path
 import json
+import math
 import numpy as np
 import random
 
+from symtuner.coverage import BranchTable
+from symtuner.coverage import CoreSet
+from symtuner.counts import CountTable
+from symtuner.counts import lookup
 from symtuner.logger import get_logger
+from symtuner.metrics import PhaseTimer
+from symtuner.store import MemoryStore
+
+
+# Weight of the latest iteration in the running average of evaluation cost
+EVALUATION_COST_SMOOTHING = 0.5
+# Weight of the latest iteration in the running average of coverage rate of a budget tier
+COVERAGE_RATE_SMOOTHING = 0.3
+# A budget tier is saturated when its coverage rate drops below this portion of its best rate
+SATURATION_RATIO = 0.5
+# The number of runs with a budget tier before deciding it is saturated
+MINIMUM_TIER_RUNS = 3
 
 
 class TimeBudgetHandler:
@@ -27,7 +44,8 @@ class TimeBudgetHandler:
                  minimum_ratio=0.005,
                  steps_per_round=20,
                  increase_ratio=2.,
-                 minimum_time_budget=30):
+                 minimum_time_budget=30,
+                 max_evaluation_share=None):
         '''Create a time budget hander
 
         Create a time budget handler. This handles time as seconds.
@@ -42,42 +60,163 @@ class TimeBudgetHandler:
             increase_ratio: The multiple used when calculating next time budget. The next time
                 budget after `steps_per_round` will caculated as the product of latest time
                 budget and `increase_ratio`. By default, this will be set as 2.
+            minimum_time_budget: Minimum time budget in seconds. By default, this will be set
+                as 30.
+            max_evaluation_share: Maximum share of wall time to spend evaluating testcases. If
+                evaluation takes more, the time budget is increased without waiting for the end
+                of the round. By default, the share is not capped.
         '''
 
         self.total_budget = total_budget
         self.steps_per_round = steps_per_round
         self.increase_ratio = increase_ratio
+        self.max_evaluation_share = max_evaluation_share
 
         self.steps_in_round = 0
+        self.reclaimed = 0
         self.current_time_budget = int(self.total_budget * minimum_ratio)
         self.current_time_budget = max(self.current_time_budget,
                                        minimum_time_budget)
+        # Seconds of evaluation per second of symbolic execution
+        self.evaluation_cost = None
 
         self.start_time: datetime = datetime.now()
 
     def get_time_budget(self):
         '''Get time budget for this iteration
 
-        Calcuate and returns a time budget for this iteration
+        Calcuate and returns a time budget for this iteration. The time budget leaves room for
+        evaluating the testcases of the iteration, so that the last iteration ends on the deadline.
 
         Returns:
-            Time budget in seconds. If time budget expired return -1.
+            A tuple of time budget in seconds and the tier of the time budget, which is passed
+            back to `TimeBudgetHandler.reward`. If time budget expired return (-1, None).
         '''
 
         # Check timeout
         time_elapsed = (datetime.now() - self.start_time).total_seconds()
         if time_elapsed > self.total_budget:
-            return -1
+            return -1, None
 
         # Get next time step
+        self.current_time_budget, tier = self.next_time_budget()
+        remaining_time = self.total_budget - int(time_elapsed)
+
+        # Give back the seconds reclaimed from runs terminated early
+        extra = min(self.reclaimed, self.current_time_budget)
+        self.reclaimed -= extra
+        if self.evaluation_cost is not None:
+            remaining_time = int(remaining_time / (1 + self.evaluation_cost))
+        # Too little time left to run and evaluate (0 means no limit for symbolic executors)
+        if remaining_time < 1:
+            return -1, None
+        time_budget = min(self.current_time_budget + extra, remaining_time)
+        return time_budget, tier
+
+    def next_time_budget(self):
+        '''Get the time budget of the schedule for this iteration
+
+        Get the time budget of the schedule for this iteration, before reclaimed seconds are
+        added and the deadline is applied. The time budget increases by `increase_ratio` every
+        `steps_per_round` iterations.
+
+        Returns:
+            A tuple of time budget in seconds and its tier. The fixed schedule has no tiers, so
+            the tier is always None.
+        '''
+
         self.steps_in_round += 1
         if self.steps_in_round > self.steps_per_round:
-            self.current_time_budget *= self.increase_ratio
-            self.current_time_budget = int(self.current_time_budget)
             self.steps_in_round = 1
-        remaining_time = self.total_budget - int(time_elapsed)
-        time_budget = min(self.current_time_budget, remaining_time)
-        return time_budget
+            return int(self.current_time_budget * self.increase_ratio), None
+        return self.current_time_budget, None
+
+    def reward(self, tier, gain, seconds, stalled=False):
+        '''Record the result of an iteration
+
+        Record how much coverage an iteration gained. The fixed schedule does not depend on the
+        results, so this does nothing; see `AdaptiveTimeBudgetHandler`.
+
+        Args:
+            tier: The tier of the time budget of the iteration, given by
+                `TimeBudgetHandler.get_time_budget`.
+            gain: The number of newly covered branches.
+            seconds: Wall time in seconds spent for the iteration.
+            stalled: Whether symbolic executor was stopped early because it stalled. By default,
+                this will be set as False.
+        '''
+
+        pass
+
+    def record(self, symbolic_execution, evaluation):
+        '''Record the cost of an iteration
+
+        Record time spent in symbolic execution and in evaluating the generated testcases, to
+        size the next time budgets with. If the share of evaluation exceeds
+        `max_evaluation_share`, the time budget is increased at the next iteration.
+
+        Args:
+            symbolic_execution: Seconds spent in symbolic execution.
+            evaluation: Seconds spent in evaluating the testcases after symbolic execution.
+        '''
+
+        cost = evaluation / max(symbolic_execution, 1)
+        if self.evaluation_cost is None:
+            self.evaluation_cost = cost
+        else:
+            self.evaluation_cost = (EVALUATION_COST_SMOOTHING * cost
+                                    + (1 - EVALUATION_COST_SMOOTHING) * self.evaluation_cost)
+
+        share = self.evaluation_cost / (1 + self.evaluation_cost)
+        if self.max_evaluation_share is not None and share > self.max_evaluation_share:
+            self.steps_in_round = self.steps_per_round
+
+    def reclaim(self, seconds):
+        '''Give back unused seconds of a time budget
+
+        Give back seconds of a time budget that were not used because the run terminated early
+        (e.g. stopped due to no progress). Reclaimed seconds are added to the next time budgets,
+        at most the current time budget at a time.
+
+        Args:
+            seconds: Unused seconds.
+        '''
+
+        self.reclaimed += max(int(seconds), 0)
+
+    def get_state(self):
+        '''Get the progress of the time budget handler
+
+        Get the progress of the time budget handler to save in a checkpoint. The configurations
+        (e.g. total budget) are not included, so that they can be changed when resumed.
+
+        Returns:
+            A dictionary of the progress.
+        '''
+
+        return {
+            'steps_in_round': self.steps_in_round,
+            'reclaimed': self.reclaimed,
+            'current_time_budget': self.current_time_budget,
+            'evaluation_cost': self.evaluation_cost,
+            'elapsed': (datetime.now() - self.start_time).total_seconds(),
+        }
+
+    def set_state(self, state):
+        '''Restore the progress of the time budget handler
+
+        Restore the progress of the time budget handler from a checkpoint. The elapsed time is
+        continued from the checkpoint, so the time while not running is not counted.
+
+        Args:
+            state: A dictionary returned by `TimeBudgetHandler.get_state`.
+        '''
+
+        self.steps_in_round = state['steps_in_round']
+        self.reclaimed = state['reclaimed']
+        self.current_time_budget = state['current_time_budget']
+        self.evaluation_cost = state.get('evaluation_cost')
+        self.start_time = datetime.now() - timedelta(seconds=state['elapsed'])
 
     def __iter__(self):
         '''Magic method to make iterable
@@ -85,17 +224,18 @@ class TimeBudgetHandler:
         Magic method to make iterable.
 
         Yields:
-            Time budget calculated with `TimeBudgetHander.get_time_budget` method.
+            A tuple of time budget and its tier calculated with
+            `TimeBudgetHander.get_time_budget` method.
 
         Raises:
             StopIteration: When time budget expried.
         '''
 
         while True:
-            time_budget = self.get_time_budget()
+            time_budget, tier = self.get_time_budget()
             if time_budget < 0:
                 break
-            yield time_budget
+            yield time_budget, tier
         return
 
     @property
@@ -111,6 +251,132 @@ class TimeBudgetHandler:
         return int((datetime.now() - self.start_time).total_seconds())
 
 
+class AdaptiveTimeBudgetHandler(TimeBudgetHandler):
+    '''Time budget handler driven by coverage rate
+
+    Time budget handler that picks the time budget of each iteration from tiers of increasing
+    budgets (the minimum time budget multiplied by `increase_ratio`), by the coverage gained per
+    second with each tier so far. Picking is a bandit with upper confidence bounds over the
+    recent coverage rates of tiers. A larger tier is unlocked only when the largest tier so far
+    saturates, so short budgets keep being used while they pay off.
+    '''
+
+    def __init__(self, total_budget, *args, exploration=0.5, **kwargs):
+        '''Create an adaptive time budget handler
+
+        Args:
+            total_budget: Total amount of seconds.
+            exploration: Weight of the confidence bound relative to the best coverage rate. By
+                default, this will be set as 0.5.
+            args: Any positional arguments that are needed to initialize
+                `symtuner.symtuner.TimeBudgetHandler` object.
+            kwargs: Any keyword arguments that are needed to initialize
+                `symtuner.symtuner.TimeBudgetHandler` object.
+        '''
+
+        super(AdaptiveTimeBudgetHandler, self).__init__(total_budget, *args, **kwargs)
+        self.exploration = exploration
+
+        # Tiers up to a quarter of the total budget
+        self.tiers = [self.current_time_budget]
+        while (self.increase_ratio > 1
+               and int(self.tiers[-1] * self.increase_ratio) <= total_budget / 4):
+            self.tiers.append(int(self.tiers[-1] * self.increase_ratio))
+        self.unlocked = 1
+        self.runs = [0] * len(self.tiers)
+        self.rates = [0.] * len(self.tiers)
+        self.best_rates = [0.] * len(self.tiers)
+
+    def next_time_budget(self):
+        '''Get the time budget of the schedule for this iteration
+
+        Pick a tier with the highest upper confidence bound of coverage rate among unlocked
+        tiers. Tiers not run yet are picked first.
+
+        Returns:
+            A tuple of time budget in seconds and the index of its tier.
+        '''
+
+        total_runs = sum(self.runs)
+        scale = max(max(self.best_rates), 1e-9)
+        best, best_score = 0, None
+        for tier in range(self.unlocked):
+            if self.runs[tier] == 0:
+                best = tier
+                break
+            bound = scale * math.sqrt(2 * math.log(total_runs) / self.runs[tier])
+            score = self.rates[tier] + self.exploration * bound
+            if best_score is None or score > best_score:
+                best, best_score = tier, score
+        return self.tiers[best], best
+
+    def reward(self, tier, gain, seconds, stalled=False):
+        '''Record the result of an iteration
+
+        Update the coverage rate of the tier, and unlock the next tier if the largest unlocked
+        tier is saturated. A stalled iteration is charged the whole time budget of the tier, so
+        that stopping early does not make the tier look productive.
+
+        Args:
+            tier: The index of the tier of the time budget of the iteration, given by
+                `TimeBudgetHandler.get_time_budget`.
+            gain: The number of newly covered branches.
+            seconds: Wall time in seconds spent for the iteration.
+            stalled: Whether symbolic executor was stopped early because it stalled. By default,
+                this will be set as False.
+
+        Raises:
+            ValueError: If the tier is not a tier of the time budget handler.
+        '''
+
+        if not isinstance(tier, int) or not 0 <= tier < len(self.tiers):
+            raise ValueError(f'Unknown time budget tier: {tier}')
+        if stalled:
+            seconds = max(seconds, self.tiers[tier])
+        rate = gain / max(seconds, 1)
+        if self.runs[tier] == 0:
+            self.rates[tier] = rate
+        else:
+            self.rates[tier] = (COVERAGE_RATE_SMOOTHING * rate
+                                + (1 - COVERAGE_RATE_SMOOTHING) * self.rates[tier])
+        self.runs[tier] += 1
+        self.best_rates[tier] = max(self.best_rates[tier], self.rates[tier])
+
+        largest = self.unlocked - 1
+        if (self.unlocked < len(self.tiers) and self.runs[largest] >= MINIMUM_TIER_RUNS
+                and self.rates[largest] < SATURATION_RATIO * self.best_rates[largest]):
+            self.unlocked += 1
+            get_logger().info(f'Time budget of {self.tiers[largest]}s saturated. '
+                              f'Time budget of {self.tiers[self.unlocked - 1]}s unlocked.')
+
+    def get_state(self):
+        '''Get the progress of the time budget handler
+
+        Returns:
+            A dictionary of the progress, including coverage rates of tiers.
+        '''
+
+        state = super(AdaptiveTimeBudgetHandler, self).get_state()
+        state.update(unlocked=self.unlocked, runs=self.runs, rates=self.rates,
+                     best_rates=self.best_rates)
+        return state
+
+    def set_state(self, state):
+        '''Restore the progress of the time budget handler
+
+        Args:
+            state: A dictionary returned by `TimeBudgetHandler.get_state`. If saved by the fixed
+                schedule, coverage rates are learned from scratch.
+        '''
+
+        super(AdaptiveTimeBudgetHandler, self).set_state(state)
+        if 'rates' in state and len(state['rates']) == len(self.tiers):
+            self.unlocked = state['unlocked']
+            self.runs = state['runs']
+            self.rates = state['rates']
+            self.best_rates = state['best_rates']
+
+
 class SymTuner(ABC):
     '''SymTuner interface with common algorithm implemented
 
@@ -119,7 +385,8 @@ class SymTuner(ABC):
     `SymTuner.get_default_space`.
     '''
 
-    def __init__(self, parameter_space=None, exploit_portion=0.7):
+    def __init__(self, parameter_space=None, exploit_portion=0.7, result_store=None, timer=None,
+                 sampler=None):
         '''Create SymTuner
 
         Create SymTuner.
@@ -131,6 +398,13 @@ class SymTuner(ABC):
                 following methods: `SymTuner.get_default_space` and
                 `SymTuner.get_default_default_parameters`.
             exploit_portion: A portion of exploit. By default, this will be set as 0.7.
+            result_store: A store to keep evaluation results of testcases in, e.g.
+                `symtuner.store.DiskStore`. If not specified, every result is kept in memory with
+                `symtuner.store.MemoryStore`.
+            timer: A `symtuner.metrics.PhaseTimer` to time phases of SymTuner with. If not
+                specified, a new timer is made.
+            sampler: A `symtuner.sampler.Sampler` to sample parameters with, instead of the
+                explore and exploit policies. By default, the policies are used.
         '''
 
         if parameter_space is None:
@@ -152,16 +426,26 @@ class SymTuner(ABC):
         self.cnts = {}
         self.len_cnts = {}
         for param, (space, n_sample) in self.space.items():
-            self.cnts[param] = {}
-            for val in space:
-                self.cnts[param][val] = 0
-            self.len_cnts[param] = {}
-            for i in range(1, n_sample + 1):
-                self.len_cnts[param][i] = 0
+            self.cnts[param] = CountTable(space)
+            self.len_cnts[param] = CountTable(range(1, n_sample + 1))
 
         self.exploit_portion = exploit_portion
 
-        self.data = []
+        self.branch_table = BranchTable()
+        if result_store is None:
+            result_store = MemoryStore()
+        self.data = result_store
+        self.core_set = CoreSet(coverages=self.data.coverages)
+
+        self.prior = None
+
+        if timer is None:
+            timer = PhaseTimer()
+        self.timer = timer
+        self.sampler = sampler
+
+        # Probabilities of each policy, cached until data is added
+        self.probabilities = {}
 
     def count_used_parameters(self, parameters):
         '''Update count of used parameters
@@ -176,14 +460,16 @@ class SymTuner(ABC):
         for param, values in parameters.items():
             if param not in self.space.keys():
                 continue
-            self.len_cnts[param][len(values)] += 1
+            self.len_cnts[param].add(len(values))
             for value in values:
-                self.cnts[param][value] += 1
+                self.cnts[param].add(value)
+        self.probabilities.clear()
 
     def sample(self, policy=None):
         '''Sample a set of parameters to use
 
-        Sampling with 2 policies: exploit and eplore.
+        Sampling with 2 policies: exploit and eplore. If a sampler is given, sample with the
+        sampler unless a policy is given.
 
         Args:
             policy: Sampling policy. One of 'exploit' and 'explore'. If not set, sampling with
@@ -193,12 +479,19 @@ class SymTuner(ABC):
             A dictionary of sampled parameters.
         '''
 
+        if policy is None and self.sampler is not None:
+            parameters = self.defaults.copy()
+            parameters.update(self.sampler.sample(self.space))
+            return parameters
         if policy is None:
             policy = random.choices(['exploit', 'explore'],
                                     [self.exploit_portion, 1 - self.exploit_portion])[0]
-        policy_fn = getattr(self, policy)
         parameters = self.defaults.copy()
-        prob_dict = policy_fn(self.data)
+        prob_dict = self.probabilities.get(policy)
+        if prob_dict is None:
+            policy_fn = getattr(self, policy)
+            prob_dict = policy_fn(self.data)
+            self.probabilities[policy] = prob_dict
         sampled = {}
         for param, (space, n_sample) in self.space.items():
             if len(space) == 0:
@@ -223,10 +516,11 @@ class SymTuner(ABC):
             A normalized list of the given list.
         '''
 
-        if np.sum(a_list) == 0:
-            a_list = [1 for _ in a_list]
-        a_list = a_list / np.sum(a_list)
-        return a_list
+        a_list = np.asarray(a_list, dtype=float)
+        total = np.sum(a_list)
+        if total == 0:
+            return np.full(len(a_list), 1. / max(len(a_list), 1))
+        return a_list / total
 
     def explore(self, data):
         '''Return the probability of explore policy
@@ -243,25 +537,14 @@ class SymTuner(ABC):
         '''
 
         prob_dict = {}
-        for param in self.space.keys():
+        for param, (space, n_sample) in self.space.items():
+            cnts = self.cnts[param].array()[self.cnts[param].positions(space)]
+            len_cnts = self.len_cnts[param].array()[
+                self.len_cnts[param].positions(range(1, n_sample + 1))]
 
-            prob = []
-            for value in self.space[param][0]:
-                if value in self.cnts[param].keys() and self.cnts[param][value] > 0:
-                    p = 1.0 / self.cnts[param][value]
-                    p = round(p, 2)
-                else:
-                    p = 10
-                prob.append(p)
-
-            n_prob = []
-            for n in range(1, self.space[param][1] + 1):
-                if self.len_cnts[param][n] > 0:
-                    p = 1.0 / self.len_cnts[param][n]
-                    p = round(p, 2)
-                else:
-                    p = 10
-                n_prob.append(p)
+            # Prefer less used values, and never used values the most
+            prob = np.where(cnts > 0, np.round(1. / np.maximum(cnts, 1), 2), 10)
+            n_prob = np.where(len_cnts > 0, np.round(1. / np.maximum(len_cnts, 1), 2), 10)
 
             prob = self.normalize(prob)
             n_prob = self.normalize(n_prob)
@@ -282,57 +565,124 @@ class SymTuner(ABC):
             probability about how many times to sample.
         '''
 
+        # Make sure that every value in space has its position
+        positions = {}
+        len_positions = {}
+        for param, (space, n_sample) in self.space.items():
+            positions[param] = self.cnts[param].positions(space)
+            len_positions[param] = self.len_cnts[param].positions(range(1, n_sample + 1))
+
         # Extract core parameters used
-        core_parameters = self.extract_core_parameters(data)
+        with self.timer.phase('core_set'):
+            core_parameters = self.extract_core_parameters(data)
+            core_cnts, core_len_cnts = self.count_core_parameters(core_parameters)
+
+        prob_dict = {}
+        for param, (space, n_sample) in self.space.items():
+            position = positions[param]
+            len_position = len_positions[param]
+            cnts = self.cnts[param].array()[position].astype(float)
+            len_cnts = self.len_cnts[param].array()[len_position].astype(float)
+            core = core_cnts[param].array()[position].astype(float)
+            core_len = core_len_cnts[param].array()[len_position].astype(float)
+
+            # Start from the statistics of previous campaigns if given
+            if self.prior is not None:
+                lengths = range(1, n_sample + 1)
+                cnts += lookup(self.prior['cnts'][param], space)
+                len_cnts += lookup(self.prior['len_cnts'][param], lengths)
+                core += lookup(self.prior['core_cnts'][param], space)
+                core_len += lookup(self.prior['core_len_cnts'][param], lengths)
+
+            # Ratio of being core for used values, and never used values the most
+            prob = np.where(cnts > 0, np.round(core / np.maximum(cnts, 1), 2), 10)
+            n_prob = np.where(len_cnts > 0, np.round(core_len / np.maximum(len_cnts, 1), 2), 0)
+
+            prob = self.normalize(prob)
+            n_prob = self.normalize(n_prob)
+            prob_dict[param] = (prob, n_prob)
+        return prob_dict
+
+    def count_core_parameters(self, core_parameters):
+        '''Count values used in core parameters
+
+        Args:
+            core_parameters: A list of core parameters.
+
+        Returns:
+            A tuple of counts of each value and counts of each number of values, in the same
+            format as `SymTuner.cnts` and `SymTuner.len_cnts`.
+        '''
 
         core_cnts = {}
         core_len_cnts = {}
-        for param, (_, n_sample) in self.space.items():
-            core_cnts[param] = {}
+        for param in self.space.keys():
             # Not using space because some space can be updated
-            cnt_keys = self.cnts[param].keys()
-            for val in cnt_keys:
-                core_cnts[param][val] = 0
-            core_len_cnts[param] = {}
-            for i in range(1, n_sample + 1):
-                core_len_cnts[param][i] = 0
+            core_cnts[param] = self.cnts[param].zeros_like()
+            core_len_cnts[param] = self.len_cnts[param].zeros_like()
 
+        # Testcases of an iteration share one parameter dictionary, so group them by identity and
+        # weight each dictionary by the number of core testcases sharing it
+        multiplicity = {}
         for parameter in core_parameters:
+            _, count = multiplicity.get(id(parameter), (parameter, 0))
+            multiplicity[id(parameter)] = (parameter, count + 1)
+
+        for parameter, count in multiplicity.values():
             for param, values in parameter.items():
                 if param not in self.space.keys():
                     continue
-                core_len_cnts[param][len(values)] += 1
+                if len(values) in core_len_cnts[param]:
+                    core_len_cnts[param].add(len(values), count)
                 for value in values:
-                    core_cnts[param][value] += 1
+                    if value in core_cnts[param]:
+                        core_cnts[param].add(value, count)
+        return core_cnts, core_len_cnts
 
-        prob_dict = {}
-        for param in self.space.keys():
+    def set_prior(self, states, weight=1.):
+        '''Warm-start from previous campaigns
 
-            prob = []
-            for value in self.space[param][0]:
-                if value in core_cnts[param].keys() \
-                        and value in self.cnts[param].keys() and self.cnts[param][value] > 0:
-                    p = core_cnts[param][value] / self.cnts[param][value]
-                    p = round(p, 2)
-                elif value not in self.cnts[param].keys() or self.cnts[param][value] == 0:
-                    p = 10
-                else:
-                    p = 0
-                prob.append(p)
-
-            n_prob = []
-            for n in range(1, self.space[param][1] + 1):
-                if self.len_cnts[param][n] > 0:
-                    p = core_len_cnts[param][n] / self.len_cnts[param][n]
-                    p = round(p, 2)
-                else:
-                    p = 0
-                n_prob.append(p)
+        Set the prior of exploit policy from previous campaigns. The counts of used parameters and
+        of core parameters of previous campaigns are added to the counts of this campaign when
+        calculating the probability of exploit policy. Only values in the current tuning space
+        are considered.
 
-            prob = self.normalize(prob)
-            n_prob = self.normalize(n_prob)
-            prob_dict[param] = (prob, n_prob)
-        return prob_dict
+        Args:
+            states: A list of states of previous campaigns returned by `SymTuner.get_state`.
+            weight: A weight multiplied to counts of previous campaigns. By default, this will be
+                set as 1.
+        '''
+
+        prior = {
+            'cnts': {param: {} for param in self.space.keys()},
+            'len_cnts': {param: {} for param in self.space.keys()},
+            'core_cnts': {param: {} for param in self.space.keys()},
+            'core_len_cnts': {param: {} for param in self.space.keys()},
+        }
+        for state in states:
+            data = state['data']
+            core_set = CoreSet(data, coverages=data.coverages)
+            core_parameters = [data[i][3] for i in core_set.cover()]
+            core_parameters.extend(data[i][3] for i in core_set.bug_finders())
+            core_cnts, core_len_cnts = self.count_core_parameters(core_parameters)
+            counts = {
+                'cnts': state['cnts'],
+                'len_cnts': state['len_cnts'],
+                'core_cnts': core_cnts,
+                'core_len_cnts': core_len_cnts,
+            }
+            for kind, cnts in counts.items():
+                for param, cnt in cnts.items():
+                    if param not in prior[kind].keys():
+                        continue
+                    for value, c in cnt.items():
+                        prior[kind][param][value] = prior[kind][param].get(value, 0) + c * weight
+        self.prior = prior
+        if self.sampler is not None:
+            self.sampler.set_prior(prior)
+        self.probabilities.clear()
+        get_logger().info(f'Prior loaded from {len(states)} previous campaign(s).')
+        return self
 
     def extract_core_parameters(self, data):
         '''Extract core results in data
@@ -347,40 +697,12 @@ class SymTuner(ABC):
             A list of core parameters that covers all coverages and bugs.
         '''
 
-        # Return variable
-        core_paramters = []
-
-        # Get total coverage
-        total_coverage = set()
-        for cov, _, _, _ in data:
-            total_coverage = total_coverage | cov
-
-        # Find good testcases
-        accumulated_coverage = set()
-        copied_data = deepcopy(data)
-
-        while True:
-            if len(copied_data) == 0:
-                break
-            copied_data = sorted(copied_data,
-                                 key=lambda elem: len(elem[0]),
-                                 reverse=True)
-            top_cov, _, _, param = copied_data.pop(0)
-            if len(top_cov) > 0:
-                accumulated_coverage = accumulated_coverage | top_cov
-                copied_data = [(cov - accumulated_coverage, bug, tc, param)
-                               for cov, bug, tc, param in copied_data]
-                core_paramters.append(param)
-            else:
-                break
+        # The core set of the collected data is maintained as data is added
+        core_set = self.core_set if data is self.data else CoreSet(data)
 
-        # Find bug finding testcases
-        found_bugs = []
-        for _, bugs, _, param in data[::-1]:
-            for bug in bugs:
-                if bug not in found_bugs:
-                    found_bugs.append(bug)
-                    core_paramters.append(param)
+        # Find good testcases and bug finding testcases
+        core_paramters = [data[i][3] for i in core_set.cover()]
+        core_paramters.extend(data[i][3] for i in core_set.bug_finders())
 
         return core_paramters
 
@@ -402,13 +724,89 @@ class SymTuner(ABC):
         if evaluation_kwargs is None:
             evaluation_kwargs = {}
 
-        self.count_used_parameters(parameters)
-        for testcase in testcases:
-            coverage, bug = self.evaluate(target, testcase,
-                                          **evaluation_kwargs)
-            self.data.append((coverage, bug, testcase, parameters))
+        results = self.evaluate_all(target, testcases, **evaluation_kwargs)
+        return self.add_results(parameters, testcases, results)
+
+    def add_results(self, parameters, testcases, results, stalled=False):
+        '''Update data with evaluated testcases
+
+        Update data with testcases that are already evaluated, e.g. evaluated in background while
+        the symbolic executor is running.
+
+        Args:
+            paramters: A set of parameters used to generated testcases.
+            testcases: Testcases genereted with parameters.
+            results: A list of tuples of the coverage and bugs of each testcase, in the order of
+                `testcases`.
+            stalled: Whether symbolic executor was stopped early because it stalled. The sampler
+                counts the parameters of a stalled run as a failure. By default, this will be set
+                as False.
+
+        Returns:
+            Self object for chaining. All updates is recorded in the object.
+        '''
+
+        with self.timer.phase('update'):
+            self.count_used_parameters(parameters)
+            n_bugs = len(self.core_set.total_bugs)
+            paid_off = False
+            for testcase, (coverage, bug) in zip(testcases, results):
+                coverage = self.branch_table.intern(coverage)
+                gain = self.core_set.add(coverage, bug)
+                self.data.append(coverage, bug, testcase, parameters, contributing=gain > 0)
+                paid_off = paid_off or gain > 0
+            if self.sampler is not None:
+                paid_off = paid_off or len(self.core_set.total_bugs) > n_bugs
+                self.sampler.update(self.space, parameters, paid_off and not stalled)
         return self
 
+    def get_state(self):
+        '''Get the learned state
+
+        Get the learned state to save in a checkpoint: the tuning space (updated while tuning),
+        counts of used parameters, and evaluated testcases.
+
+        Returns:
+            A dictionary of the learned state.
+        '''
+
+        return {
+            'space': self.space,
+            'defaults': self.defaults,
+            'cnts': self.cnts,
+            'len_cnts': self.len_cnts,
+            'branches': self.branch_table.names,
+            'data': self.data,
+            'prior': self.prior,
+            'sampler': self.sampler,
+        }
+
+    def set_state(self, state):
+        '''Restore the learned state
+
+        Restore the learned state from a checkpoint. Testcases are not evaluated again; the core
+        set is rebuilt from the saved coverage.
+
+        Args:
+            state: A dictionary returned by `SymTuner.get_state`.
+        '''
+
+        self.space = state['space']
+        self.defaults = state['defaults']
+        self.cnts = state['cnts']
+        self.len_cnts = state['len_cnts']
+        self.branch_table = BranchTable()
+        self.branch_table.names = list(state['branches'])
+        self.branch_table.ids = {name: bid for bid, name in enumerate(self.branch_table.names)}
+        self.data = state['data']
+        self.core_set = CoreSet(self.data, coverages=self.data.coverages)
+        self.prior = state.get('prior')
+        # Keep learning with the saved sampler, unless another sampler is used now
+        sampler = state.get('sampler')
+        if sampler is not None and type(sampler) is type(self.sampler):
+            self.sampler = sampler
+        self.probabilities.clear()
+
     def get_space_json(self):
         '''Get tuning space and default parameters
 
@@ -427,19 +825,35 @@ class SymTuner(ABC):
     def get_coverage_and_bugs(self):
         '''Get total coverage and bugs
 
-        Get total coverage and bugs collected.
+        Get total coverage and bugs collected. These are accumulated whenever data is added, so
+        this does not depend on the number of testcases collected.
+
+        Returns:
+            A tuple of coverage and bugs found in total. The first element of the tuple is a
+            `symtuner.coverage.Coverage` bitmap and the second element is a set of bugs.
+        '''
+
+        return self.core_set.total_coverage, self.core_set.total_bugs
+
+    def get_retained_testcases(self, start=0):
+        '''Get testcases worth keeping
+
+        Get testcases that covered new branches or found bugs when added, among the testcases
+        added from `start`. Other testcases are not needed to reproduce the coverage and bugs.
+
+        Args:
+            start: Index of the first testcase to consider. By default, consider all testcases.
 
         Returns:
-            A tuple of coverage and bugs found in total. The first element of the tuple is a set
-            of coverage and the second element is a set of bugs.
+            A set of testcases.
         '''
 
-        coverage = set()
-        bugs = set()
-        for cov, bug, _, _ in self.data:
-            coverage = coverage | cov
-            bugs = bugs | bug
-        return coverage, bugs
+        retained = set()
+        for index in range(start, len(self.data)):
+            _, bugs, testcase, _ = self.data[index]
+            if self.core_set.gains[index] > 0 or len(bugs) > 0:
+                retained.add(testcase)
+        return retained
 
     def get_testcase_causing_bug(self, bug):
         '''Get testcase causing the given bug
@@ -453,10 +867,28 @@ class SymTuner(ABC):
             A latest testcase causes the given bug. Returns None if no testcase is found.
         '''
 
-        for _, bugs, tc, _ in self.data[::-1]:
-            if bug in bugs:
-                return tc
-        return None
+        index = self.core_set.bug_index.get(bug)
+        if index is None:
+            return None
+        _, _, tc, _ = self.data[index]
+        return tc
+
+    def evaluate_all(self, target, testcases, **kwargs):
+        '''Evaluate the given testcases
+
+        Evaluate the given testcases one by one with `SymTuner.evaluate`. Symbolic executor
+        specific SymTuner may re-implement this to evaluate testcases concurrently.
+
+        Args:
+            target: A target program to evaluate with.
+            testcases: A list of testcases to evaluate.
+            kwargs: Any keyword arguments pass to evaluate method.
+
+        Returns:
+            A list of tuples of the coverage and bugs, in the order of `testcases`.
+        '''
+
+        return [self.evaluate(target, testcase, **kwargs) for testcase in testcases]
 
     @abstractmethod
     def evaluate(self, target, testcase, **kwargs):
@@ -0,0 +1,96 @@
+'''Tests of resuming a campaign from a checkpoint'''
+
+from datetime import timedelta
+import json
+import random
+
+from symtuner.bin import discard_after_checkpoint
+from symtuner.campaign import Campaign
+from symtuner.checkpoint import load_checkpoint
+from symtuner.symtuner import SymTuner
+from symtuner.symtuner import TimeBudgetHandler
+
+
+class FakeSymTuner(SymTuner):
+
+    def evaluate(self, target, testcase, **kwargs):
+        raise NotImplementedError
+
+    @classmethod
+    def get_default_space(cls):
+        return {
+            '-search': (['dfs', 'bfs', 'random-path'], 1),
+            '-sym-arg': ([1, 2, 3, 4], 2),
+        }
+
+
+class FakeSymbolicExecutor:
+
+    def get_time_parameter(self):
+        return '-max-time'
+
+
+def make_campaign(output_dir):
+    return Campaign(None, 'target.bc', 'target', output_dir, FakeSymTuner(),
+                    TimeBudgetHandler(3600))
+
+
+def start(campaign):
+    job = campaign.next_job(FakeSymbolicExecutor())
+    iteration, _, parameters = job
+    assert parameters['-output-dir'].endswith(f'iteration-{iteration}')
+    (campaign.output_dir / f'iteration-{iteration}').mkdir()
+    return job
+
+
+def finish(campaign, job, branches, seconds=10):
+    # Jobs take `seconds` of the time budget
+    campaign.time_budget_handler.start_time -= timedelta(seconds=seconds)
+    iteration, _, parameters = job
+    testcase = campaign.output_dir / f'iteration-{iteration}' / 'test000001.ktest'
+    campaign.finish(iteration, parameters, [str(testcase)], seconds, [(set(branches), set())])
+
+
+def test_resume(tmp_path):
+    random.seed(0)
+    campaign = make_campaign(tmp_path)
+    jobs = [start(campaign) for _ in range(3)]
+    finish(campaign, jobs[0], {'a.c 1', 'a.c 2'})
+    campaign.save_checkpoint()
+
+    # Interrupted after the checkpoint, with iteration 1 still running
+    finish(campaign, jobs[2], {'a.c 3'})
+    finish(campaign, start(campaign), {'a.c 4'})
+    (tmp_path / 'iteration-1.stdout').write_text('interrupted\n')
+
+    resumed = make_campaign(tmp_path)
+    resumed.set_state(load_checkpoint(resumed.checkpoint_path))
+    discard_after_checkpoint(tmp_path, resumed.iteration, resumed.time_budget_handler.elapsed,
+                             resumed.unfinished)
+
+    assert resumed.iteration == 3
+    assert resumed.finished == 1
+    assert resumed.unfinished == {1, 2}
+    assert len(resumed.symtuner.data) == 1
+    assert len(resumed.symtuner.get_coverage_and_bugs()[0]) == 2
+    assert sorted(path.name for path in tmp_path.glob('iteration-*')) == ['iteration-0']
+    assert (tmp_path / 'coverage.csv').read_text() == '10, 2\n'
+    with (tmp_path / 'metrics.jsonl').open() as stream:
+        assert [json.loads(line)['iteration'] for line in stream] == [1]
+
+    # Jobs running at the checkpoint run again first, as they were
+    executor = FakeSymbolicExecutor()
+    assert resumed.next_job(executor) == jobs[1]
+    assert resumed.next_job(executor) == jobs[2]
+    iteration, _, _ = resumed.next_job(executor)
+    assert iteration == 3
+    assert resumed.unfinished == set()
+    assert [job[0] for job in resumed.get_state()['running']] == [1, 2, 3]
+
+    for job, branches in zip(jobs[1:], ({'a.c 5'}, {'a.c 3'})):
+        (tmp_path / f'iteration-{job[0]}').mkdir()
+        finish(resumed, job, branches)
+    assert resumed.finished == 3
+    assert (tmp_path / 'coverage.csv').read_text().splitlines() == ['10, 2', '20, 3', '30, 4']
+    with (tmp_path / 'metrics.jsonl').open() as stream:
+        assert [json.loads(line)['iteration'] for line in stream] == [1, 2, 3]
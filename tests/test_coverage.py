@@ -0,0 +1,159 @@
+'''Tests of the compact coverage representation and the core set'''
+
+import pickle
+import random
+
+import pytest
+
+from symtuner.coverage import BranchTable
+from symtuner.coverage import CoreSet
+from symtuner.coverage import Coverage
+from symtuner.coverage import greedy_cover
+from symtuner.store import MemoryStore
+
+
+def sorted_cover(coverages, limit=None):
+    '''Greedy set cover of the original implementation
+
+    Stably sort the coverages by the number of uncovered branches at every step, and pick the
+    first one. Coverages may be either `Coverage`s or sets of branch names.
+    '''
+
+    remaining = list(enumerate(coverages))
+    accumulated = None
+    picked = []
+    while len(remaining) > 0 and (limit is None or len(picked) < limit):
+        remaining = sorted(remaining, key=lambda elem: len(elem[1]), reverse=True)
+        i, top = remaining.pop(0)
+        if len(top) == 0:
+            break
+        accumulated = top if accumulated is None else accumulated | top
+        remaining = [(j, cov - accumulated) for j, cov in remaining]
+        picked.append(i)
+    return picked
+
+
+def random_branches(rng, n_coverages, n_branches):
+    density = rng.choice([0.05, 0.2, 0.5])
+    return [{f'src.c {b}' for b in range(n_branches) if rng.random() < density}
+            for _ in range(n_coverages)]
+
+
+def random_coverages(rng, n_coverages, n_branches):
+    density = rng.choice([0.05, 0.2, 0.5])
+    return [Coverage(sum(1 << b for b in range(n_branches) if rng.random() < density))
+            for _ in range(n_coverages)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_greedy_cover_ties(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        coverages = random_coverages(rng, rng.randint(1, 60), rng.randint(1, 40))
+        universe = Coverage()
+        for coverage in coverages:
+            universe = universe | coverage
+        for limit in (None, 3):
+            expected = sorted_cover(coverages, limit)
+            assert greedy_cover(coverages, limit) == expected
+            assert greedy_cover(coverages, limit, universe=universe) == expected
+
+
+def test_coverage_set_operations():
+    a = Coverage(0b101101)
+    b = Coverage(0b011001)
+    assert set(a) == {0, 2, 3, 5}
+    assert len(a) == 4
+    assert 2 in a and 1 not in a and 100 not in a
+    assert set(a | b) == set(a) | set(b)
+    assert set(a & b) == set(a) & set(b)
+    assert set(a - b) == set(a) - set(b)
+    assert set(b - a) == set(b) - set(a)
+    for result in (a | b, a & b, a - b, 0 | a, 0 & a):
+        assert isinstance(result, Coverage)
+    assert len(Coverage()) == 0 and list(Coverage()) == []
+    assert a - a == Coverage()
+
+    big = Coverage((1 << 10000) | 1)
+    assert list(big) == [0, 10000]
+    restored = pickle.loads(pickle.dumps(big))
+    assert isinstance(restored, Coverage) and restored == big
+
+
+def test_branch_table():
+    table = BranchTable()
+    first = table.intern(['a.c 1', 'a.c 2'])
+    second = table.intern(['a.c 2', 'b.c 1', 'b.c 1'])
+    assert len(table) == 3
+    assert set(first) == {0, 1} and set(second) == {1, 2}
+    assert table.names_of(first | second) == {'a.c 1', 'a.c 2', 'b.c 1'}
+    assert table.names_of(second - first) == {'b.c 1'}
+    assert table.intern([]) == Coverage()
+    # Identifiers never change
+    assert table.intern(['b.c 1', 'a.c 1']) == Coverage(0b101)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_set_equivalence(seed):
+    rng = random.Random(seed)
+    table = BranchTable()
+    branches = random_branches(rng, 50, 300)
+    coverages = [table.intern(names) for names in branches]
+    for _ in range(200):
+        i, j = rng.randrange(50), rng.randrange(50)
+        a, b = coverages[i], coverages[j]
+        assert len(a) == len(branches[i])
+        assert table.names_of(a | b) == branches[i] | branches[j]
+        assert table.names_of(a & b) == branches[i] & branches[j]
+        assert table.names_of(a - b) == branches[i] - branches[j]
+        assert len(a - b) == len(branches[i] - branches[j])
+
+
+def test_core_set_gains():
+    core_set = CoreSet()
+    assert core_set.add(Coverage(0b0011), set()) == 2
+    assert core_set.add(Coverage(0b0110), {'bug 1'}) == 1
+    assert core_set.add(Coverage(0b0011), set()) == 0
+    assert core_set.add(Coverage(), {'bug 2'}) == 0
+    assert core_set.add(Coverage(0b1000), {'bug 1'}) == 1
+    assert len(core_set) == 5
+    assert list(core_set.gains) == [2, 1, 0, 0, 1]
+    assert list(core_set.sizes) == [2, 2, 2, 0, 1]
+    assert core_set.total_coverage == Coverage(0b1111)
+    assert core_set.total_bugs == {'bug 1', 'bug 2'}
+    # The latest testcase finding each bug
+    assert core_set.bug_finders() == [4, 3]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_core_set_cover(seed):
+    # Same core set as the greedy cover over sets of branch names, as new testcases arrive
+    rng = random.Random(seed)
+    table = BranchTable()
+    branches = random_branches(rng, 120, 200)
+    store = MemoryStore()
+    core_set = CoreSet(coverages=store.coverages)
+    for i, names in enumerate(branches):
+        coverage = table.intern(names)
+        gain = core_set.add(coverage, set())
+        store.append(coverage, set(), f'test{i:06d}.ktest', {})
+        assert gain == len(names - set().union(*branches[:i]))
+        if i % 30 == 29:
+            expected = sorted_cover(branches[:i + 1])
+            assert core_set.cover() == expected
+            assert core_set.cover(3) == expected[:3]
+            assert table.names_of(core_set.total_coverage) == set().union(*branches[:i + 1])
+
+    data = [(coverage, set(), None, None) for coverage in store.coverages]
+    assert CoreSet(data).cover() == core_set.cover()
+
+
+def test_core_set_cache():
+    core_set = CoreSet()
+    core_set.add(Coverage(0b01), set())
+    assert core_set.cover() == [0]
+    core_set.add(Coverage(), set())
+    assert not core_set.outdated
+    core_set.add(Coverage(0b111), set())
+    assert core_set.outdated
+    assert core_set.cover() == [2]
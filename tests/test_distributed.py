@@ -0,0 +1,63 @@
+'''Tests of accepting workers at a coordinator'''
+
+import socket
+
+import pytest
+
+from symtuner.distributed import Connection
+from symtuner.distributed import Coordinator
+from symtuner.distributed import Worker
+from symtuner.distributed import load_token
+from symtuner.distributed import make_token
+from symtuner.distributed import parse_address
+
+
+@pytest.fixture
+def coordinator():
+    coordinator = Coordinator('0', 'secret', {'llvm_bc': 'target.bc'})
+    yield coordinator
+    coordinator.close()
+
+
+def hello(coordinator, **message):
+    connection = Connection(socket.create_connection(coordinator.address))
+    connection.send(dict(message, type='hello', name='worker', jobs=2))
+    reply = connection.receive()
+    connection.close()
+    return reply
+
+
+def test_parse_address():
+    assert parse_address('8000') == (socket.AF_INET, ('127.0.0.1', 8000))
+    assert parse_address(':8000') == (socket.AF_INET, ('127.0.0.1', 8000))
+    assert parse_address('0.0.0.0:8000') == (socket.AF_INET, ('0.0.0.0', 8000))
+    assert parse_address('unix:/tmp/sock') == (socket.AF_UNIX, '/tmp/sock')
+    with pytest.raises(ValueError):
+        parse_address('host:port')
+
+
+def test_localhost(coordinator):
+    assert coordinator.address[0] == '127.0.0.1'
+
+
+def test_token(coordinator):
+    assert hello(coordinator) == {'type': 'rejected', 'reason': 'invalid token'}
+    assert hello(coordinator, token='wrong') == {'type': 'rejected', 'reason': 'invalid token'}
+    assert coordinator.slots() == 0
+    assert hello(coordinator, token='secret') == {'type': 'welcome', 'llvm_bc': 'target.bc'}
+
+    worker = Worker(f':{coordinator.address[1]}', 'wrong', None, None, 'worker')
+    with pytest.raises(ConnectionError, match='rejected'):
+        worker.run()
+
+
+def test_token_file(tmp_path, monkeypatch):
+    path = tmp_path / 'worker-token'
+    token = make_token(path)
+    assert len(token) > 0
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert load_token(path) == token
+    monkeypatch.setenv('SYMTUNER_TOKEN', 'secret')
+    assert load_token() == 'secret'
+    monkeypatch.delenv('SYMTUNER_TOKEN')
+    assert load_token() is None
@@ -0,0 +1,138 @@
+'''Tests of the native gcda reader against GCov
+
+The native reader (`symtuner.gcda.GCDAReader`) and GCov (`symtuner.klee.GCov`) name branches
+differently: GCov names a branch by the source file and its position in the `.gcov` output, and
+the native reader by the source file, the line, and the arc (`<file> <line>:<function>.<block>.
+<arc>`). The branches are therefore compared by the source line and the count of each branch,
+which both backends report the same way.
+'''
+
+from collections import Counter
+from pathlib import Path
+import shutil
+import subprocess as sp
+
+import pytest
+
+from symtuner.gcda import GCDAReader
+from symtuner.gcda import read_counters
+from symtuner.gcda import read_notes
+from symtuner.klee import GCov
+
+
+pytestmark = pytest.mark.skipif(shutil.which('gcc') is None or shutil.which('gcov') is None,
+                                reason='gcc and gcov are required')
+
+
+SOURCE = r'''
+#include <stdio.h>
+#include <string.h>
+
+static int classify(int x) {
+    if (x < 0)
+        return -1;
+    else if (x == 0)
+        return 0;
+    switch (x % 4) {
+    case 0: return 4;
+    case 1: return 1;
+    case 2: return 2;
+    default: return 3;
+    }
+}
+
+static int never_called(int x) {
+    return x > 0 ? x : -x;
+}
+
+int main(int argc, char **argv) {
+    int total = 0;
+    for (int i = -3; i < argc * 5; i++) {
+        if (i % 3 == 0 && i > 0)
+            total += classify(i);
+        else
+            total -= classify(i);
+    }
+    if (argc > 1 && strcmp(argv[1], "never") == 0)
+        total += never_called(total);
+    printf("%d\n", total);
+    return 0;
+}
+'''
+
+
+@pytest.fixture(scope='module')
+def program(tmp_path_factory):
+    '''Build the program with coverage and run it
+
+    Returns:
+        A tuple of the program, its gcda file, and its gcno file.
+    '''
+
+    build = tmp_path_factory.mktemp('gcda')
+    (build / 'prog.c').write_text(SOURCE)
+    sp.run(['gcc', '--coverage', '-O0', '-c', 'prog.c', '-o', 'prog.o'], cwd=str(build),
+           check=True)
+    sp.run(['gcc', '--coverage', 'prog.o', '-o', 'prog'], cwd=str(build), check=True)
+    sp.run([str(build / 'prog'), 'a', 'b'], cwd=str(build), check=True, stdout=sp.PIPE)
+    return build / 'prog', build / 'prog.gcda', build / 'prog.gcno'
+
+
+def gcov_branch_counts(program, gcda):
+    '''Get the count of each branch from GCov
+
+    Returns:
+        A `Counter` of tuples of the source line and the count of each branch.
+    '''
+
+    process = sp.run(['gcov', '-b', '-c', '-t', str(gcda)], cwd=str(program.parent),
+                     stdout=sp.PIPE, stderr=sp.PIPE, check=True)
+    counts = Counter()
+    line = None
+    for text in process.stdout.decode(errors='replace').splitlines():
+        fields = text.split(':', 2)
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            line = int(fields[1].strip())
+        elif text.startswith('branch'):
+            words = text.split()
+            count = int(words[3]) if words[2] == 'taken' else 0
+            counts[(line, count)] += 1
+    return counts
+
+
+def native_branch_counts(gcda, gcno):
+    '''Get the count of each branch from the native reader
+
+    Returns:
+        A `Counter` of tuples of the source line and the count of each branch.
+    '''
+
+    functions = read_notes(gcno)
+    counts = Counter()
+    for ident, counter in read_counters(gcda).items():
+        function = functions[ident]
+        arc_counts = function.solve(counter)
+        for i, bid in function.branches:
+            # <file> <line>:<function>.<block>.<arc>
+            line = int(bid.rsplit(' ', 1)[1].split(':')[0])
+            counts[(line, arc_counts[i])] += 1
+    return counts
+
+
+def test_branch_counts(program):
+    target, gcda, gcno = program
+    expected = gcov_branch_counts(target, gcda)
+    assert len(expected) > 0
+    assert native_branch_counts(gcda, gcno) == expected
+
+
+def test_covered_branches(program):
+    target, gcda, _ = program
+    expected = GCov().run(target, [gcda])
+    covered = GCDAReader().run(target, [gcda])
+    assert len(covered) == len(expected)
+    # Branches are reported at the same lines
+    lines = Counter(int(bid.rsplit(' ', 1)[1].split(':')[0]) for bid in covered)
+    expected_lines = Counter((line for line, count in gcov_branch_counts(target, gcda).elements()
+                              if count > 0))
+    assert lines == expected_lines
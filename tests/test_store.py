@@ -0,0 +1,85 @@
+'''Tests of the result stores'''
+
+import pickle
+import random
+import shutil
+
+from symtuner.coverage import CoreSet
+from symtuner.coverage import Coverage
+from symtuner.store import DiskStore
+from symtuner.store import MemoryStore
+
+
+def random_records(rng, n_records):
+    parameters = [{'-search': search} for search in ('dfs', 'bfs', 'random-path')]
+    records = []
+    for i in range(n_records):
+        coverage = Coverage(rng.getrandbits(rng.randint(0, 300)))
+        bugs = {f'bug {i}'} if rng.random() < 0.05 else set()
+        records.append((coverage, bugs, f'/out/test{i:06d}.ktest', rng.choice(parameters)))
+    return records
+
+
+def fill(stores, records):
+    core_sets = [CoreSet(coverages=store.coverages) for store in stores]
+    for coverage, bugs, testcase, parameters in records:
+        for store, core_set in zip(stores, core_sets):
+            gain = core_set.add(coverage, bugs)
+            store.append(coverage, bugs, testcase, parameters, contributing=gain > 0)
+    return core_sets
+
+
+def assert_same(store, expected):
+    assert len(store) == len(expected)
+    for record, (coverage, bugs, testcase, parameters) in zip(store, expected):
+        assert record[0] == coverage
+        assert record[1] == bugs
+        assert str(record[2]) == testcase
+        assert record[3] == parameters
+    assert [store.coverages[i] for i in range(len(store))] == [record[0] for record in expected]
+
+
+def test_disk_store(tmp_path):
+    rng = random.Random(0)
+    records = random_records(rng, 500)
+    memory = MemoryStore()
+    # Small cache to evict spilled coverages while reading
+    disk = DiskStore(tmp_path / 'results.bin', cache_size=256)
+    memory_core, disk_core = fill([memory, disk], records)
+
+    assert 0 < len(disk.kept) < len(records)
+    disk.file.flush()
+    assert (tmp_path / 'results.bin').stat().st_size == disk.end > 0
+    assert_same(disk, records)
+    assert disk[-1] == disk[len(records) - 1]
+    assert disk_core.cover() == memory_core.cover()
+    assert disk_core.bug_finders() == memory_core.bug_finders()
+
+
+def test_disk_store_reload(tmp_path):
+    rng = random.Random(1)
+    records = random_records(rng, 400)
+    store = DiskStore(tmp_path / 'run' / 'results.bin')
+    fill([store], records[:300])
+    saved = pickle.dumps(store)
+    spilled = (tmp_path / 'run' / 'results.bin').read_bytes()
+
+    # Restored next to a moved checkpoint, read-only
+    shutil.copytree(str(tmp_path / 'run'), str(tmp_path / 'moved'))
+    restored = pickle.loads(saved).open(tmp_path / 'moved')
+    assert restored.path == tmp_path / 'moved' / 'results.bin'
+    assert_same(restored, records[:300])
+    assert CoreSet(restored).cover() == CoreSet(records[:300]).cover()
+
+    # Results spilled after the store was saved are truncated when resumed
+    fill([store], records[300:])
+    store.file.flush()
+    assert (tmp_path / 'run' / 'results.bin').read_bytes().startswith(spilled)
+    restored = pickle.loads(saved).open(tmp_path / 'run')
+    assert_same(restored, records[:300])
+    assert (tmp_path / 'run' / 'results.bin').stat().st_size > len(spilled)
+
+    resumed = pickle.loads(saved).open(writable=True)
+    assert (tmp_path / 'run' / 'results.bin').read_bytes() == spilled
+    fill([resumed], records[300:])
+    assert_same(resumed, records)